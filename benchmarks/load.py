@@ -0,0 +1,295 @@
+"""
+Load test: concurrent sessions clicking through the form of a local app server.
+
+    python benchmarks/load.py                       # 1, 5, 10 and 25 sessions
+    python benchmarks/load.py --sessions 50 --clicks 40
+    python benchmarks/load.py --save-baseline       # record as the load baseline
+
+Each level starts a fresh `streamlit run` of the app and opens that many
+websocket sessions, speaking Streamlit's own protocol (BackMsg rerun
+requests carrying the widget states, ForwardMsg deltas back).  Once every
+session has had its first run, they all toggle random enabled form widgets
+(fever_resolved, neutro_resolved, micro_defined, stable, enterocolitis,
+allo_sct) with a think time between clicks; a click's latency is from
+sending the rerun to its script_finished.  Sessions acknowledge the
+flowchart shell like the browser component does, so reruns after the
+first are the steady state.
+
+Clicks and think times come from --seed, so two runs issue the same
+sequence.  Server CPU and RSS are read from /proc (Linux); elsewhere they
+are left out.  Results go to benchmarks/results/load.json and, like
+run.py, are compared with a baseline (benchmarks/load_baseline.json).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from run import APP, RESULTS, ROOT, compare
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "load_baseline.json")
+WIDGETS = ("radio", "checkbox")
+
+
+# ── server ────────────────────────────────────────────────────────────────────
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port, timeout=60):
+    """A fresh `streamlit run` of the app on port, once it answers its health check."""
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP, "--server.headless", "true",
+         "--server.port", str(port), "--server.address", "127.0.0.1",
+         "--server.enableXsrfProtection", "false", "--server.fileWatcherType", "none",
+         "--browser.gatherUsageStats", "false"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"streamlit exited with status {proc.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"streamlit did not come up on port {port} within {timeout} s")
+
+def proc_stats(pid):
+    """(CPU seconds, RSS bytes) of a process, or (None, None) without /proc."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+    except (OSError, StopIteration):
+        return None, None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK"), rss
+
+
+# ── one simulated browser session ─────────────────────────────────────────────
+
+class Session:
+    """A websocket session holding its widget states the way the frontend does."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.widgets = []        # (kind, id, disabled, options, fragment id) in page order
+        self.values = {}         # widget id -> radio option / checkbox bool
+        self.component = None    # (id, shell hash) of the flowchart
+        self.fragment = ""       # fragment of the last widget changed ("" = whole app)
+        self.errors = 0
+        self.bytes = 0
+        self.deltas = 0
+
+    def _state(self):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        msg.rerun_script.fragment_id = self.fragment
+        states = msg.rerun_script.widget_states.widgets
+        for kind, wid, *_ in self.widgets:
+            w = states.add()
+            w.id = wid
+            if kind == "radio":
+                w.string_value = self.values[wid]
+            else:
+                w.bool_value = self.values[wid]
+        if self.component:
+            w = states.add()
+            w.id = self.component[0]
+            w.json_value = json.dumps({"shell": self.component[1]})
+        return msg.SerializeToString()
+
+    def _element(self, el, fragment):
+        kind = el.WhichOneof("type")
+        if kind in WIDGETS:
+            w = getattr(el, kind)
+            options = tuple(w.options) if kind == "radio" else None
+            self.widgets.append((kind, w.id, w.disabled, options, fragment))
+            self.values.setdefault(w.id, options[w.default] if options else w.default)
+        elif kind == "component_instance":
+            args = json.loads(el.component_instance.json_args or "{}")
+            self.component = (el.component_instance.id, args.get("shell_hash"))
+        elif kind == "exception":
+            self.errors += 1
+
+    async def rerun(self):
+        """Send the current widget states; seconds until the script finished."""
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        if not self.fragment:
+            self.widgets = []
+        else:       # a fragment rerun only re-sends that fragment's elements
+            self.widgets = [w for w in self.widgets if w[4] != self.fragment]
+        t0 = time.perf_counter()
+        await self.ws.send(self._state())
+        while True:
+            data = await self.ws.recv()
+            self.bytes += len(data)
+            msg = ForwardMsg()
+            msg.ParseFromString(data)
+            kind = msg.WhichOneof("type")
+            if kind == "delta":
+                self.deltas += 1
+                if msg.delta.WhichOneof("type") == "new_element":
+                    self._element(msg.delta.new_element, msg.delta.fragment_id)
+            elif kind == "script_finished":
+                if msg.script_finished not in (ForwardMsg.FINISHED_SUCCESSFULLY,
+                                               ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY):
+                    self.errors += 1
+                return time.perf_counter() - t0
+
+    def toggle(self, rnd):
+        """Flip one enabled widget at random."""
+        kind, wid, _, options, self.fragment = rnd.choice([w for w in self.widgets if not w[2]])
+        if options:
+            self.values[wid] = options[(options.index(self.values[wid]) + 1) % len(options)]
+        else:
+            self.values[wid] = not self.values[wid]
+
+
+# ── one load level ────────────────────────────────────────────────────────────
+
+async def _drive(url, n, clicks, think, seed):
+    import websockets
+
+    sessions = []
+    for _ in range(n):
+        ws = await websockets.connect(f"{url}/_stcore/stream", subprotocols=["streamlit"],
+                                      max_size=None, open_timeout=60)
+        sessions.append(Session(ws))
+    first = await asyncio.gather(*(s.rerun() for s in sessions))
+
+    clicked = []
+    async def click(s, rnd):
+        await asyncio.sleep(rnd.uniform(0, think))      # spread the sessions out
+        for _ in range(clicks):
+            s.toggle(rnd)
+            clicked.append(await s.rerun())
+            await asyncio.sleep(rnd.expovariate(1 / think) if think else 0)
+
+    bytes0, deltas0 = sum(s.bytes for s in sessions), sum(s.deltas for s in sessions)
+    t0 = time.perf_counter()
+    await asyncio.gather(*(click(s, random.Random(seed * 1000003 + i))
+                           for i, s in enumerate(sessions)))
+    wall = time.perf_counter() - t0
+    for s in sessions:
+        await s.ws.close()
+    return (first, clicked, wall, sum(s.bytes for s in sessions) - bytes0,
+            sum(s.deltas for s in sessions) - deltas0, sum(s.errors for s in sessions))
+
+def _pct(values, q):
+    s = sorted(values)
+    return s[min(len(s) - 1, int(q * len(s)))]
+
+def run_level(n, clicks, think, seed):
+    """Metrics for n concurrent sessions against a fresh server."""
+    port = _free_port()
+    server = start_server(port)
+    try:
+        # one throwaway session so the idle numbers include the warm-up render
+        asyncio.run(_drive(f"ws://127.0.0.1:{port}", 1, 0, 0, seed))
+        cpu0, rss0 = proc_stats(server.pid)
+        first, clicked, wall, nbytes, deltas, errors = asyncio.run(
+            _drive(f"ws://127.0.0.1:{port}", n, clicks, think, seed))
+        cpu1, rss1 = proc_stats(server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    out = {
+        "time_us.first_run_p50": statistics.median(first) * 1e6,
+        "time_us.rerun_p50":     _pct(clicked, 0.5) * 1e6,
+        "time_us.rerun_p90":     _pct(clicked, 0.9) * 1e6,
+        "time_us.rerun_p99":     _pct(clicked, 0.99) * 1e6,
+        "time_us.rerun_max":     max(clicked) * 1e6,
+        "reruns_per_s":          len(clicked) / wall,
+        "bytes.per_rerun":       nbytes / len(clicked),
+        "deltas.per_rerun":      deltas / len(clicked),
+        "errors":                errors,
+    }
+    if cpu0 is not None:
+        out["time_us.server_cpu_per_rerun"] = (cpu1 - cpu0) / len(clicked) * 1e6
+        out["server_cpu_util"] = (cpu1 - cpu0) / wall
+        out["mem.rss_idle"] = rss0
+        out["mem.rss_per_session"] = (rss1 - rss0) / n
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", default="1,5,10,25",
+                        help="comma-separated concurrent session counts, one server each")
+    parser.add_argument("--clicks", type=int, default=20, help="widget changes per session")
+    parser.add_argument("--think", type=float, default=0.25,
+                        help="mean seconds between a session's clicks (0 = back to back)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="record this run as benchmarks/load_baseline.json")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown before a timing counts as a regression")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for n in (int(v) for v in args.sessions.split(",")):
+        level = run_level(n, args.clicks, args.think, args.seed)
+        print(f"{n:4} sessions  p50 {level['time_us.rerun_p50'] / 1e3:7.1f} ms  "
+              f"p90 {level['time_us.rerun_p90'] / 1e3:7.1f} ms  "
+              f"p99 {level['time_us.rerun_p99'] / 1e3:7.1f} ms  "
+              f"{level['reruns_per_s']:6.1f} reruns/s  {level['deltas.per_rerun']:4.1f} deltas"
+              + (f"  cpu {level['time_us.server_cpu_per_rerun'] / 1e3:5.1f} ms/rerun "
+                 f"({level['server_cpu_util']:4.0%})  "
+                 f"rss {level['mem.rss_per_session'] / 1024:7.0f} KiB/session"
+                 if "server_cpu_util" in level else "")
+              + (f"  {level['errors']} errors" if level["errors"] else ""))
+        results.update({f"{k}@{n}": v for k, v in level.items()})
+
+    import streamlit
+    meta = {"python": platform.python_version(), "machine": platform.machine(),
+            "cpus": os.cpu_count(), "streamlit": streamlit.__version__,
+            "when": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "clicks": args.clicks, "think": args.think, "seed": args.seed}
+    os.makedirs(RESULTS, exist_ok=True)
+    with open(os.path.join(RESULTS, "load.json"), "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=1)
+
+    if args.save_baseline:
+        with open(BASELINE, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=1)
+        print(f"baseline saved to {BASELINE}")
+        return 0
+    if not os.path.exists(BASELINE):
+        print("no load baseline recorded (run with --save-baseline)")
+        return 0
+
+    with open(BASELINE) as f:
+        baseline = json.load(f)["results"]
+    # timings, payload sizes and errors are compared; throughput and CPU share follow
+    # the think time, and RSS is too noisy to hold to "no growth"
+    baseline = {k: v for k, v in baseline.items()
+                if k.startswith(("time_us.", "bytes.", "deltas.", "errors"))}
+    worse = compare(results, baseline, args.tolerance)
+    for k, base, now in worse:
+        print(f"REGRESSION {k}: {base:,.2f} -> {now:,.2f}"
+              + (f" ({now / base - 1:+.0%})" if base else ""))
+    if not worse:
+        print(f"no regressions against the load baseline (tolerance {args.tolerance:.0%})")
+    return 1 if worse else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+Benchmarks for the neutropaenic sepsis pathway app.
+
+    python benchmarks/run.py                  # run, compare with the baseline
+    python benchmarks/run.py --save-baseline  # run and record as the baseline
+    python benchmarks/run.py --skip-e2e       # without the headless app reruns
+
+Timings are the best of several repeats, in µs per call; sizes are bytes.
+Results go to benchmarks/results/latest.json.  A timing more than
+--tolerance slower than the baseline (or a payload that grew at all) is
+reported as a regression and the exit status is 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+APP = os.path.join(ROOT, "neutropenic_sepsis_app.py")
+BASELINE = os.path.join(HERE, "baseline.json")
+RESULTS = os.path.join(HERE, "results")
+
+sys.path.insert(0, ROOT)
+from neutropenic_sepsis import batch, core, layout, ward  # noqa: E402
+
+
+def _best(fn, number, repeat=5):
+    """Best-of-repeat time of fn() in µs."""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def all_inputs():
+    return [core.index_inputs(i) for i in range(1 << len(core.PATHWAY.INPUTS))]
+
+
+# ── micro-benchmarks ──────────────────────────────────────────────────────────
+
+def bench_micro():
+    inputs = all_inputs()
+    states = [core.determine_pathway(**kw) for kw in inputs]
+    labels = [(label, core.PATHWAY.G[nid][2], opts.get("fs", 10), opts.get("bold", False))
+              for nid, _, label, opts in core.PATHWAY.NODES if label]
+    n = len(inputs)
+
+    def wrap_cold():
+        core._wrap.cache_clear()
+        for args in labels:
+            core._wrap(*args)
+
+    def wrap_warm():
+        for args in labels:
+            core._wrap(*args)
+
+    out = {
+        "determine_pathway":   _best(lambda: [core.determine_pathway(**kw) for kw in inputs], 200) / n,
+        "lookup_pathway":      _best(lambda: [batch.lookup_pathway(**kw) for kw in inputs], 200) / n,
+        "get_recommendations": _best(lambda: [core.get_recommendations(AN) for AN in states], 200) / n,
+        "build_svg_inline":    _best(lambda: [core.build_svg(AN) for AN in states], 20) / n,
+        "build_svg_compact":   _best(lambda: [core.build_svg(AN, compact=True) for AN in states], 20) / n,
+        "wrap_cold":           _best(wrap_cold, 20) / len(labels),
+        "wrap_warm":           _best(wrap_warm, 200) / len(labels),
+        "compile_layout":      _best(lambda: core._compile(False), 3, repeat=3),
+    }
+    wrap_warm()   # leave the label cache populated
+    return {f"time_us.{k}": v for k, v in out.items()}
+
+
+# ── auto layout ───────────────────────────────────────────────────────────────
+
+def random_flowchart(n, seed=0):
+    """A guideline-like DAG: ~sqrt(n) nodes per rank, 1-3 children one or two ranks down."""
+    rnd = random.Random(seed)
+    width = max(2, int(n ** 0.5))
+    ids = [f"n{i}" for i in range(n)]
+    nodes = [(v, rnd.choice((120, 150, 185)), rnd.choice((34, 46, 56))) for v in ids]
+    edges = []
+    for i, v in enumerate(ids):
+        rank = i // width
+        cand = ids[(rank + 1) * width:(rank + 3) * width]
+        edges += [(v, w) for w in rnd.sample(cand, min(len(cand), rnd.choice((1, 1, 2, 3))))]
+    return nodes, edges
+
+def bench_layout(sizes=(50, 200, 1000)):
+    out = {}
+    for n in sizes:
+        nodes, edges = random_flowchart(n)
+        def run():
+            layout._layout.cache_clear()
+            return layout.layout(nodes, edges)
+        out[f"time_us.layout_{n}"] = _best(run, 1, repeat=3)
+        out[f"time_us.layout_{n}_cached"] = _best(lambda: layout.layout(nodes, edges), 20)
+    return out
+
+
+# ── payload sizes ─────────────────────────────────────────────────────────────
+
+def bench_payload():
+    states = list(core.reachable_pathways().values())
+    shell, shell_hash = core.flowchart_shell()
+    # per-click component arguments once the shell is mounted
+    click = [len(json.dumps({"shell": None, "shell_hash": shell_hash, "active": sorted(AN),
+                             "dim": len(AN) > 2, "png_export": True, "png": None,
+                             "png_id": None}))
+             for AN in states]
+    # the full document every rerun used to send through components.html
+    legacy = [len(core.COPY_JS) + len(core.build_svg(AN)) for AN in states]
+    # ward view: shell once, then one row per patient each rerun
+    patients = [(f"p{i}", f"Bed {i + 1}", i % len(core.PATHWAY.PATHWAY_TABLE)) for i in range(40)]
+    return {
+        "bytes.shell":            len(shell.encode("utf-8")),
+        "bytes.click_args_max":   max(click),
+        "bytes.svg_inline_max":   max(len(core.build_svg(AN).encode("utf-8")) for AN in states),
+        "bytes.svg_compact_max":  max(len(core.build_svg(AN, compact=True).encode("utf-8"))
+                                      for AN in states),
+        "bytes.legacy_html_max":  max(legacy),
+        "bytes.ward_shell":       len(json.dumps(ward.ward_shell()[0], ensure_ascii=False).encode("utf-8")),
+        "bytes.ward_rows_40":     len(json.dumps(ward.ward_rows(patients)).encode("utf-8")),
+    }
+
+
+# ── headless import ───────────────────────────────────────────────────────────
+
+IMPORT_PROBE = """
+import sys, time
+t0 = time.perf_counter()
+import neutropenic_sepsis.core
+print(time.perf_counter() - t0, "streamlit" in sys.modules)
+"""
+
+def bench_import(repeat=5):
+    """Cold import of the core in a fresh interpreter; it must not pull in Streamlit."""
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=ROOT, check=True,
+                             capture_output=True, text=True).stdout.split()
+        if out[1] == "True":
+            raise RuntimeError("importing neutropenic_sepsis.core imported streamlit")
+        best = min(best or float("inf"), float(out[0]))
+    return {"time_us.import_core": best * 1e6}
+
+
+# ── end-to-end reruns ─────────────────────────────────────────────────────────
+
+def _flip(at):
+    """Change every enabled widget in turn, yielding after each change."""
+    for kind in ("radio", "checkbox"):
+        for i in range(len(getattr(at, kind))):
+            w = getattr(at, kind)[i]          # fresh: the tree is rebuilt each run
+            if w.disabled:
+                continue
+            if kind == "checkbox":
+                w.set_value(not w.value)
+            else:
+                w.set_value(next(o for o in w.options if o != w.value))
+            yield
+
+
+def bench_e2e(rounds):
+    from streamlit.testing.v1 import AppTest
+
+    t0 = time.perf_counter()
+    at = AppTest.from_file(APP, default_timeout=60).run()
+    first = (time.perf_counter() - t0) * 1e6
+    if at.exception:
+        raise RuntimeError(f"app raised: {at.exception}")
+
+    times = []
+    for _ in range(rounds):
+        for _ in _flip(at):
+            t0 = time.perf_counter()
+            at.run()
+            times.append((time.perf_counter() - t0) * 1e6)
+    times.sort()
+    return {
+        "time_us.e2e_first_run": first,
+        "time_us.e2e_rerun_p50": statistics.median(times),
+        "time_us.e2e_rerun_p90": times[int(len(times) * 0.9) - 1],
+    }
+
+
+# ── baseline comparison ───────────────────────────────────────────────────────
+
+def compare(results, baseline, tolerance):
+    """[(metric, baseline, now)] for metrics that got worse."""
+    worse = []
+    for k, base in baseline.items():
+        now = results.get(k)
+        if now is None or not isinstance(base, (int, float)):
+            continue
+        limit = base * (1 + tolerance) if k.startswith("time_us.") else base
+        if now > limit:
+            worse.append((k, base, now))
+    return worse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="record this run as benchmarks/baseline.json")
+    parser.add_argument("--skip-e2e", action="store_true", help="skip the headless app reruns")
+    parser.add_argument("--rounds", type=int, default=5, help="passes over the widgets (e2e)")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown before a timing counts as a regression")
+    args = parser.parse_args(argv)
+
+    results = {}
+    results.update(bench_micro())
+    results.update(bench_layout())
+    results.update(bench_payload())
+    results.update(bench_import())
+    if not args.skip_e2e:
+        results.update(bench_e2e(args.rounds))
+
+    for k, v in results.items():
+        print(f"{k:32} {v:14,.2f}" if k.startswith("time_us.") else f"{k:32} {v:14,}")
+
+    meta = {"python": platform.python_version(), "machine": platform.machine(),
+            "when": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    os.makedirs(RESULTS, exist_ok=True)
+    with open(os.path.join(RESULTS, "latest.json"), "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=1)
+
+    if args.save_baseline:
+        with open(BASELINE, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=1)
+        print(f"baseline saved to {BASELINE}")
+        return 0
+    if not os.path.exists(BASELINE):
+        print("no baseline recorded (run with --save-baseline)")
+        return 0
+
+    with open(BASELINE) as f:
+        baseline = json.load(f)["results"]
+    worse = compare(results, baseline, args.tolerance)
+    for k, base, now in worse:
+        print(f"REGRESSION {k}: {base:,.2f} -> {now:,.2f} ({now / base - 1:+.0%})")
+    if not worse:
+        print(f"no regressions against the baseline (tolerance {args.tolerance:.0%})")
+    return 1 if worse else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
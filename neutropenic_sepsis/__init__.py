@@ -0,0 +1,7 @@
+"""
+Neutropaenic Sepsis Management — pathway logic, flowchart rendering and
+recommendations, importable without Streamlit.
+"""
+
+from .batch import evaluate_batch, lookup_pathway, run_batch
+from .core import build_svg, determine_pathway, get_recommendations, pathway_key, pathway_nodes
@@ -0,0 +1,261 @@
+"""
+Decision audit log: which pathway and recommendations were shown, and when.
+
+    audit.start("audit.sqlite")          # or a .jsonl path (rotated)
+    audit.record(AN, recs, inputs=inputs, session=session)
+
+record() only puts the event on a bounded in-memory queue; a background
+thread writes queued events in batches (one SQLite transaction / one write
+per batch), so the click path never waits on the disk.  When the queue is
+full the policy decides: "drop-new" (default) and "drop-oldest" never block,
+"block" waits up to block_timeout and then drops.  Dropped events are
+counted (ns_audit_events_total{result="dropped"}).  The queue is flushed
+on stop(), which also runs at interpreter exit.
+
+    NS_AUDIT          log path; nothing is recorded unless set
+    NS_AUDIT_QUEUE    queue size (default 10000)
+    NS_AUDIT_POLICY   drop-new | drop-oldest | block
+
+read(path) streams the log back, oldest first, for analysis:
+
+    python -m neutropenic_sepsis audit audit.sqlite --since 2024-05-01
+"""
+
+import atexit
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+from . import core, metrics
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0         # s; a partial batch waits at most this long
+POLICIES = ("drop-new", "drop-oldest", "block")
+
+_writer = None
+_lock = threading.Lock()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# SINKS
+#
+# write(events) appends one batch; close() flushes.  Both run on the writer
+# thread only.
+# ══════════════════════════════════════════════════════════════════════════════
+
+_COLUMNS = ("ts", "session", "spec", "inputs", "nodes", "recommendations")
+
+def _is_sqlite(path):
+    return path.endswith((".sqlite", ".sqlite3", ".db"))
+
+class _SqliteSink:
+    def __init__(self, path):
+        # opened by start(), used by the writer thread only
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS events (ts REAL NOT NULL, session TEXT, "
+                        "spec TEXT, inputs TEXT, nodes TEXT, recommendations TEXT)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS events_ts ON events (ts)")
+
+    def write(self, events):
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)",
+                [(e["ts"], e["session"], e["spec"], json.dumps(e["inputs"]),
+                  json.dumps(e["nodes"]), json.dumps(e["recommendations"], ensure_ascii=False))
+                 for e in events])
+
+    def close(self):
+        self.db.close()
+
+class _JsonlSink:
+    """JSON lines, rotated to path.1 ... path.<backups> past max_bytes."""
+
+    def __init__(self, path, max_bytes=50 << 20, backups=10):
+        self.path, self.max_bytes, self.backups = path, max_bytes, backups
+        self.f = open(path, "a", encoding="utf-8")
+
+    def write(self, events):
+        self.f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in events))
+        self.f.flush()
+        if self.f.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self.f.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+        self.f = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        self.f.close()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# WRITER
+# ══════════════════════════════════════════════════════════════════════════════
+
+_STOP = object()
+
+class _Writer:
+    def __init__(self, path, queue_size, policy, block_timeout):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown audit backpressure policy {policy!r}; use one of {POLICIES}")
+        self.path, self.policy, self.block_timeout = path, policy, block_timeout
+        self.q = queue.Queue(queue_size)
+        # opened here so that a bad path fails in start(), not on the thread
+        self.sink = _SqliteSink(path) if _is_sqlite(path) else _JsonlSink(path)
+        self.thread = threading.Thread(target=self._run, name="ns-audit", daemon=True)
+        self.thread.start()
+
+    def put(self, event):
+        try:
+            if self.policy == "block":
+                self.q.put(event, timeout=self.block_timeout)
+            else:
+                self.q.put_nowait(event)
+        except queue.Full:
+            if self.policy != "drop-oldest":
+                metrics.inc("audit_events", result="dropped")
+                return False
+            try:
+                self.q.get_nowait()
+            except queue.Empty:
+                pass
+            metrics.inc("audit_events", result="dropped")
+            return self.put(event)
+        metrics.inc("audit_events", result="queued")
+        return True
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                try:
+                    e = self.q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if e is _STOP:
+                    stopping = True
+                    break
+                batch.append(e)
+            if batch:
+                self._write(batch)
+        # anything put after the stop marker
+        rest = []
+        while True:
+            try:
+                e = self.q.get_nowait()
+            except queue.Empty:
+                break
+            if e is not _STOP:
+                rest.append(e)
+        if rest:
+            self._write(rest)
+        try:
+            self.sink.close()
+        except Exception:
+            pass
+
+    def _write(self, batch):
+        # any failure costs this batch, never the writer thread
+        try:
+            self.sink.write(batch)
+            metrics.inc("audit_batches")
+        except Exception:
+            metrics.inc("audit_events", len(batch), result="failed")
+
+    def stop(self, timeout=10.0):
+        """Flush and stop, waiting at most timeout (a stuck sink is left behind)."""
+        deadline = time.monotonic() + timeout
+        try:
+            self.q.put(_STOP, timeout=timeout)   # waits while the writer drains a full queue
+        except queue.Full:
+            return
+        self.thread.join(max(0.0, deadline - time.monotonic()))
+
+
+def start(path, queue_size=QUEUE_SIZE, policy="drop-new", block_timeout=0.05):
+    """Start recording to path (SQLite for .sqlite / .db, else JSON lines); once per process."""
+    global _writer
+    with _lock:
+        if _writer is None:
+            _writer = _Writer(path, queue_size, policy, block_timeout)
+            metrics.gauge("audit_queue", lambda: {(): _writer.q.qsize() if _writer else 0})
+            atexit.register(stop)
+    return _writer
+
+def start_from_env():
+    if os.environ.get("NS_AUDIT"):
+        start(os.environ["NS_AUDIT"], int(os.environ.get("NS_AUDIT_QUEUE") or QUEUE_SIZE),
+              os.environ.get("NS_AUDIT_POLICY") or "drop-new")
+
+def stop():
+    """Flush everything queued and stop the writer."""
+    global _writer
+    with _lock:
+        w, _writer = _writer, None
+    if w is not None:
+        w.stop()
+
+def record(AN, recs, inputs=None, session=None):
+    """Queue one shown pathway; False if it was dropped (or nothing is recording)."""
+    w = _writer
+    if w is None:
+        return False
+    return w.put({
+        "ts": time.time(),
+        "session": session,
+        "spec": core.PATHWAY.SPEC_HASH,
+        "inputs": inputs,
+        "nodes": sorted(AN),
+        "recommendations": [title for _, title, _ in recs],
+    })
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# QUERY
+# ══════════════════════════════════════════════════════════════════════════════
+
+def read(path, since=None, until=None, session=None):
+    """Stream events (dicts, oldest first) with since <= ts < until, optionally one session's."""
+    if _is_sqlite(path):
+        yield from _read_sqlite(path, since, until, session)
+        return
+    folder, base = os.path.split(os.path.abspath(path))
+    rotated = sorted((int(m.group(1)), m.group(0)) for m in
+                     (re.fullmatch(re.escape(base) + r"\.(\d+)", n) for n in os.listdir(folder)) if m)
+    files = [os.path.join(folder, n) for _, n in reversed(rotated)]
+    for name in files + ([path] if os.path.exists(path) else []):
+        with open(name, encoding="utf-8") as f:
+            for line in f:
+                e = json.loads(line)
+                if ((since is None or e["ts"] >= since) and (until is None or e["ts"] < until)
+                        and (session is None or e["session"] == session)):
+                    yield e
+
+def _read_sqlite(path, since, until, session):
+    where, args = [], []
+    for cond, v in (("ts >= ?", since), ("ts < ?", until), ("session = ?", session)):
+        if v is not None:
+            where.append(cond)
+            args.append(v)
+    sql = "SELECT * FROM events" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY ts"
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        for row in db.execute(sql, args):
+            e = dict(zip(_COLUMNS, row))
+            for k in ("inputs", "nodes", "recommendations"):
+                e[k] = json.loads(e[k]) if e[k] is not None else None
+            yield e
+    finally:
+        db.close()
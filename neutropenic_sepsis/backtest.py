@@ -0,0 +1,237 @@
+"""
+Back-testing the pathway over historical vitals and labs (needs NumPy).
+
+    python -m neutropenic_sepsis import-observations observations.jsonl store/
+    python -m neutropenic_sepsis backtest store/ --every 24 -o results/
+
+import-observations converts a feed of observations (the JSON lines of
+feed.py) to a columnar store: per series, .npy columns sorted by patient
+then time, which backtest memory-maps.
+
+    store/meta.json                    patient ids (index = position), t0, span
+    store/temp.{patient,ts,value}.npy  temperatures (°C)
+    store/anc.{patient,ts,value}.npy   neutrophil counts (10⁹/L)
+    store/flag.<input>.{...}.npy       any other pathway input, as recorded
+
+ts is whole seconds since meta t0.  The derived inputs follow feed.py's
+rules (FEVER_C, ANC_RESOLVED, AFEBRILE_HOURS), as array operations: the
+time of each patient's last fever is a running maximum over the sorted
+temperatures, and the state at an evaluation time is a binary search into
+each series.  Inputs for every evaluation point then go through
+batch.evaluate_batch.  Patients are processed CHUNK_PATIENTS at a time, so
+only their slice of the store is read into memory.
+"""
+
+import array
+import json
+import os
+import time
+
+import numpy as np
+
+from . import core
+from .batch import evaluate_batch, parse_flag
+from .feed import AFEBRILE_HOURS, ANC_RESOLVED, DERIVED, FEVER_C, KIND_CODES, parse_ts
+
+CHUNK_PATIENTS = 20000
+_COLUMNS = (("patient", np.int32), ("ts", np.int64), ("value", np.float32))
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# STORE
+# ══════════════════════════════════════════════════════════════════════════════
+
+def import_observations(src, outdir):
+    """Write the observations in src (JSON lines, text file) to a store; returns (rows, errors)."""
+    P = core.PATHWAY
+    ids, series = {}, {}
+    rows = errors = 0
+    for line in src:
+        if not line.strip():
+            continue
+        try:
+            obs = json.loads(line)
+            pid = str(obs["patient"])
+            ts = int(parse_ts(obs["ts"]))
+            kind = obs.get("kind") or KIND_CODES.get(str(obs.get("code")))
+            if kind == "flag":
+                if obs.get("name") not in P.INPUTS or obs["name"] in DERIVED:
+                    raise ValueError(f"not a pathway input {obs.get('name')!r}")
+                kind, value = "flag." + obs["name"], float(parse_flag(obs["value"]))
+            elif kind in ("temp", "anc"):
+                value = float(obs["value"])
+            else:
+                continue
+        except (KeyError, TypeError, ValueError):
+            errors += 1
+            continue
+        cols = series.get(kind)
+        if cols is None:
+            cols = series[kind] = (array.array("i"), array.array("q"), array.array("f"))
+        cols[0].append(ids.setdefault(pid, len(ids)))
+        cols[1].append(ts)
+        cols[2].append(value)
+        rows += 1
+
+    t0 = min((min(c[1]) for c in series.values()), default=0)
+    t1 = max((max(c[1]) for c in series.values()), default=0)
+    os.makedirs(outdir, exist_ok=True)
+    for kind, cols in series.items():
+        patient, ts, value = (np.frombuffer(c, dtype=dt) for c, (_, dt) in zip(cols, _COLUMNS))
+        order = np.lexsort((ts, patient))      # stable: later lines win ties, as in the feed
+        for (name, dt), col in zip(_COLUMNS, (patient, ts - t0, value)):
+            np.save(os.path.join(outdir, f"{kind}.{name}.npy"), col[order].astype(dt))
+    with open(os.path.join(outdir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"patients": list(ids), "t0": t0, "span": t1 - t0 + 1,
+                   "series": sorted(series)}, f)
+    return rows, errors
+
+def open_store(path):
+    """(meta, {series: (patient, ts, value) memory-mapped columns})."""
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    series = {kind: tuple(np.load(os.path.join(path, f"{kind}.{name}.npy"), mmap_mode="r")
+                          for name, _ in _COLUMNS)
+              for kind in meta["series"]}
+    return meta, series
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# CRITERIA
+#
+# Within a chunk every series is sorted by (patient, ts), so patient * span +
+# ts is one ascending key: searchsorted on it finds, for each evaluation
+# point, the patient's last observation at or before that time.
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _slice(cols, lo, hi):
+    """The rows of patients lo <= p < hi, read into memory."""
+    a, b = np.searchsorted(cols[0], (lo, hi))
+    return tuple(np.asarray(c[a:b]) for c in cols)
+
+def _latest(key, p, t, span):
+    """Row of the last observation at or before t of patient p, and whether there is one."""
+    pos = np.searchsorted(key, p.astype(np.int64) * span + t, side="right") - 1
+    ok = pos >= 0
+    ok[ok] = key[pos[ok]] // span == p[ok]
+    return pos, ok
+
+def criteria(series, p, t, span, P=None):
+    """{input: bool array} at the evaluation points (p[i], t[i]), for one chunk of series."""
+    P = P or core.PATHWAY
+    window = AFEBRILE_HOURS * 3600
+    out = {}
+    for name in P.INPUTS:
+        if name not in DERIVED:
+            cols = series.get("flag." + name)
+            default = _flag_default(name, P)
+            if cols is None or not len(cols[0]):
+                out[name] = np.full(len(p), default)
+                continue
+            pos, ok = _latest(cols[0].astype(np.int64) * span + cols[1], p, t, span)
+            out[name] = np.where(ok, cols[2][pos] != 0, default)
+
+    patient, ts, value = series.get("temp") or (np.zeros(0, np.int32), np.zeros(0, np.int64),
+                                                np.zeros(0, np.float32))
+    base = patient.astype(np.int64) * span
+    # running max of "time of the last fever", reset per patient by the
+    # offset: base - 1 (no fever yet) beats any earlier patient's value
+    last_fever = np.maximum.accumulate(np.where(value >= FEVER_C, base + ts, base - 1)) - base
+    first = np.flatnonzero(np.r_[True, patient[1:] != patient[:-1]])
+    first_temp = np.repeat(ts[first], np.diff(np.r_[first, len(ts)]))
+    since = np.where(last_fever >= 0, last_fever, first_temp)
+    if len(ts):
+        pos, ok = _latest(base + ts, p, t, span)
+        afebrile = ok & (t - since[pos] >= window)
+    else:
+        afebrile = np.zeros(len(p), bool)
+    out["fever_resolved"] = afebrile & out.get("stable", True)
+
+    cols = series.get("anc")
+    if cols is not None and len(cols[0]):
+        pos, ok = _latest(cols[0].astype(np.int64) * span + cols[1], p, t, span)
+        out["neutro_resolved"] = ok & (cols[2][pos] >= ANC_RESOLVED)
+    else:
+        out["neutro_resolved"] = np.zeros(len(p), bool)
+    return out
+
+def _flag_default(name, P):
+    fields = P.SPEC.get("form", {}).get("fields", ())
+    return bool(next((f["default"] for f in fields if f["input"] == name), False))
+
+def _points(series, every):
+    """Evaluation points (patient, ts) of one chunk: each observation, or every `every` s."""
+    p = np.concatenate([c[0] for c in series.values()])
+    t = np.concatenate([c[1] for c in series.values()])
+    if every is None:
+        pts = np.unique(p.astype(np.int64) << 32 | t)    # ts < 2**32 s past t0
+        return (pts >> 32).astype(np.int32), pts & 0xFFFFFFFF
+    order = np.lexsort((t, p))
+    p, t = p[order], t[order]
+    first = np.r_[True, p[1:] != p[:-1]]
+    last = np.r_[p[1:] != p[:-1], True]
+    start, end = t[first], t[last]
+    n = (end - start) // every + 1
+    offsets = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    return np.repeat(p[first], n), np.repeat(start, n) + offsets * every
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# BACK-TEST
+# ══════════════════════════════════════════════════════════════════════════════
+
+def run(path, every=None, outdir=None, chunk_patients=CHUNK_PATIENTS):
+    """
+    Evaluate the pathway at every point of the store at path: at each
+    observation, or every `every` hours from each patient's first to last.
+    With outdir, writes patient / ts / pathway (node bitmask) / recommendation
+    code .npy columns, one row per point.  Returns a summary dict.
+    """
+    P = core.PATHWAY
+    meta, store = open_store(path)
+    span, n_patients = meta["span"], len(meta["patients"])
+    step = None if every is None else int(every * 3600)
+    t0 = time.perf_counter()
+
+    def chunks():
+        for lo in range(0, n_patients, chunk_patients):
+            yield {k: _slice(cols, lo, lo + chunk_patients) for k, cols in store.items()}
+
+    out = None
+    if outdir is not None:
+        total = sum(len(_points(s, step)[0]) for s in chunks())
+        os.makedirs(outdir, exist_ok=True)
+        out = [np.lib.format.open_memmap(os.path.join(outdir, f"{name}.npy"), "w+", dt, (total,))
+               for name, dt in (("patient", np.int32), ("ts", np.int64),
+                                ("pathway", np.uint64), ("recommendations", np.uint16))]
+
+    points = 0
+    shown = np.zeros((len(P.RECOMMENDATIONS), 2), np.int64)   # points, patients
+    resolved = dict.fromkeys(DERIVED, 0)                          # patients ever
+    for series in chunks():
+        p, t = _points(series, step)
+        if not len(p):
+            continue
+        inputs = criteria(series, p, t, span, P)
+        masks, codes = evaluate_batch(**inputs)
+        if out is not None:
+            for col, v in zip(out, (p, t + meta["t0"], masks, codes)):
+                col[points:points + len(p)] = v
+        points += len(p)
+        for i in range(len(P.RECOMMENDATIONS)):
+            hit = (codes >> i & 1).astype(bool)
+            shown[i] += hit.sum(), len(np.unique(p[hit]))
+        for name in DERIVED:
+            resolved[name] += len(np.unique(p[inputs[name]]))
+    if out is not None:
+        for col in out:
+            col.flush()
+    return {
+        "spec": P.SPEC_HASH,
+        "patients": n_patients,
+        "points": points,
+        "seconds": time.perf_counter() - t0,
+        "resolved": resolved,
+        "recommendations": {title: {"points": int(n), "patients": int(m)}
+                            for (_, _, title, _), (n, m) in zip(P.RECOMMENDATIONS, shown)},
+    }
@@ -0,0 +1,188 @@
+"""
+The decision table, one patient or many at a time: table lookups, the
+vectorised evaluate_batch (needs NumPy), the table self-check, and run_batch
+over files of stored assessments.
+"""
+
+import collections
+import concurrent.futures
+import csv
+import functools
+import itertools
+import json
+import os
+
+from . import core
+from .spec import walk_decision
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# DECISION TABLE
+#
+# core.compile_spec builds P.PATHWAY_TABLE and P.REC_TABLE: input index ->
+# pathway_key, rec_code (see core.input_index).
+# ══════════════════════════════════════════════════════════════════════════════
+
+def lookup_pathway(**inputs):
+    """determine_pathway by table: (node bitmask, recommendation code)."""
+    P = core.PATHWAY
+    i = core.input_index(P, **inputs)
+    return P.PATHWAY_TABLE[i], P.REC_TABLE[i]
+
+@functools.lru_cache(maxsize=1)
+def _np_tables(P):
+    import numpy as np
+    # object arrays once a spec outgrows 64 nodes / 16 recommendations
+    return (np.array(P.PATHWAY_TABLE, dtype=np.uint64 if len(P.NODE_IDS) <= 64 else object),
+            np.array(P.REC_TABLE, dtype=np.uint16 if len(P.RECOMMENDATIONS) <= 16 else object))
+
+def evaluate_batch(*cols, **named):
+    """
+    Vectorised determine_pathway for many patients at once (needs NumPy).
+
+    One boolean array per input, positionally in INPUTS order or by name
+    (anything np.asarray accepts; arrays broadcast).  Returns (node bitmasks
+    as uint64, recommendation codes as uint16), decoded per patient with
+    pathway_nodes / recommendations_for.
+    """
+    import numpy as np
+    P = core.PATHWAY
+    if cols:
+        given = P.INPUTS[:len(cols)]
+        if len(cols) > len(P.INPUTS) or named.keys() & set(given):
+            raise TypeError(f"evaluate_batch() takes exactly: {', '.join(P.INPUTS)}")
+        named.update(zip(given, cols))
+    if named.keys() != P._INPUT_SET:
+        raise TypeError(f"evaluate_batch() takes exactly: {', '.join(P.INPUTS)}")
+    cols = np.broadcast_arrays(*(named[name] for name in P.INPUTS))
+    idx = np.zeros(cols[0].shape, dtype=np.intp)
+    for bit, col in enumerate(cols):
+        idx |= col.astype(bool).astype(np.intp) << bit
+    masks, codes = _np_tables(P)
+    return masks[idx], codes[idx]
+
+def check_decision_table():
+    """
+    Compare determine_pathway / get_recommendations with the table and the
+    vectorised batch path for all 64 input combinations; returns mismatches.
+    """
+    P = core.PATHWAY
+    bad = []
+    n = 1 << len(P.INPUTS)
+    for i in range(n):
+        inputs = core.index_inputs(i, P)
+        AN = walk_decision(P.DECISION, inputs)
+        key, code = P.PATHWAY_TABLE[i], P.REC_TABLE[i]
+        if (key != core.pathway_key(AN, P)
+                or core.recommendations_for(code, P) != core.get_recommendations(AN, P)):
+            bad.append((inputs, "table"))
+    try:
+        import numpy as np
+    except ImportError:
+        return bad
+    idx = np.arange(n)
+    masks, codes = evaluate_batch(*((idx >> b) & 1 for b in range(len(P.INPUTS))))
+    for i in range(n):
+        if int(masks[i]) != P.PATHWAY_TABLE[i] or int(codes[i]) != P.REC_TABLE[i]:
+            bad.append((core.index_inputs(i, P), "batch"))
+    return bad
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# BATCH EVALUATION
+#
+# Replays stored assessments (CSV with a header row, or JSON lines) through
+# the decision table without the UI.  Input is read in chunks and evaluated
+# by a process pool with a bounded number of chunks in flight, so memory
+# stays flat however large the file; results are written as JSON lines in
+# input order.
+# ══════════════════════════════════════════════════════════════════════════════
+
+_TRUE  = {"1", "true", "t", "yes", "y"}
+_FALSE = {"0", "false", "f", "no", "n"}
+
+def parse_flag(v):
+    """
+    bool from a recorded yes/no value.  Blank, null and anything else
+    unrecognised are ValueError: a missing answer is not a "no".
+    """
+    if isinstance(v, bool) or isinstance(v, (int, float)) and v in (0, 1):
+        return bool(v)
+    if isinstance(v, str):
+        s = v.strip().lower()
+        if s in _TRUE:
+            return True
+        if s in _FALSE:
+            return False
+    raise ValueError(f"not a yes/no value: {v!r}")
+
+@functools.lru_cache(maxsize=1)
+def _batch_results(P):
+    """Per table index, the JSON for its pathway and recommendation titles."""
+    return tuple(
+        '"pathway": ' + json.dumps(sorted(core.pathway_nodes(key, P)))
+        + ', "recommendations": '
+        + json.dumps([title for _, title, _ in core.recommendations_for(code, P)],
+                     ensure_ascii=False)
+        for key, code in zip(P.PATHWAY_TABLE, P.REC_TABLE)
+    )
+
+def _batch_chunk(kind, header, rows, id_field, first_row):
+    """Evaluate one chunk; returns (JSON lines, number of rows in error)."""
+    P = core.PATHWAY
+    results = _batch_results(P)
+    out, errors = [], 0
+    for n, row in enumerate(rows, first_row):
+        try:
+            rec = json.loads(row) if kind == "jsonl" else dict(zip(header, row))
+            idx = core.input_index(P, **{k: parse_flag(rec[k]) for k in P.INPUTS})
+        except (KeyError, ValueError, TypeError) as e:
+            msg = f"missing field {e}" if isinstance(e, KeyError) else str(e)
+            out.append(json.dumps({"row": n, "error": msg}))
+            errors += 1
+            continue
+        rid = json.dumps(rec.get(id_field), ensure_ascii=False)
+        out.append(f'{{"row": {n}, "id": {rid}, {results[idx]}}}')
+    return "".join(line + "\n" for line in out), errors
+
+def run_batch(src, dst, kind, chunk_size=5000, workers=None, id_field="id"):
+    """
+    Stream assessments from src (text file) to dst as JSON lines.
+
+    kind is "csv" or "jsonl"; workers=0 evaluates in this process.
+    Returns (rows read, rows in error).
+    """
+    if kind == "csv":
+        reader = csv.reader(src)
+        header = next(reader, [])
+        rows = reader
+    else:
+        header = None
+        rows = (line for line in src if line.strip())
+    chunks = iter(lambda: list(itertools.islice(rows, chunk_size)), [])
+
+    total = errors = 0
+    if workers == 0:
+        for chunk in chunks:
+            text, bad = _batch_chunk(kind, header, chunk, id_field, total + 1)
+            dst.write(text)
+            total, errors = total + len(chunk), errors + bad
+        return total, errors
+
+    workers = workers or os.cpu_count() or 1
+    pending = collections.deque()
+
+    def drain(limit):
+        nonlocal errors
+        while len(pending) > limit:
+            text, bad = pending.popleft().result()
+            dst.write(text)
+            errors += bad
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        for chunk in chunks:
+            pending.append(pool.submit(_batch_chunk, kind, header, chunk, id_field, total + 1))
+            total += len(chunk)
+            drain(2 * workers)
+        drain(0)
+    return total, errors
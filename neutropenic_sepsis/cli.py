@@ -0,0 +1,316 @@
+"""
+Headless tools for the neutropaenic sepsis pathway.
+
+    python -m neutropenic_sepsis verify
+    python -m neutropenic_sepsis export-static site/
+    python -m neutropenic_sepsis serve --port 8502
+    python -m neutropenic_sepsis batch assessments.csv -o results.jsonl
+    python -m neutropenic_sepsis ingest observations.jsonl --follow
+    python -m neutropenic_sepsis backtest store/ --every 24
+"""
+
+import argparse
+import copy
+import gzip
+import json
+import sys
+import time
+import timeit
+
+from . import core
+from .batch import check_decision_table, run_batch
+from .core import (SPEC_PATH, _compile, build_svg, check_layout, compile_spec, prerender,
+                   reachable_pathways, write_artifacts)
+from .spec import read_spec
+from .static import write_static
+
+# ══════════════════════════════════════════════════════════════════════════════
+# COMMAND LINE
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _cmd_prerender(args):
+    t0 = time.perf_counter()
+    store = prerender()
+    elapsed = time.perf_counter() - t0
+    nbytes = write_artifacts(store, args.outdir)
+    print(f"{len(store)} pathway states rendered in {elapsed * 1000:.1f} ms, "
+          f"{nbytes:,} bytes written to {args.outdir}")
+
+def _cmd_svg_size(args):
+    rows = []
+    for key, AN in sorted(reachable_pathways().items()):
+        full = build_svg(AN).encode("utf-8")
+        small = build_svg(AN, compact=True).encode("utf-8")
+        rows.append((len(full), len(small), len(gzip.compress(full)), len(gzip.compress(small))))
+    print(f"{'state':>10} {'inline':>8} {'compact':>8} {'gz inline':>10} {'gz compact':>11}")
+    for (key, _), (f, c, gf, gc) in zip(sorted(reachable_pathways().items()), rows):
+        print(f"{key:10x} {f:8,} {c:8,} {gf:10,} {gc:11,}")
+    f, c, gf, gc = (sum(col) / len(rows) for col in zip(*rows))
+    print(f"{'mean':>10} {f:8,.0f} {c:8,.0f} {gf:10,.0f} {gc:11,.0f}   "
+          f"compact = {c / f:.0%} of inline ({gc / gf:.0%} gzipped)")
+    # what each transport actually carries: the component shells go over
+    # Streamlit's websocket uncompressed; the HTTP service gzips inline SVG
+    f, c = (len(build_svg(frozenset(), compact=c).encode("utf-8")) for c in (False, True))
+    print(f"{'shell':>10} {f:8,} {c:8,}   sent uncompressed over the websocket: "
+          f"compact = {c / f:.0%} of inline")
+
+def _cmd_bench_svg(args):
+    states = list(reachable_pathways().values())
+    for compact in (False, True):
+        n = args.number
+        t = timeit.timeit(lambda: [build_svg(AN, compact=compact) for AN in states], number=n)
+        tc = timeit.timeit(lambda: _compile(compact), number=max(1, n // 20)) / max(1, n // 20)
+        print(f"{'compact' if compact else 'inline':8} render {t / n / len(states) * 1e6:8.1f} µs   "
+              f"layout + compile {tc * 1e6:8.1f} µs")
+
+def _cmd_bench_render(args):
+    from .core import png_available, render, render_text
+
+    states = list(reachable_pathways().values())
+    n = args.number
+    t = timeit.timeit(lambda: _compile(False), number=max(1, n // 20)) / max(1, n // 20)
+    print(f"{'strings':8} {t * 1e6:8.1f} µs   laying out and formatting the whole chart")
+    runs = [("svg", lambda AN: render(AN, "svg")),
+            ("compact", lambda AN: build_svg(AN, compact=True)),
+            ("txt", lambda AN: render(AN, "txt")),
+            ("ascii", lambda AN: render_text(AN, ascii=True)),
+            ("json", lambda AN: render(AN, "json"))]
+    if png_available():
+        runs.append(("png", lambda AN: render(AN, "png")))
+    for name, fn in runs:
+        k = max(1, n // 50) if name == "png" else n
+        t = timeit.timeit(lambda: [fn(AN) for AN in states], number=k)
+        size = sum(len(fn(AN)) for AN in states) / len(states)
+        print(f"{name:8} {t / k / len(states) * 1e6:8.1f} µs   {size:9,.0f} bytes per state")
+
+def _cmd_verify(args):
+    P = core.PATHWAY
+    print(f"spec {SPEC_PATH} ({P.SPEC_HASH})")
+    bad = check_decision_table()
+    for inputs, where in bad:
+        print(f"MISMATCH ({where}): {inputs}")
+    n = 1 << len(P.INPUTS)
+    print(f"{n - len({str(i) for i, _ in bad})}/{n} input combinations agree with determine_pathway")
+    overflow = check_layout(P)
+    for nid, problem in overflow:
+        print(f"OVERFLOW {nid}: {problem}")
+    print(f"{len(P.NODES) - len({nid for nid, _ in overflow})}/{len(P.NODES)} node labels fit "
+          f"their boxes")
+    if bad or overflow:
+        raise SystemExit(1)
+
+def _cmd_layout(args):
+    spec, sha = read_spec(args.spec)
+    spec = copy.deepcopy(spec)
+    for n in spec["nodes"]:
+        n.pop("box", None)
+    t0 = time.perf_counter()
+    P = compile_spec(spec, sha)
+    elapsed = time.perf_counter() - t0
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(build_svg(json.loads(args.active) if args.active else (), P=P))
+    print(f"{len(spec['nodes'])} nodes laid out and compiled in {elapsed * 1000:.1f} ms, "
+          f"{P.W:.0f}x{P.H:.0f}px, written to {args.output}")
+    for nid, problem in check_layout(P):
+        print(f"OVERFLOW {nid}: {problem}")
+
+def _cmd_export_static(args):
+    t0 = time.perf_counter()
+    nbytes = write_static(args.outdir)
+    print(f"static site for spec {core.PATHWAY.SPEC_HASH} built in "
+          f"{(time.perf_counter() - t0) * 1000:.1f} ms, "
+          f"{nbytes:,} bytes written to {args.outdir}")
+
+def _cmd_serve(args):
+    from . import metrics
+    from .core import watch_spec
+    from .service import make_server
+
+    metrics.start_from_env()
+    watch_spec()
+    server = make_server(args.port, args.host)
+    print(f"serving /pathway/<code>.svg|png|txt|json on http://{args.host}:{args.port} "
+          f"(spec {core.PATHWAY.SPEC_HASH})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def _cmd_audit(args):
+    import datetime
+    from .audit import read
+
+    def when(v):
+        return datetime.datetime.fromisoformat(v).timestamp() if v else None
+    for e in read(args.log, when(args.since), when(args.until), args.session):
+        print(json.dumps(e, ensure_ascii=False))
+
+def _cmd_batch(args):
+    kind = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    src = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    t0 = time.perf_counter()
+    try:
+        rows, errors = run_batch(src, dst, kind, chunk_size=args.chunk_size,
+                                 workers=args.workers, id_field=args.id_field)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    elapsed = time.perf_counter() - t0
+    print(f"{rows:,} rows ({errors:,} in error) in {elapsed:.2f} s, "
+          f"{rows / elapsed if elapsed else 0:,.0f} rows/s", file=sys.stderr)
+
+def _cmd_ingest(args):
+    from . import feed
+
+    dst = sys.stdout if args.output == "-" else open(args.output, "a", encoding="utf-8")
+
+    def emit(event):
+        dst.write(json.dumps(event, ensure_ascii=False) + "\n")
+        dst.flush()
+    src = (feed.tail(args.input, follow=args.follow) if args.input != "-"
+           else feed.lines(sys.stdin))
+    pipeline = feed.Pipeline(emit)
+    t0 = time.perf_counter()
+    try:
+        stats = feed.run(src, pipeline, on_error=lambda e: print(e, file=sys.stderr))
+    except KeyboardInterrupt:
+        stats = pipeline.stats
+    finally:
+        if dst is not sys.stdout:
+            dst.close()
+    elapsed = time.perf_counter() - t0
+    print(f"{stats['observations']:,} observations ({stats['errors']:,} in error), "
+          f"{stats['evaluated']:,} re-evaluations, {stats['events']:,} events, "
+          f"{len(pipeline.patients):,} patients in {elapsed:.2f} s, "
+          f"{stats['observations'] / elapsed if elapsed else 0:,.0f} obs/s", file=sys.stderr)
+
+def _cmd_import_observations(args):
+    from .backtest import import_observations
+
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    t0 = time.perf_counter()
+    try:
+        rows, errors = import_observations(src, args.store)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+    print(f"{rows:,} observations ({errors:,} in error) written to {args.store} "
+          f"in {time.perf_counter() - t0:.2f} s", file=sys.stderr)
+
+def _cmd_backtest(args):
+    from .backtest import run
+
+    summary = run(args.store, every=args.every, outdir=args.output)
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    print(f"{summary['points']:,} evaluations of {summary['patients']:,} patients in "
+          f"{summary['seconds']:.2f} s", file=sys.stderr)
+
+def _cmd_profiles(args):
+    from .profiling import merged
+
+    stats, stacks = merged(args.directory)
+    if args.folded:
+        for stack, n in sorted(stacks.items()):
+            print(f"{stack} {n}")
+    elif stats is None:
+        print(f"no profiles in {args.directory}", file=sys.stderr)
+    else:
+        stats.sort_stats(args.sort).print_stats(args.top)
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m neutropenic_sepsis",
+        description="Headless tools for the neutropaenic sepsis pathway. "
+                    "Use `streamlit run` to start the app itself.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("prerender", help="render every pathway state (SVG and "
+                                         "recommendations) to a directory")
+    p.add_argument("outdir")
+    p.set_defaults(func=_cmd_prerender)
+
+    p = sub.add_parser("svg-size", help="compare inline and compact SVG size per pathway state")
+    p.set_defaults(func=_cmd_svg_size)
+
+    p = sub.add_parser("bench-svg", help="time a compiled render against laying the chart out")
+    p.add_argument("-n", "--number", type=int, default=1000, help="renders per state")
+    p.set_defaults(func=_cmd_bench_svg)
+
+    p = sub.add_parser("bench-render", help="time a render in each output format, from the scene "
+                                            "graph, against building the SVG strings")
+    p.add_argument("-n", "--number", type=int, default=200)
+    p.set_defaults(func=_cmd_bench_render)
+
+    p = sub.add_parser("verify", help="check the decision table against determine_pathway "
+                                      "and that every label fits its box")
+    p.set_defaults(func=_cmd_verify)
+
+    p = sub.add_parser("layout", help="lay a spec out automatically (ignoring its boxes) "
+                                      "and write the chart as SVG")
+    p.add_argument("output")
+    p.add_argument("--spec", default=SPEC_PATH, help="pathway spec (default: the bundled one)")
+    p.add_argument("--active", help='JSON list of node ids to highlight, e.g. \'["header"]\'')
+    p.set_defaults(func=_cmd_layout)
+
+    p = sub.add_parser("export-static", help="write a self-contained HTML/JS build of the "
+                                             "decision aid (no server needed)")
+    p.add_argument("outdir")
+    p.set_defaults(func=_cmd_export_static)
+
+    p = sub.add_parser("serve", help="serve the flowchart for a state code as SVG / PNG over HTTP")
+    p.add_argument("--port", type=int, default=8502)
+    p.add_argument("--host", default="127.0.0.1")
+    p.set_defaults(func=_cmd_serve)
+
+    p = sub.add_parser("audit", help="stream the decision audit log (NS_AUDIT) as JSON lines")
+    p.add_argument("log", help="audit log: .sqlite / .db, or JSON lines")
+    p.add_argument("--since", help="ISO date or time, inclusive")
+    p.add_argument("--until", help="ISO date or time, exclusive")
+    p.add_argument("--session")
+    p.set_defaults(func=_cmd_audit)
+
+    p = sub.add_parser("batch", help="evaluate stored assessments (CSV / JSON lines) to JSON lines")
+    p.add_argument("input", help="CSV with a header row or JSON lines; - for stdin")
+    p.add_argument("-o", "--output", default="-", help="JSON lines output (default stdout)")
+    p.add_argument("--format", choices=("csv", "jsonl"), help="input format (default: by extension)")
+    p.add_argument("--chunk-size", type=int, default=5000, help="rows per work unit")
+    p.add_argument("--workers", type=int, help="worker processes (default: CPU count, 0 = in-process)")
+    p.add_argument("--id-field", default="id", help="column copied to the output to identify the row")
+    p.set_defaults(func=_cmd_batch)
+
+    p = sub.add_parser("ingest", help="follow a feed of temperature / ANC observations (JSON lines) "
+                                      "and emit an event whenever a patient's pathway changes")
+    p.add_argument("input", help="JSON lines observations; - for stdin")
+    p.add_argument("-o", "--output", default="-", help="JSON lines events, appended (default stdout)")
+    p.add_argument("--follow", action="store_true", help="keep reading lines appended to input")
+    p.set_defaults(func=_cmd_ingest)
+
+    p = sub.add_parser("import-observations", help="convert observations (JSON lines, as for ingest) "
+                                                   "to a columnar store for backtest")
+    p.add_argument("input", help="JSON lines observations; - for stdin")
+    p.add_argument("store", help="directory to write")
+    p.set_defaults(func=_cmd_import_observations)
+
+    p = sub.add_parser("backtest", help="evaluate the pathway over a whole observation store "
+                                        "and summarise the recommendations")
+    p.add_argument("store", help="directory written by import-observations")
+    p.add_argument("--every", type=float, help="evaluate every EVERY hours per patient "
+                                               "(default: at each observation)")
+    p.add_argument("-o", "--output", help="also write per-point .npy columns to this directory")
+    p.set_defaults(func=_cmd_backtest)
+
+    p = sub.add_parser("profiles", help="merge the rerun profiles written to NS_PROFILE_DIR")
+    p.add_argument("directory")
+    p.add_argument("--folded", action="store_true",
+                   help="print merged collapsed stacks (for flamegraph.pl) instead")
+    p.add_argument("--sort", default="cumulative", help="pstats sort key (default cumulative)")
+    p.add_argument("--top", type=int, default=30, help="functions listed")
+    p.set_defaults(func=_cmd_profiles)
+
+    args = parser.parse_args(argv)
+    args.func(args)
@@ -0,0 +1,1081 @@
+"""
+Neutropaenic sepsis pathway: decision logic, flowchart rendering and
+recommendations, with no Streamlit dependency.
+
+neutropenic_sepsis_app.py is the Streamlit page on top of this module;
+neutropenic_sepsis.cli holds the headless tools.
+"""
+
+import collections
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import types
+
+from . import layout, metrics
+from .spec import SPEC_PATH, parse_spec, spec_hash, walk_decision
+
+# ══════════════════════════════════════════════════════════════════════════════
+# COLOURS
+# ══════════════════════════════════════════════════════════════════════════════
+C = {
+    "purple":  "#C39BD3",
+    "blue":    "#85C1E9",
+    "yellow":  "#F9E79F",
+    "green":   "#A9DFBF",
+    "pink":    "#F1948A",
+    "white":   "#FFFFFF",
+    "ol":      "#5D6D7E",   # outline (normal)
+    "act":     "#C0392B",   # active stroke
+    "df":      "#F4F6F7",   # dim fill
+    "ds":      "#CCD1D1",   # dim stroke
+    "dt":      "#CCD1D1",   # dim text
+}
+
+# ══════════════════════════════════════════════════════════════════════════════
+# SVG HELPERS
+# ══════════════════════════════════════════════════════════════════════════════
+
+def esc(s):
+    return s.replace("&","&amp;").replace("<","&lt;").replace(">","&gt;")
+
+# ── text layout ───────────────────────────────────────────────────────────────
+# Advance widths of Arial (metric-compatible with Helvetica) in 1/1000 em,
+# for printable ASCII from space to ~, regular and bold.
+
+def _widths(chars, widths):
+    return dict(zip(chars, widths))
+
+_ASCII = "".join(chr(c) for c in range(32, 127))
+_ARIAL = _widths(_ASCII, (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,   # space-/
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,   # 0-?
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,  # @-O
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,   # P-_
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,   # `-o
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,        # p-~
+))
+_ARIAL_BOLD = _widths(_ASCII, (
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+))
+# non-ASCII characters used in labels (same advance in both weights)
+for _t in (_ARIAL, _ARIAL_BOLD):
+    _t.update({"≥": 549, "≤": 549, "±": 584, "•": 350, "–": 556, "—": 1000,
+               "…": 1000, "’": 222, "▶": 1000})
+_DEFAULT_ADVANCE = 556
+LABEL_PAD = 8   # px kept clear on each side of a wrapped label
+
+def text_width(text, fs, bold=False):
+    """Rendered width in px of text at font size fs."""
+    table = _ARIAL_BOLD if bold else _ARIAL
+    return fs * sum(table.get(ch, _DEFAULT_ADVANCE) for ch in text) / 1000
+
+@functools.lru_cache(maxsize=1024)
+def _wrap(text, box_w, fs, bold=False):
+    """Greedy word wrap of text into a box box_w wide; a tuple of lines."""
+    room = box_w - 2 * LABEL_PAD
+    space = text_width(" ", fs, bold)
+    lines, cur, cur_w = [], "", 0.0
+    for w in text.split():
+        ww = text_width(w, fs, bold)
+        if cur and cur_w + space + ww > room:
+            lines.append(cur)
+            cur, cur_w = w, ww
+        elif cur:
+            cur, cur_w = cur + " " + w, cur_w + space + ww
+        else:
+            cur, cur_w = w, ww
+    if cur: lines.append(cur)
+    return tuple(lines) or (text,)
+
+def label_overflow(text, box_w, box_h, fs, bold=False):
+    """Why a label does not fit its box, or None if it does."""
+    lines = _wrap(text, box_w, fs, bold)
+    widest = max(text_width(ln, fs, bold) for ln in lines)
+    if widest > box_w - 2 * LABEL_PAD:
+        return f"line {widest:.0f}px wide in a {box_w}px box"
+    if len(lines) * (fs + 3.5) > box_h:
+        return f"{len(lines)} lines do not fit a {box_h}px box"
+    return None
+
+def node(x, y, w, h, fill, label="", fs=10, bold=False,
+         bullets=None, active=False, dimmed=False, dashed=False, nid=None):
+    """Box with centred label or left-aligned bullets.  nid tags it for restyling."""
+    if dimmed:
+        fill, stroke, tc, sw = C["df"], C["ds"], C["dt"], 1
+    elif active:
+        stroke, tc, sw = C["act"], "#111", 3
+    else:
+        stroke, tc, sw = C["ol"], "#111", 1.5
+    dash = ' stroke-dasharray="6,3"' if dashed else ""
+    s = f'<rect x="{x}" y="{y}" width="{w}" height="{h}" rx="7" fill="{fill}" stroke="{stroke}" stroke-width="{sw}"{dash}/>\n'
+    fw = "bold" if bold else "normal"
+    lh = fs + 3.5
+    if bullets:
+        tot = len(bullets) * lh
+        ty0 = y + (h - tot) / 2 + fs
+        for i, b in enumerate(bullets):
+            s += f'<text x="{x+9}" y="{ty0+i*lh}" font-size="{fs}" fill="{tc}" font-family="Arial,sans-serif">• {esc(b)}</text>\n'
+    elif label:
+        lines = _wrap(label, w, fs, bold)
+        tot = len(lines) * lh
+        ty0 = y + (h - tot) / 2 + fs
+        for i, ln in enumerate(lines):
+            s += f'<text x="{x+w/2}" y="{ty0+i*lh}" font-size="{fs}" font-weight="{fw}" fill="{tc}" font-family="Arial,sans-serif" text-anchor="middle">{esc(ln)}</text>\n'
+    if nid:
+        s = f'<g data-n="{nid}">\n{s}</g>\n'
+    return s
+
+def _on(on):
+    """data-on="src dst": the nodes whose state styles an edge."""
+    return f' data-on="{on[0]} {on[1]}"' if on else ""
+
+def arrow(x1, y1, x2, y2, act=False, dim=False, on=None):
+    clr = C["act"] if act else (C["ds"] if dim else C["ol"])
+    sw  = 2.5 if act else 1.3
+    mk  = f'url(#arr_{"a" if act else "n"})'
+    return f'<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" stroke="{clr}" stroke-width="{sw}" marker-end="{mk}"{_on(on)}/>\n'
+
+def seg(x1, y1, x2, y2, act=False, dim=False, on=None):
+    """Line segment with no arrowhead."""
+    clr = C["act"] if act else (C["ds"] if dim else C["ol"])
+    sw  = 2.5 if act else 1.3
+    return f'<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" stroke="{clr}" stroke-width="{sw}"{_on(on)}/>\n'
+
+def elbow(x1, y1, x2, y2, by=None, bx=None, act=False, dim=False, on=None):
+    """Polyline elbow with arrowhead at end."""
+    clr = C["act"] if act else (C["ds"] if dim else C["ol"])
+    sw  = 2.5 if act else 1.3
+    mk  = f'url(#arr_{"a" if act else "n"})'
+    if by is not None:
+        pts = f"{x1},{y1} {x1},{by} {x2},{by} {x2},{y2}"
+    elif bx is not None:
+        pts = f"{x1},{y1} {bx},{y1} {bx},{y2} {x2},{y2}"
+    else:
+        mx = (x1+x2)/2
+        pts = f"{x1},{y1} {mx},{y1} {mx},{y2} {x2},{y2}"
+    return f'<polyline points="{pts}" fill="none" stroke="{clr}" stroke-width="{sw}" marker-end="{mk}"{_on(on)}/>\n'
+
+def path(points, act=False, dim=False, on=None):
+    """Orthogonal polyline through points, arrowhead at the end (auto layout)."""
+    clr = C["act"] if act else (C["ds"] if dim else C["ol"])
+    sw  = 2.5 if act else 1.3
+    mk  = f'url(#arr_{"a" if act else "n"})'
+    pts = " ".join(f"{px},{py}" for px, py in points)
+    return f'<polyline points="{pts}" fill="none" stroke="{clr}" stroke-width="{sw}" marker-end="{mk}"{_on(on)}/>\n'
+
+def hbus(y, x_left, x_right, drops, act_set, dim_set):
+    """
+    Horizontal bus at y from x_left to x_right,
+    then vertical drops with arrows to each (cx, top_y) in drops.
+    act_set / dim_set: sets of indices into drops that are active/dimmed.
+    """
+    # pick bus line style from majority
+    any_act = bool(act_set)
+    any_dim = not any_act and len(dim_set) == len(drops)
+    s = seg(x_left, y, x_right, y, act=any_act, dim=any_dim)
+    for i, (cx, ty) in enumerate(drops):
+        a = i in act_set
+        d = i in dim_set
+        s += arrow(cx, y, cx, ty, act=a, dim=d)
+    return s
+
+# ── compact encoding ──────────────────────────────────────────────────────────
+# Same drawing as node() / arrow() / seg() / elbow(), but styled by classes
+# from one <style> block, with rounded coordinates and no whitespace.  Each
+# box is a group translated to its corner, so its rect and text coordinates
+# are relative and repeat between boxes of the same size.
+#
+# This is the encoding for payloads that travel uncompressed: the chart in
+# the component shells, sent over Streamlit's websocket (no compression by
+# default), where it is ~65% of the inline SVG.  Gzipped the two come out
+# about even (`python -m neutropenic_sepsis svg-size`), so the HTTP service,
+# which compresses, serves only the inline SVG.
+
+_FILL_CLASS = {C[k]: k for k in ("purple", "blue", "yellow", "green", "pink", "white")}
+
+def _n(v):
+    """Coordinate rounded to 0.1px, without a trailing .0"""
+    v = round(v, 1)
+    return str(int(v)) if v == int(v) else str(v)
+
+def _c_node(x, y, w, h, fill, label="", fs=10, bold=False, bullets=None,
+            active=False, dimmed=False, dashed=False, nid=None):
+    cls = ["n", _FILL_CLASS[fill], f"s{fs}"]
+    if bold:   cls.append("b")
+    if dashed: cls.append("dash")
+    if dimmed:   cls.append("dim")
+    elif active: cls.append("act")
+    lh = fs + 3.5
+    if bullets:
+        lines, tx = [f"• {b}" for b in bullets], 9
+    elif label:
+        lines, tx = _wrap(label, w, fs, bold), w / 2
+        cls.append("c")
+    else:
+        lines = []
+    tag = f' data-n="{nid}"' if nid else ""
+    ty0 = (h - len(lines) * lh) / 2 + fs
+    return (f'<g class="{" ".join(cls)}"{tag} transform="translate({_n(x)},{_n(y)})">'
+            f'<rect width="{_n(w)}" height="{_n(h)}" rx="7"/>'
+            + "".join(f'<text x="{_n(tx)}" y="{_n(ty0 + i * lh)}">{esc(ln)}</text>'
+                      for i, ln in enumerate(lines))
+            + "</g>")
+
+def _c_line(x1, y1, x2, y2, cls, on):
+    return (f'<line class="{cls}" x1="{_n(x1)}" y1="{_n(y1)}" '
+            f'x2="{_n(x2)}" y2="{_n(y2)}"{_on(on)}/>')
+
+def _c_state(act, dim):
+    return " act" if act else (" dim" if dim else "")
+
+def _c_arrow(x1, y1, x2, y2, act=False, dim=False, on=None):
+    return _c_line(x1, y1, x2, y2, "e m" + _c_state(act, dim), on)
+
+def _c_seg(x1, y1, x2, y2, act=False, dim=False, on=None):
+    return _c_line(x1, y1, x2, y2, "e" + _c_state(act, dim), on)
+
+def _c_elbow(x1, y1, x2, y2, by=None, bx=None, act=False, dim=False, on=None):
+    if by is not None:
+        pts = ((x1, y1), (x1, by), (x2, by), (x2, y2))
+    elif bx is not None:
+        pts = ((x1, y1), (bx, y1), (bx, y2), (x2, y2))
+    else:
+        mx = (x1+x2)/2
+        pts = ((x1, y1), (mx, y1), (mx, y2), (x2, y2))
+    pts = " ".join(f"{_n(px)},{_n(py)}" for px, py in pts)
+    return f'<polyline class="e m{_c_state(act, dim)}" points="{pts}"{_on(on)}/>'
+
+def _c_path(points, act=False, dim=False, on=None):
+    pts = " ".join(f"{_n(px)},{_n(py)}" for px, py in points)
+    return f'<polyline class="e m{_c_state(act, dim)}" points="{pts}"{_on(on)}/>'
+
+def _c_css(sizes):
+    css = (
+        f".n{{fill:#111}}"
+        f".n>rect{{stroke:{C['ol']};stroke-width:1.5}}"
+        f".dash>rect{{stroke-dasharray:6,3}}"
+        + "".join(f".{k}>rect{{fill:{v}}}" for v, k in _FILL_CLASS.items())
+        + f".n.act>rect{{stroke:{C['act']};stroke-width:3}}"
+        f".n.dim{{fill:{C['dt']}}}"
+        f".n.dim>rect{{fill:{C['df']};stroke:{C['ds']};stroke-width:1}}"
+        f".c{{text-anchor:middle}}"
+        f".b{{font-weight:bold}}"
+        + "".join(f".s{fs}{{font-size:{fs}px}}" for fs in sizes)
+        + f".e{{fill:none;stroke:{C['ol']};stroke-width:1.3}}"
+        f".m{{marker-end:url(#arr_n)}}"
+        f".e.act{{stroke:{C['act']};stroke-width:2.5}}"
+        f".m.act{{marker-end:url(#arr_a)}}"
+        f".e.dim{{stroke:{C['ds']}}}"
+    )
+    return f"<style>{css}</style>"
+
+def _c_finish(parts):
+    """Add the stylesheet to a compiled compact template (see _compile) and minify its header."""
+    normal = "".join(p if isinstance(p, str) else p[1][0] for p in parts)
+    sizes = sorted({int(fs) for fs in re.findall(r'class="n [^"]*\bs(\d+)\b', normal)})
+    head = parts[0].replace("<defs>", _c_css(sizes) + "<defs>", 1)
+    return [re.sub(r">\s+<", "><", head).strip()] + parts[1:]
+
+# ══════════════════════════════════════════════════════════════════════════════
+# PATHWAY LOGIC
+#
+# The decision tree is part of the pathway spec (pathway.json, see spec.py).
+# PATHWAY, the compiled spec (INPUTS, DECISION, NODE_IDS, ...), is installed
+# by the PATHWAY SPEC section at the end of this module.  Each function reads
+# it once, so a reload in the middle of a call cannot mix two specs.
+# ══════════════════════════════════════════════════════════════════════════════
+
+def determine_pathway(*args, **inputs):
+    """
+    Active node ids for one assessment: a bool for each name in P.INPUTS,
+    positionally in that order (fever_resolved, neutro_resolved, stable,
+    enterocolitis, allo_sct, micro_defined for the bundled spec) or by name.
+    """
+    P = PATHWAY
+    if args:
+        named = P.INPUTS[:len(args)]
+        if len(args) > len(P.INPUTS) or inputs.keys() & set(named):
+            raise TypeError(f"determine_pathway() takes exactly: {', '.join(P.INPUTS)}")
+        inputs.update(zip(named, args))
+    if inputs.keys() != P._INPUT_SET:
+        raise TypeError(f"determine_pathway() takes exactly: {', '.join(P.INPUTS)}")
+    return walk_decision(P.DECISION, inputs)
+
+# P.NODE_IDS lists every node id in spec order.  The bit position of each id
+# gives a canonical, hashable encoding of an active-node set.
+
+def pathway_key(AN, P=None):
+    """Bitmask of the active nodes — same set, same key, regardless of order."""
+    bit = (P or PATHWAY)._NODE_BIT
+    key = 0
+    for n in AN:
+        key |= bit[n]
+    return key
+
+def pathway_nodes(key, P=None):
+    """Inverse of pathway_key."""
+    return frozenset(n for n, b in (P or PATHWAY)._NODE_BIT.items() if key & b)
+
+# ══════════════════════════════════════════════════════════════════════════════
+# SVG BUILD
+#
+# Boxes, edges and legend come from the pathway spec.  The bundled
+# pathway.json lays the chart out on this grid:
+#
+# 6 COLUMNS  (gap=10px between each):
+#   C0  x=10   w=150   l_neutro_resolved, stop_abx, l_entero_yes, continue_l
+#   C1  x=170  w=150   l_neutro_ongoing,  l_entero_no,  allo_sct,  cease_allo
+#   C2  x=330  w=150   r_neutro_ongoing,  r_entero_yes, continue_r, non_allo, cease_non_allo
+#   C3  x=490  w=150   r_neutro_resolved, r_entero_no,  target_abx
+#   C4  x=660  w=185   p_stable, continue_stable, recurrent_fever, recurrent_actions
+#   C5  x=855  w=215   p_unstable, unstable_box, imaging_box
+#
+# Span nodes:
+#   resolved_fever  spans C0-C1  x=10  w=310
+#   micro_defined   spans C2-C3  x=330 w=310
+#   persistent_fever spans C4-C5 x=660 w=410
+#   fever_unknown   spans C0-C1  x=10  w=310
+#   liaise_id       spans C2-C3  x=330 w=310
+#   header / review72 span all   x=10  w=1060
+#
+# ROWS (top y, height):
+#   R0  y=10   h=38   header
+#   R1  y=60   h=30   review72
+#   R2  y=106  h=46   resolved_fever | micro_defined | persistent_fever
+#   R3  y=168  h=38   fever_unknown  | liaise_id     | p_stable | p_unstable
+#   R4  y=224  h=34   neutro splits (C0-C3)          | continue_stable (C4) | unstable_box top
+#   R5  y=278  h=34   stop_abx(C0) | right entero split (C2-C3)
+#   R6  y=332  h=34   cont_r(C2) | target(C3); left entero split (C0-C1) at y=340
+#   R7  y=394  h=34   cont_l(C0) | allo(C1) | non_allo(C2)
+#   R8  y=448  h=52   cease_allo(C1) | cease_non_allo(C2)
+#   recurrent_fever    y=478 h=36  (C4-C5)
+#   recurrent_actions  y=526 h=82  (C4-C5)
+#   unstable_box  y=224 h=90  (C5)
+#   imaging_box   y=324 h=90  (C5)
+#   legend y=640, items 215px apart
+#
+# Every node has a box of its own: alternatives on the same branch (stop_abx /
+# continue_l, allo_sct / non_allo) sit side by side, never on top of each
+# other, so a dimmed box cannot hide the active one.
+# ══════════════════════════════════════════════════════════════════════════════
+
+# ── geometry and nodes ────────────────────────────────────────────────────
+def _geometry(spec):
+    """Node id -> (x, y, w, h)."""
+    return {n["id"]: tuple(n["box"]) for n in spec["nodes"]}
+
+def _auto_size(n):
+    """(w, h) that fits a node's label or bullets, for the auto layout."""
+    fs, bold, lh = n.get("fs", 10), n.get("bold", False), n.get("fs", 10) + 3.5
+    if n.get("bullets"):
+        w = 9 + max(text_width(f"• {b}", fs) for b in n["bullets"]) + LABEL_PAD + 2
+        return min(320, round(w)), round(len(n["bullets"]) * lh + 14)
+    label = n.get("label", "")
+    w = min(240, max(110, round(text_width(label, fs, bold) + 2 * LABEL_PAD + 2)))
+    return w, max(30, round(len(_wrap(label, w, fs, bold)) * lh + 14))
+
+def _auto_layout(spec):
+    """
+    (G, edges, (W, H)) from the layered layout engine, for specs whose nodes
+    have no "box".  Edges only need "from" / "to"; routing is the engine's.
+    """
+    nodes = [(n["id"], *_auto_size(n)) for n in spec["nodes"]]
+    pairs = [(e["from"], d) for e in spec["edges"]
+             for d in (e["to"] if isinstance(e["to"], list) else [e["to"]])]
+    return layout.layout(nodes, pairs)
+
+def _nodes(spec):
+    """(id, fill, label, node() options) in drawing order."""
+    opts = ("fs", "bold", "dashed", "bullets")
+    return [(n["id"], C[n["fill"]], n.get("label", ""), {k: n[k] for k in opts if k in n})
+            for n in spec["nodes"]]
+
+def check_layout(P=None):
+    """[(node id, problem)] for labels and bullet lists that overflow their box."""
+    P = P or PATHWAY
+    bad = []
+    for nid, fill, label, opts in P.NODES:
+        x, y, w, h = P.G[nid]
+        fs, bold = opts.get("fs", 10), opts.get("bold", False)
+        bullets = opts.get("bullets")
+        if bullets:
+            widest = max(text_width(f"• {b}", fs) for b in bullets)
+            if 9 + widest > w - LABEL_PAD:
+                bad.append((nid, f"bullet {widest:.0f}px wide in a {w}px box"))
+            if len(bullets) * (fs + 3.5) > h:
+                bad.append((nid, f"{len(bullets)} bullets do not fit a {h}px box"))
+        elif label:
+            problem = label_overflow(label, w, h, fs, bold)
+            if problem:
+                bad.append((nid, problem))
+    return bad
+
+# ── edges ─────────────────────────────────────────────────────────────────
+def _edges(spec, G):
+    """
+    (kind, args, on) in drawing order.  kind names the helper (arrow / seg /
+    elbow), on = (src, dst) whose state styles the edge, None for static lines.
+    """
+    def cx(n):  return G[n][0] + G[n][2]/2
+    def cy(n):  return G[n][1] + G[n][3]/2
+    def top(n): return G[n][1]
+    def bot(n): return G[n][1] + G[n][3]
+    def rgt(n): return G[n][0] + G[n][2]
+
+    E = []
+    for e in spec["edges"]:
+        src, dst = e["from"], e["to"]
+        if e["kind"] == "arrow":
+            # node bottom-centre to node top-centre
+            E.append(("arrow", (cx(src), bot(src), cx(dst), top(dst)), (src, dst)))
+        elif e["kind"] == "bus":
+            # stem down from src to a bus at y, then a drop to each target
+            y = e["y"]
+            E.append(("seg", (cx(src), bot(src), cx(src), y), (src, src)))
+            E.append(("seg", (cx(dst[0]), y, cx(dst[-1]), y), None))
+            for nid in dst:
+                E.append(("arrow", (cx(nid), y, cx(nid), top(nid)), (nid, nid)))
+        elif e.get("exit") == "right":
+            # out of the right side, down beside it, into the top of dst
+            E.append(("elbow", (rgt(src), cy(src), cx(dst), top(dst), None, rgt(src) + e["dx"]),
+                      (src, dst)))
+        else:
+            # down, across at y, down
+            E.append(("elbow", (cx(src), bot(src), cx(dst), top(dst), e["y"]), (src, dst)))
+    return E
+
+# ── legend ────────────────────────────────────────────────────────────────
+def _legend(spec):
+    """[(x, fill, label, highlighted)]"""
+    return [(i["x"], C[i["fill"]], i["label"], i.get("highlight", False))
+            for i in spec.get("legend", {}).get("items", ())]
+
+# ── scene graph ───────────────────────────────────────────────────────────
+# The laid-out chart as plain records, built once per spec (P.SCENE) from the
+# geometry, edges and legend above.  Every output format walks it: the SVG
+# templates below are compiled from it, and the text and JSON renderers
+# (OUTPUT FORMATS) read it directly.
+
+class Box:
+    """One node (id = node id) or legend item (id = None), as laid out."""
+
+    __slots__ = ("id", "x", "y", "w", "h", "fill", "label", "fs", "bold", "dashed", "bullets")
+
+    def __init__(self, nid, x, y, w, h, fill, label="", fs=10, bold=False, dashed=False,
+                 bullets=None):
+        self.id, self.x, self.y, self.w, self.h = nid, x, y, w, h
+        self.fill, self.label, self.fs, self.bold = fill, label, fs, bold
+        self.dashed, self.bullets = dashed, bullets
+
+class Edge:
+    """
+    One line: kind and args of its draw helper (arrow / seg / elbow / path),
+    the polyline it draws, whether it ends in an arrowhead, and on = (src,
+    dst) whose state styles it (None for static lines).
+    """
+
+    __slots__ = ("kind", "args", "on", "points", "head")
+
+    def __init__(self, kind, args, on):
+        self.kind, self.args, self.on = kind, args, on
+        self.points = _edge_points(kind, args)
+        self.head = kind != "seg"
+
+class Scene:
+    __slots__ = ("width", "height", "boxes", "edges", "legend", "legend_y", "reading_order")
+
+    def __init__(self, width, height, boxes, edges, legend, legend_y):
+        self.width, self.height = width, height
+        self.boxes, self.edges = boxes, edges
+        self.legend, self.legend_y = legend, legend_y    # legend: [(Box, highlighted)]
+        self.reading_order = sorted(boxes, key=lambda b: (b.y, b.x))
+
+def _edge_points(kind, args):
+    if kind == "path":
+        return tuple(args[0])
+    if kind == "elbow":
+        x1, y1, x2, y2, by, bx = (*args, None, None)[:6]
+        if by is not None:
+            return ((x1, y1), (x1, by), (x2, by), (x2, y2))
+        if bx is not None:
+            return ((x1, y1), (bx, y1), (bx, y2), (x2, y2))
+        mx = (x1+x2)/2
+        return ((x1, y1), (mx, y1), (mx, y2), (x2, y2))
+    return ((args[0], args[1]), (args[2], args[3]))
+
+def _scene(P):
+    boxes = [Box(nid, *P.G[nid], fill, label, **opts) for nid, fill, label, opts in P.NODES]
+    edges = [Edge(kind, args, on) for kind, args, on in P.EDGES]
+    legend = [(Box(None, lx, P.LEGEND_Y, 195, 26, lc, lt, fs=9), hl)
+              for lx, lc, lt, hl in P.LEGEND]
+    return Scene(P.W, P.H, boxes, edges, legend, P.LEGEND_Y)
+
+def element_state(driver, AN, dim):
+    """0 normal, 1 active, 2 dimmed: how one element is drawn for AN."""
+    return 1 if driver in AN else 2 if dim else 0
+
+# ── compiled template ─────────────────────────────────────────────────────
+# The scene is fixed for a given spec, so each SVG mode is wrapped and
+# formatted once per spec.  Only the node / edge markup depends on AN; each of those is
+# pre-rendered in its three states (normal, active, dimmed) and a render just
+# picks one per element.
+#
+# An edge is active when its src is and otherwise dimmed along with src, so
+# one node id (the "driver") decides the state of every styled element.
+
+_STATES = ((False, False), (True, False), (False, True))
+
+def _compile(compact, P=None):
+    """
+    ([(static markup, driver, (normal, active, dimmed)), ...], trailing markup)
+    for compiled pathway P (default: the installed one).
+    """
+    P = P or PATHWAY
+    S = P.SCENE
+    W, H = S.width, S.height
+    if compact:
+        node_ = _c_node
+        draw = {"arrow": _c_arrow, "seg": _c_seg, "elbow": _c_elbow, "path": _c_path}
+    else:
+        node_ = node
+        draw = {"arrow": arrow, "seg": seg, "elbow": elbow, "path": path}
+
+    def box(b, **state):
+        return node_(b.x, b.y, b.w, b.h, b.fill, label=b.label, fs=b.fs, bold=b.bold,
+                     bullets=b.bullets, dashed=b.dashed, nid=b.id, **state)
+
+    # ── SVG open ──────────────────────────────────────────────────────────
+    parts = [f'<svg id="flowSVG" xmlns="http://www.w3.org/2000/svg" '
+             f'width="{W}" height="{H}" viewBox="0 0 {W} {H}" '
+             f'style="background:#fff;font-family:Arial,sans-serif">\n'
+             f"""<defs>
+  <marker id="arr_n" markerWidth="9" markerHeight="9" refX="8" refY="3.5" orient="auto">
+    <path d="M0,0 L0,7 L9,3.5 z" fill="{C['ol']}"/>
+  </marker>
+  <marker id="arr_a" markerWidth="9" markerHeight="9" refX="8" refY="3.5" orient="auto">
+    <path d="M0,0 L0,7 L9,3.5 z" fill="{C['act']}"/>
+  </marker>
+</defs>\n"""]
+
+    for b in S.boxes:
+        parts.append((b.id, tuple(box(b, active=act, dimmed=dim) for act, dim in _STATES)))
+
+    for e in S.edges:
+        if e.on is None:
+            parts.append(draw[e.kind](*e.args))
+        else:
+            parts.append((e.on[0], tuple(draw[e.kind](*e.args, act=act, dim=dim, on=e.on)
+                                         for act, dim in _STATES)))
+
+    for b, _ in S.legend:
+        parts.append(box(b))
+    # active border on the "highlighted" item
+    for b in (b for b, hl in S.legend if hl):
+        if compact:
+            parts.append(f'<rect class="e act" x="{b.x}" y="{b.y}" width="{b.w}" height="{b.h}" rx="7"/>')
+        else:
+            parts.append(f'<rect x="{b.x}" y="{b.y}" width="{b.w}" height="{b.h}" rx="7" '
+                         f'fill="none" stroke="{C["act"]}" stroke-width="2.5"/>\n')
+    if compact:
+        parts.append("</svg>")
+        parts = _c_finish(parts)
+    else:
+        parts.append("</svg>\n")
+
+    items, static = [], ""
+    for p in parts:
+        if isinstance(p, str):
+            static += p
+        else:
+            items.append((static, *p))
+            static = ""
+    return items, static
+
+def build_svg(AN, compact=False, P=None):
+    items, tail = (P or PATHWAY)._TEMPLATE[compact]
+    dim = len(AN) > 2
+    out = []
+    for static, driver, variants in items:
+        out.append(static)
+        out.append(variants[element_state(driver, AN, dim)])
+    out.append(tail)
+    return "".join(out)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# RENDER CACHE
+#
+# determine_pathway only reaches a handful of distinct AN sets, so the SVG for
+# each one is built once and shared by every session on this server.
+# ══════════════════════════════════════════════════════════════════════════════
+
+SVG_CACHE_SIZE = 16
+
+# Caches of derived output take the compiled pathway as an argument, so a
+# spec reload replaces them along with it and nothing needs clearing.
+
+@functools.lru_cache(maxsize=1)
+def _svg_cache(P):
+    @functools.lru_cache(maxsize=SVG_CACHE_SIZE)
+    def render(key):
+        return build_svg(pathway_nodes(key, P), P=P)
+    return render
+
+# ── PNG export ────────────────────────────────────────────────────────────────
+# Rasterised on the server, once per pathway state, with a local renderer
+# (CairoSVG, or resvg as a fallback).  Without either, "Copy flowchart"
+# falls back to drawing the SVG onto a canvas in the browser.
+
+PNG_SCALE = 2   # same 2x as the in-browser copy
+
+@functools.lru_cache(maxsize=1)
+def _rasterizer():
+    """svg text -> PNG bytes, or None when no renderer is installed."""
+    try:
+        import cairosvg
+    except (ImportError, OSError):   # OSError: cairocffi without libcairo
+        pass
+    else:
+        return lambda svg: cairosvg.svg2png(bytestring=svg.encode("utf-8"),
+                                            scale=PNG_SCALE, background_color="#fff")
+    try:
+        import resvg_py
+    except ImportError:
+        return None
+    return lambda svg: bytes(resvg_py.svg_to_bytes(svg_string=svg, zoom=PNG_SCALE,
+                                                   background="#fff"))
+
+def png_available():
+    return _rasterizer() is not None
+
+@functools.lru_cache(maxsize=1)
+def _png_cache(P):
+    @functools.lru_cache(maxsize=SVG_CACHE_SIZE)
+    def render(key):
+        return _rasterizer()(_svg_cache(P)(key))
+    return render
+
+def cached_png(AN):
+    P = PATHWAY
+    return _png_cache(P)(pathway_key(AN, P))
+
+def _lru_gauge(name, cache):
+    def collect():
+        info = cache(PATHWAY).cache_info()
+        return {(("cache", name), ("stat", k)): v
+                for k, v in (("hits", info.hits), ("misses", info.misses),
+                             ("size", info.currsize))}
+    return collect
+
+metrics.gauge("render_cache", lambda: {**_lru_gauge("svg", _svg_cache)(),
+                                       **_lru_gauge("png", _png_cache)()})
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# OUTPUT FORMATS
+#
+# The same scene as text for pasting into clinical notes, or as JSON for
+# other front ends.  render(AN, fmt) picks any of them, SVG and PNG included.
+# ══════════════════════════════════════════════════════════════════════════════
+
+_STATE_NAMES = ("normal", "active", "dimmed")
+_TO_ASCII = str.maketrans({"≥": ">=", "≤": "<=", "±": "+/-", "—": "-", "–": "-", "•": "*",
+                           "→": "->", "▶": ">", "°": " deg ", "×": "x", "’": "'"})
+
+def render_text(AN, P=None, ascii=False):
+    """The active boxes of AN in reading order, then the recommendations."""
+    P = P or PATHWAY
+    lines, seen = [], set()
+    for b in P.SCENE.reading_order:
+        if b.id not in AN:
+            continue
+        if b.label:
+            lines.append(f"> {b.label}")
+        if b.bullets and tuple(b.bullets) not in seen:   # some boxes repeat a list
+            seen.add(tuple(b.bullets))
+            lines.extend(f"    - {x}" for x in b.bullets)
+    recs = [(title, detail) for nodes, _, title, detail in P.RECOMMENDATIONS
+            if any(n in AN for n in nodes)]
+    if recs:
+        lines += ["", "Recommendations:"] + [f"- {title}: {detail}" for title, detail in recs]
+    lines += ["", f"Pathway spec {P.SPEC_HASH}"]
+    text = "\n".join(lines) + "\n"
+    if ascii:
+        text = text.translate(_TO_ASCII).encode("ascii", "replace").decode("ascii")
+    return text
+
+def _json_box(b, state):
+    out = {"id": b.id, "box": [b.x, b.y, b.w, b.h], "fill": b.fill, "label": b.label,
+           "state": _STATE_NAMES[state]}
+    if b.bullets:
+        out["bullets"] = b.bullets
+    return out
+
+def _compile_json(P):
+    """
+    render_json's template, like _compile's: (head, nodes, middle, edges,
+    tail, recommendations), where nodes and edges are (driver, (normal,
+    active, dimmed) JSON) and recommendations (trigger nodes, JSON).
+    """
+    S = P.SCENE
+    dumps = functools.partial(json.dumps, ensure_ascii=False)
+    nodes = [(b.id, tuple(dumps(_json_box(b, st)) for st in range(3))) for b in S.boxes]
+    edges = []
+    for e in S.edges:
+        variants = tuple(dumps({"points": e.points, "arrow": e.head, "on": e.on,
+                                "state": _STATE_NAMES[0 if e.on is None else st]})
+                         for st in range(3))
+        edges.append((e.on and e.on[0], variants))
+    head = f'{{"spec": {dumps(P.SPEC_HASH)}, "width": {dumps(S.width)}, "height": {dumps(S.height)}, "nodes": ['
+    legend = dumps([{**_json_box(b, 0), "highlighted": hl} for b, hl in S.legend])
+    recs = [(nodes_, dumps({"icon": icon, "title": title, "detail": detail}))
+            for nodes_, icon, title, detail in P.RECOMMENDATIONS]
+    return head, nodes, '], "edges": [', edges, f'], "legend": {legend}, "recommendations": [', recs
+
+def render_json(AN, P=None):
+    """The scene with each element's state for AN, as JSON text."""
+    head, nodes, middle, edges, tail, recs = (P or PATHWAY)._JSON_TEMPLATE
+    dim = len(AN) > 2
+    return "".join((
+        head, ", ".join(v[element_state(d, AN, dim)] for d, v in nodes),
+        middle, ", ".join(v[element_state(d, AN, dim)] for d, v in edges),
+        tail, ", ".join(r for trigger, r in recs if any(n in AN for n in trigger)), "]}",
+    ))
+
+def _render_png(AN, P=None):
+    if not png_available():
+        raise RuntimeError("no PNG renderer installed (CairoSVG or resvg)")
+    return _rasterizer()(build_svg(AN, P=P))
+
+RENDERERS = {"svg": build_svg, "png": _render_png, "txt": render_text, "json": render_json}
+
+def render(AN, fmt="svg", P=None):
+    """AN in one of the RENDERERS formats: text, or bytes for PNG."""
+    return RENDERERS[fmt](AN, P=P)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# RECOMMENDATIONS
+# ══════════════════════════════════════════════════════════════════════════════
+
+# RECOMMENDATIONS: (nodes that trigger it, icon, title, detail), in display
+# order, from the spec.
+
+def _recommendations(spec):
+    return [(tuple(r["when"]), r["icon"], r["title"], r["detail"])
+            for r in spec["recommendations"]]
+
+def get_recommendations(AN, P=None):
+    return [(icon, title, detail) for nodes, icon, title, detail in (P or PATHWAY).RECOMMENDATIONS
+            if any(n in AN for n in nodes)]
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# DECISION TABLE
+#
+# determine_pathway has a handful of boolean inputs (six in the bundled
+# spec), so the whole guideline fits in a 2**len(INPUTS)-row table: input
+# bits -> active-node bitmask (pathway_key) and a recommendation code (bit i
+# set = RECOMMENDATIONS[i] applies).  determine_pathway, walking the spec's
+# decision tree, stays the reference the table is built from;
+# batch.check_decision_table() re-checks every row.
+# ══════════════════════════════════════════════════════════════════════════════
+
+# P.INPUTS (from the spec): P.INPUTS[i] is bit i of a table index
+
+def input_index(P=None, **inputs):
+    return sum(1 << i for i, name in enumerate((P or PATHWAY).INPUTS) if inputs[name])
+
+def index_inputs(idx, P=None):
+    """Inverse of input_index: {input name: bool}."""
+    return {name: bool(idx >> i & 1) for i, name in enumerate((P or PATHWAY).INPUTS)}
+
+def rec_code(AN, P=None):
+    return sum(1 << i for i, (nodes, *_) in enumerate((P or PATHWAY).RECOMMENDATIONS)
+               if any(n in AN for n in nodes))
+
+def recommendations_for(code, P=None):
+    """Inverse of rec_code: the get_recommendations list for a code."""
+    return [r[1:] for i, r in enumerate((P or PATHWAY).RECOMMENDATIONS) if code >> i & 1]
+
+# P.PATHWAY_TABLE, P.REC_TABLE: input index -> pathway_key, rec_code (compiled
+# with the spec).  Lookups by table, one patient or many, are in batch.py.
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# PRE-RENDERED ARTIFACTS
+#
+# The six inputs give 64 combinations but only a few distinct AN sets.
+# `python -m neutropenic_sepsis prerender DIR` writes the SVG and
+# recommendations of each one, with a manifest, for use outside the app
+# (documents, intranet pages).  The app itself needs none of them: the page
+# mounts one chart and switches its states in the browser, and the
+# per-state work it does on the server (templates, tables) is compiled with
+# the spec.
+# ══════════════════════════════════════════════════════════════════════════════
+
+def reachable_pathways(P=None):
+    """Every distinct AN set determine_pathway can return, by pathway_key."""
+    P = P or PATHWAY
+    return {key: pathway_nodes(key, P) for key in P.PATHWAY_TABLE}
+
+def prerender(P=None):
+    """Immutable {pathway_key: (svg, recommendations)} for every reachable AN."""
+    P = P or PATHWAY
+    return types.MappingProxyType({
+        key: (build_svg(AN, P=P), tuple(get_recommendations(AN, P)))
+        for key, AN in reachable_pathways(P).items()
+    })
+
+def write_artifacts(store, outdir, P=None):
+    """Write a store prerendered from P to outdir; returns the number of bytes written."""
+    P = P or PATHWAY
+    os.makedirs(outdir, exist_ok=True)
+    states, total = {}, 0
+    for key, (svg, recs) in sorted(store.items()):
+        name = f"{key:08x}.svg"
+        data = svg.encode("utf-8")
+        with open(os.path.join(outdir, name), "wb") as f:
+            f.write(data)
+        total += len(data)
+        states[f"{key:08x}"] = {
+            "nodes": sorted(pathway_nodes(key, P)),
+            "svg": name,
+            "recommendations": [list(r) for r in recs],
+        }
+    manifest = {"spec": P.SPEC_HASH, "states": states}
+    data = json.dumps(manifest, ensure_ascii=False, indent=1).encode("utf-8")
+    with open(os.path.join(outdir, "manifest.json"), "wb") as f:
+        f.write(data)
+    return total + len(data)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# COPY-TO-CLIPBOARD JS
+# ══════════════════════════════════════════════════════════════════════════════
+
+COPY_JS = """
+<button id="copyBtn" onclick="copyChart()" style="
+    background:#2471A3;color:#fff;border:none;border-radius:7px;
+    padding:9px 20px;font-size:14px;cursor:pointer;
+    font-family:Arial,sans-serif;display:inline-flex;
+    align-items:center;gap:8px;margin-bottom:6px;">
+  <span>📋</span><span>Copy flowchart to clipboard</span>
+</button>
+<div id="copyMsg" style="font-size:12px;font-family:Arial,sans-serif;
+     min-height:18px;margin-top:3px;"></div>
+<script>
+function copied(msg) {
+  msg.style.color='#1e8449';
+  msg.textContent='✅ Copied! Paste into eNotes with Ctrl+V / Cmd+V.';
+}
+function savePng(href, msg) {
+  const a = document.createElement('a');
+  a.href = href;
+  a.download = 'neutropenic_sepsis_pathway.png';
+  a.click();
+  msg.style.color='#e67e22';
+  msg.textContent='📥 Saved as PNG — insert into eNotes manually.';
+}
+async function copyChart() {
+  const msg = document.getElementById('copyMsg');
+  msg.style.color='#888'; msg.textContent='Rendering…';
+  // PNG rendered on the server (flowchart component), if it offers one
+  const pending = window.requestServerPng ? window.requestServerPng() : null;
+  if (pending) {
+    try {
+      await navigator.clipboard.write([new ClipboardItem({'image/png': pending})]);
+      copied(msg);
+      return;
+    } catch(e) {
+      try { savePng(URL.createObjectURL(await pending), msg); return; } catch(e2) {}
+    }
+  }
+  const svg = document.getElementById('flowSVG');
+  if (!svg) { msg.textContent='⚠️ SVG not found.'; return; }
+  const ser = new XMLSerializer().serializeToString(svg);
+  const vb  = svg.viewBox.baseVal;
+  const sc  = 2;
+  const cv  = document.createElement('canvas');
+  cv.width  = vb.width * sc;
+  cv.height = vb.height * sc;
+  const ctx = cv.getContext('2d');
+  ctx.scale(sc, sc);
+  ctx.fillStyle = '#fff';
+  ctx.fillRect(0, 0, vb.width, vb.height);
+  const blob = new Blob([ser], {type:'image/svg+xml;charset=utf-8'});
+  const url  = URL.createObjectURL(blob);
+  const img  = new Image();
+  img.onload = async () => {
+    ctx.drawImage(img, 0, 0);
+    URL.revokeObjectURL(url);
+    cv.toBlob(async (pngBlob) => {
+      if (navigator.clipboard && navigator.clipboard.write) {
+        try {
+          await navigator.clipboard.write([new ClipboardItem({'image/png': pngBlob})]);
+          copied(msg);
+          return;
+        } catch(e) {}
+      }
+      // fallback: download
+      savePng(cv.toDataURL('image/png'), msg);
+    }, 'image/png');
+  };
+  img.onerror = () => { msg.style.color='#c0392b'; msg.textContent='⚠️ Render failed.'; };
+  img.src = url;
+}
+</script>
+"""
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# FLOWCHART SHELL
+#
+# The static part of the on-page chart: COPY_JS + the un-highlighted compact
+# SVG.  The UI mounts it once per browser session and afterwards only sends
+# which nodes are active.
+# ══════════════════════════════════════════════════════════════════════════════
+
+def flowchart_shell(P=None):
+    """(html, hash) of the static chart mounted by the component."""
+    return _flowchart_shell(P or PATHWAY)
+
+@functools.lru_cache(maxsize=1)
+def _flowchart_shell(P):
+    html = (COPY_JS + '<div style="overflow-x:auto;margin-top:4px">'
+            + build_svg(frozenset(), compact=True, P=P) + "</div>")
+    return html, hashlib.sha1(html.encode("utf-8")).hexdigest()[:12]
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# PATHWAY SPEC
+#
+# The spec file is compiled into one namespace of derived tables, geometry
+# and templates (a Pathway), cached by content hash, and installed as
+# PATHWAY: the only binding that changes on a reload, swapped whole, so a
+# reader that takes P = PATHWAY once sees one spec throughout.
+# reload_spec() is cheap when nothing changed (one stat), recompiles only
+# when the content hash does, and keeps the current pathway if the new spec
+# is invalid.  Caches of rendered output are keyed by the Pathway they came
+# from; the flowchart shell hash changes with it, so open pages re-mount.
+# ══════════════════════════════════════════════════════════════════════════════
+
+PATHWAY = None                          # the installed Pathway
+_COMPILED_CACHE = 4
+
+_compiled = collections.OrderedDict()   # spec hash -> compiled pathway
+_spec_lock = threading.Lock()
+_spec_seen = None                       # (path, mtime, size) last read
+_spec_error = None                      # why that file was not installed
+
+class Pathway(types.SimpleNamespace):
+    """
+    A compiled spec: SPEC, SPEC_HASH, INPUTS, DECISION, NODE_IDS, geometry
+    (W, H, G, NODES, EDGES, LEGEND, LEGEND_Y), SCENE, RECOMMENDATIONS, the
+    SVG / JSON templates and the decision tables.  Hashed by identity, so
+    caches can key on it.
+    """
+
+    __hash__ = object.__hash__
+    __eq__ = object.__eq__
+
+def compile_spec(spec, sha):
+    """Everything derived from a spec, as a Pathway."""
+    P = Pathway(SPEC=spec, SPEC_HASH=sha, DECISION=spec["decision"])
+    P.INPUTS = tuple(spec["inputs"])
+    P._INPUT_SET = frozenset(P.INPUTS)
+    P.NODE_IDS = tuple(n["id"] for n in spec["nodes"])
+    P._NODE_BIT = {n: 1 << i for i, n in enumerate(P.NODE_IDS)}
+    P.NODES = _nodes(spec)
+    P.LEGEND = _legend(spec)
+    if all("box" in n for n in spec["nodes"]):
+        P.W, P.H = spec["size"]
+        P.G = _geometry(spec)
+        P.EDGES = _edges(spec, P.G)
+        P.LEGEND_Y = spec.get("legend", {}).get("y", P.H)
+    else:
+        P.G, P.EDGES, (P.W, P.H) = _auto_layout(spec)
+        P.LEGEND_Y = P.H
+        if P.LEGEND:
+            P.W = max(P.W, max(lx for lx, *_ in P.LEGEND) + 205)
+            P.H += 36
+    P.SCENE = _scene(P)
+    P.RECOMMENDATIONS = _recommendations(spec)
+    P._TEMPLATE = {False: _compile(False, P), True: _compile(True, P)}
+    P._JSON_TEMPLATE = _compile_json(P)
+
+    keys, codes = [], []
+    for i in range(1 << len(P.INPUTS)):
+        AN = walk_decision(P.DECISION, {name: bool(i >> b & 1) for b, name in enumerate(P.INPUTS)})
+        keys.append(sum(P._NODE_BIT[n] for n in AN))
+        codes.append(sum(1 << r for r, (nodes, *_) in enumerate(P.RECOMMENDATIONS)
+                         if any(n in AN for n in nodes)))
+    P.PATHWAY_TABLE, P.REC_TABLE = tuple(keys), tuple(codes)
+    return P
+
+def _install(P):
+    global PATHWAY
+    PATHWAY = P
+
+def reload_spec(path=None):
+    """
+    Install the spec at path (default SPEC_PATH) if it changed since the last
+    call; True if a different pathway is now installed.  Raises ValueError,
+    on every call until the file is fixed, if the changed spec is invalid.
+    """
+    global _spec_seen, _spec_error
+    path = path or SPEC_PATH
+    st = os.stat(path)
+    seen = (path, st.st_mtime_ns, st.st_size)
+    with _spec_lock:
+        if seen == _spec_seen:
+            if _spec_error:
+                raise _spec_error
+            return False
+        _spec_seen, _spec_error = seen, None
+        with open(path, "rb") as f:
+            data = f.read()
+        sha = spec_hash(data)
+        if PATHWAY is not None and sha == PATHWAY.SPEC_HASH:
+            return False
+        P = _compiled.pop(sha, None)
+        if P is None:
+            try:
+                P = compile_spec(parse_spec(data, fills=C), sha)
+            except ValueError as e:
+                _spec_error = e
+                raise
+            except (KeyError, TypeError, AttributeError, IndexError) as e:   # checked, yet unusable
+                _spec_error = ValueError(f"invalid pathway spec: {e!r}")
+                raise _spec_error from None
+        _compiled[sha] = P
+        while len(_compiled) > _COMPILED_CACHE:
+            _compiled.popitem(last=False)
+        _install(P)
+    metrics.inc("spec_reloads")
+    return True
+
+def watch_spec(interval=2.0, path=None):
+    """Poll the spec file from a daemon thread (for long-running headless use)."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                reload_spec(path)
+            except (OSError, ValueError):
+                pass   # keep serving the installed pathway
+    t = threading.Thread(target=loop, name="ns-spec-watch", daemon=True)
+    t.start()
+    return t
+
+reload_spec()
@@ -0,0 +1,265 @@
+"""
+Incremental pathway evaluation from a stream of observations, a stand-in
+for the HL7/FHIR vitals and lab feed.
+
+    python -m neutropenic_sepsis ingest observations.jsonl --follow -o events.jsonl
+
+One JSON object per observation:
+
+    {"patient": "NHI1234", "ts": "2024-05-01T08:00:00Z", "kind": "temp", "value": 38.4}
+    {"patient": "NHI1234", "ts": 1714550400, "code": "751-8", "value": 0.3}
+    {"patient": "NHI1234", "ts": ..., "kind": "flag", "name": "allo_sct", "value": true}
+    {"patient": "NHI1234", "ts": ..., "kind": "discharge"}
+
+kind is temp (°C), anc (neutrophils, 10⁹/L), flag (any other pathway input,
+as entered by the team) or discharge; a LOINC code may stand in for kind
+(KIND_CODES).  A flag's value is a boolean, 0 / 1 or yes / no; a flag with
+any other value, or a temp / anc without a number, is an error that run()
+counts and skips.  ts is epoch seconds or ISO 8601, and is the pipeline's
+clock: criteria that become true with time alone (afebrile for 48 h) are
+re-checked as later observations move it on.
+
+Derived inputs:
+
+    fever_resolved   no temperature >= FEVER_C for AFEBRILE_HOURS (temperatures
+                     observed over that long), and clinically stable
+    neutro_resolved  latest ANC >= ANC_RESOLVED
+
+Each patient holds a fixed handful of fields whatever the number of
+observations.  An observation only re-evaluates its own patient, and only
+through the decision table when the inputs actually changed; an event is
+emitted when the patient's pathway does.
+"""
+
+import collections
+import datetime
+import heapq
+import json
+import os
+import time
+
+from . import core, metrics
+from .batch import parse_flag
+
+FEVER_C = 38.0
+ANC_RESOLVED = 0.5
+AFEBRILE_HOURS = 48
+
+KIND_CODES = {
+    "8310-5": "temp",    # body temperature
+    "8331-1": "temp",    # oral temperature
+    "751-8": "anc",      # neutrophils, automated count
+    "753-4": "anc",      # neutrophils, manual count
+}
+DERIVED = ("fever_resolved", "neutro_resolved")
+
+
+def parse_ts(v):
+    """Epoch seconds from epoch seconds or an ISO 8601 string (naive = UTC)."""
+    if isinstance(v, (int, float)):
+        return float(v)
+    t = datetime.datetime.fromisoformat(v)
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=datetime.timezone.utc)
+    return t.timestamp()
+
+
+class Patient:
+    """What the pipeline keeps per patient: a fixed set of fields."""
+
+    __slots__ = ("id", "first_temp", "last_fever", "anc", "anc_ts", "flags", "index", "key",
+                 "deadline")
+
+    def __init__(self, pid, flags):
+        self.id = pid
+        self.first_temp = self.last_fever = None
+        self.anc = self.anc_ts = None
+        self.flags = dict(flags)     # the non-derived inputs
+        self.index = self.key = None
+        self.deadline = None         # when fever_resolved may turn true with no new data
+
+    def afebrile_since(self):
+        if self.first_temp is None:
+            return None
+        return self.last_fever if self.last_fever is not None else self.first_temp
+
+
+class Pipeline:
+    """
+    Observations in, pathway events out.  on_event(event) is called with a
+    dict (patient, ts, inputs, pathway, recommendations) whenever a
+    patient's pathway changes.  The pathway installed when the pipeline is
+    made is used for its whole life.
+    """
+
+    def __init__(self, on_event=None):
+        self.P = P = core.PATHWAY
+        self.on_event = on_event or (lambda event: None)
+        self.patients = {}
+        self.clock = float("-inf")
+        self.stats = collections.Counter()
+        self._deadlines = []          # (ts, patient id), at most one per patient
+        self._window = AFEBRILE_HOURS * 3600.0
+        defaults = {f["input"]: f["default"] for f in P.SPEC.get("form", {}).get("fields", ())}
+        self._flag_defaults = {k: bool(defaults.get(k, False))
+                               for k in P.INPUTS if k not in DERIVED}
+
+    def observe(self, obs):
+        """Apply one observation (a dict); ValueError if it is malformed."""
+        try:
+            pid = str(obs["patient"])
+            ts = parse_ts(obs["ts"])
+            kind = obs.get("kind") or KIND_CODES.get(str(obs.get("code")))
+            name = value = None
+            if kind in ("temp", "anc"):
+                value = float(obs["value"])
+            elif kind == "flag":
+                name = obs.get("name")
+                if name not in self._flag_defaults:
+                    raise ValueError(f"not a pathway input {name!r}")
+                value = parse_flag(obs["value"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"bad observation {obs!r}: {e}") from None
+        self.stats["observations"] += 1
+        if ts > self.clock:
+            self.tick(ts)
+
+        if kind == "discharge":
+            self.patients.pop(pid, None)
+            return
+        if kind not in ("temp", "anc", "flag"):
+            self.stats["ignored"] += 1
+            return
+        p = self.patients.get(pid)
+        if p is None:
+            p = self.patients[pid] = Patient(pid, self._flag_defaults)
+        if kind == "temp":
+            if p.first_temp is None or ts < p.first_temp:
+                p.first_temp = ts
+            if value >= FEVER_C and (p.last_fever is None or ts > p.last_fever):
+                p.last_fever = ts
+        elif kind == "anc":
+            if p.anc_ts is None or ts >= p.anc_ts:
+                p.anc, p.anc_ts = value, ts
+        else:
+            p.flags[name] = value
+        self._evaluate(p, max(ts, self.clock))
+
+    def tick(self, now):
+        """Move the clock to now, re-checking patients whose fever may have resolved."""
+        self.clock = now
+        while self._deadlines and self._deadlines[0][0] <= now:
+            when, pid = heapq.heappop(self._deadlines)
+            p = self.patients.get(pid)
+            if p is not None:
+                p.deadline = None
+                self._evaluate(p, when)
+
+    def _inputs(self, p, now):
+        since = p.afebrile_since()
+        afebrile = since is not None and now - since >= self._window
+        if since is not None and not afebrile:
+            self._schedule(p, since + self._window)
+        derived = {
+            "fever_resolved": afebrile and p.flags.get("stable", True),
+            "neutro_resolved": p.anc is not None and p.anc >= ANC_RESOLVED,
+        }
+        return {k: derived[k] if k in derived else p.flags[k] for k in self.P.INPUTS}
+
+    def _schedule(self, p, when):
+        # one heap entry per patient: a later deadline is picked up when the
+        # earlier entry fires and finds the fever not yet resolved
+        if p.deadline is None:
+            p.deadline = when
+            heapq.heappush(self._deadlines, (when, p.id))
+
+    def _evaluate(self, p, now):
+        P = self.P
+        inputs = self._inputs(p, now)
+        idx = core.input_index(P, **inputs)
+        if idx == p.index:
+            self.stats["unchanged"] += 1
+            return
+        p.index = idx
+        self.stats["evaluated"] += 1
+        key, code = P.PATHWAY_TABLE[idx], P.REC_TABLE[idx]
+        if key == p.key:
+            return
+        p.key = key
+        self.stats["events"] += 1
+        metrics.inc("feed_events")
+        self.on_event({
+            "patient": p.id,
+            "ts": now,
+            "inputs": inputs,
+            "pathway": sorted(core.pathway_nodes(key, P)),
+            "recommendations": [title for _, title, _ in core.recommendations_for(code, P)],
+        })
+
+    def ward(self):
+        """Current patients as (id, label, input index), for ward.ward_rows."""
+        return [(p.id, p.id, p.index) for p in self.patients.values() if p.index is not None]
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# SOURCES
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _parse(line):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"bad line {line.strip()[:80]!r}: {e}")
+
+def lines(f):
+    """JSON-lines observations from an open file (stdin); bad lines as ValueError."""
+    for line in f:
+        if line.strip():
+            yield _parse(line)
+
+def tail(path, follow=False, poll=0.2, stop=None):
+    """
+    JSON-lines observations from path; with follow, keep waiting for appended
+    lines.  A line that is not JSON is yielded as a ValueError, for run() to
+    count, so one bad line does not end the feed.
+    """
+    with open(path, encoding="utf-8") as f:
+        buf = ""
+        while stop is None or not stop.is_set():
+            line = f.readline()
+            if line:
+                buf += line
+                if not buf.endswith("\n"):
+                    continue          # a line still being written
+                if buf.strip():
+                    yield _parse(buf)
+                buf = ""
+            elif not follow:
+                if buf.strip():
+                    yield _parse(buf)  # the last line, without a newline
+                break
+            else:
+                if os.stat(path).st_size < f.tell():
+                    f.seek(0)         # truncated / rotated in place: start over
+                time.sleep(poll)
+
+def drain(q, stop=None):
+    """Observations from a queue.Queue until it yields stop (default None)."""
+    while True:
+        obs = q.get()
+        if obs is stop:
+            return
+        yield obs
+
+def run(source, pipeline, on_error=None):
+    """Feed every observation from source through pipeline; returns its stats."""
+    for obs in source:
+        try:
+            if isinstance(obs, ValueError):
+                raise obs
+            pipeline.observe(obs)
+        except ValueError as e:
+            pipeline.stats["errors"] += 1
+            if on_error is not None:
+                on_error(e)
+    return pipeline.stats
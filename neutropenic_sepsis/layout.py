@@ -0,0 +1,358 @@
+"""
+Layered (Sugiyama-style) layout for flowcharts without hand-placed boxes.
+
+    boxes, routes, (width, height) = layout(((id, w, h), ...), ((src, dst), ...))
+
+1. cycles are broken by reversing DFS back edges (drawn the right way
+   round again, from the lower source up to the target's bottom);
+2. nodes are layered by longest path, and edges spanning several layers are
+   split with dummy nodes;
+3. crossings are reduced by alternating barycenter sweeps, keeping the best
+   order seen (crossings counted in O(E log V) with a Fenwick tree);
+4. x positions: each layer is pulled towards its neighbours' centres with a
+   weighted isotonic regression (pool adjacent violators), which gives the
+   least-squares placement that keeps the order and the gaps;
+5. edges are routed orthogonally in the channel under each layer: a node
+   with several children gets a bus (stem, horizontal bar, drops), a
+   single child an arrow or elbow, and long edges a polyline through their
+   dummies.  Horizontal bars in one channel get separate tracks.
+
+routes are (kind, args, on) in the form core._edges produces: kind is
+"arrow", "seg", "elbow" or "path", on the (src, dst) whose state styles it.
+Results are cached per graph.
+"""
+
+import collections
+import functools
+
+GAP_X = 14          # between boxes in a layer
+TRACK = 10          # between horizontal bars in a channel
+CHANNEL_MIN = 24    # channel height under a layer with no bars
+MARGIN = 10
+DUMMY_W = 10        # width kept free for an edge passing through a layer
+SWEEPS = 24         # crossing-reduction sweeps (stops early on no progress)
+PLACEMENT_PASSES = 8
+
+
+def layout(nodes, edges):
+    """
+    nodes: ((id, w, h), ...) in preferred order; edges: ((src, dst), ...).
+    Returns ({id: (x, y, w, h)}, routes, (width, height)).
+    """
+    return _layout(tuple(tuple(n) for n in nodes), tuple(tuple(e) for e in edges))
+
+@functools.lru_cache(maxsize=16)
+def _layout(nodes, edges):
+    size = {nid: (w, h) for nid, w, h in nodes}
+    order = [nid for nid, _, _ in nodes]
+    edges = [(s, d) for s, d in edges if s != d]
+    edges, flipped = _acyclic(order, edges)
+    layer = _layers(order, edges)
+    layers, chains, succ, pred = _split(order, edges, layer, size)
+    _reduce_crossings(layers, succ, pred)
+    x = _place(layers, succ, pred, size)
+    return _route(layers, chains, succ, x, size, flipped)
+
+
+# ── 1-2. cycles, layers, dummies ──────────────────────────────────────────────
+
+def _acyclic(order, edges):
+    """edges with DFS back edges reversed, and the set of reversed ones (as they are now)."""
+    out = collections.defaultdict(list)
+    for s, d in edges:
+        out[s].append(d)
+    state, back = {}, set()
+    for root in order:
+        if root in state:
+            continue
+        stack = [(root, iter(out[root]))]
+        state[root] = 1
+        while stack:
+            v, it = stack[-1]
+            for w in it:
+                if state.get(w) == 1:
+                    back.add((v, w))
+                elif w not in state:
+                    state[w] = 1
+                    stack.append((w, iter(out[w])))
+                    break
+            else:
+                state[v] = 2
+                stack.pop()
+    return [(d, s) if (s, d) in back else (s, d) for s, d in edges], {(d, s) for s, d in back}
+
+def _layers(order, edges):
+    """Longest-path layering: {id: layer}."""
+    indeg = dict.fromkeys(order, 0)
+    out = collections.defaultdict(list)
+    for s, d in edges:
+        out[s].append(d)
+        indeg[d] += 1
+    layer = dict.fromkeys(order, 0)
+    queue = collections.deque(n for n in order if not indeg[n])
+    while queue:
+        v = queue.popleft()
+        for w in out[v]:
+            layer[w] = max(layer[w], layer[v] + 1)
+            indeg[w] -= 1
+            if not indeg[w]:
+                queue.append(w)
+    return layer
+
+def _split(order, edges, layer, size):
+    """
+    Layers as lists of ids (dummies are ("~", i)), the dummy chain of each
+    long edge, and the successor / predecessor lists of the layered graph.
+    """
+    layers = [[] for _ in range(max(layer.values(), default=0) + 1)]
+    for n in order:
+        layers[layer[n]].append(n)
+    succ, pred = collections.defaultdict(list), collections.defaultdict(list)
+    chains = {}
+    for s, d in edges:
+        path = [s]
+        for k in range(layer[s] + 1, layer[d]):
+            dummy = ("~", len(size))
+            size[dummy] = (DUMMY_W, 0)
+            layers[k].append(dummy)
+            path.append(dummy)
+        path.append(d)
+        chains[s, d] = path
+        for a, b in zip(path, path[1:]):
+            succ[a].append(b)
+            pred[b].append(a)
+    return layers, chains, succ, pred
+
+
+# ── 3. crossing reduction ─────────────────────────────────────────────────────
+
+def _crossings(upper, lower, succ):
+    """Crossings between two adjacent layers (Barth, Jünger & Mutzel)."""
+    pos = {v: i for i, v in enumerate(lower)}
+    seq = sorted((i, pos[w]) for i, v in enumerate(upper) for w in succ[v] if w in pos)
+    tree = [0] * (len(lower) + 1)
+    count = 0
+    for n, (_, p) in enumerate(seq):
+        # edges seen so far ending right of p cross this one
+        i, seen = p + 1, 0
+        while i > 0:
+            seen += tree[i]
+            i -= i & -i
+        count += n - seen
+        i = p + 1
+        while i <= len(lower):
+            tree[i] += 1
+            i += i & -i
+    return count
+
+def total_crossings(layers, succ):
+    return sum(_crossings(a, b, succ) for a, b in zip(layers, layers[1:]))
+
+def _sort_by(layer, neighbours, pos):
+    """Reorder layer by neighbour barycenter; nodes without neighbours stay put."""
+    keyed = []
+    for i, v in enumerate(layer):
+        ns = neighbours[v]
+        keyed.append((sum(pos[w] for w in ns) / len(ns) if ns else i, i, v))
+    keyed.sort()
+    layer[:] = [v for _, _, v in keyed]
+
+def _reduce_crossings(layers, succ, pred):
+    best = total_crossings(layers, succ)
+    best_order = [list(l) for l in layers]
+    stale = 0
+    for sweep in range(SWEEPS):
+        if not best:
+            break
+        down = sweep % 2 == 0
+        rng = range(1, len(layers)) if down else range(len(layers) - 2, -1, -1)
+        for k in rng:
+            ref = layers[k - 1] if down else layers[k + 1]
+            pos = {v: i for i, v in enumerate(ref)}
+            _sort_by(layers[k], pred if down else succ, pos)
+        c = total_crossings(layers, succ)
+        if c < best:
+            best, best_order, stale = c, [list(l) for l in layers], 0
+        else:
+            stale += 1
+            if stale >= 4:
+                break
+    layers[:] = best_order
+
+
+# ── 4. x placement ────────────────────────────────────────────────────────────
+
+def _isotonic(target, weight):
+    """Least-squares non-decreasing fit (pool adjacent violators)."""
+    blocks = []   # [value, weight, count]
+    for t, w in zip(target, weight):
+        blocks.append([t, w, 1])
+        while len(blocks) > 1 and blocks[-2][0] > blocks[-1][0]:
+            v2, w2, n2 = blocks.pop()
+            v1, w1, n1 = blocks[-1]
+            blocks[-1] = [(v1 * w1 + v2 * w2) / (w1 + w2), w1 + w2, n1 + n2]
+    out = []
+    for v, _, n in blocks:
+        out.extend([v] * n)
+    return out
+
+def _pack(layer, want, size, weight):
+    """Centres closest to want that keep the layer's order and gaps."""
+    offset, off = [], 0.0
+    for i, v in enumerate(layer):
+        if i:
+            off += (size[layer[i - 1]][0] + size[v][0]) / 2 + GAP_X
+        offset.append(off)
+    fit = _isotonic([want[v] - o for v, o in zip(layer, offset)], [weight[v] for v in layer])
+    return {v: f + o for v, f, o in zip(layer, fit, offset)}
+
+def _place(layers, succ, pred, size):
+    """Centre x of every node."""
+    weight = {v: (2.0 if isinstance(v, tuple) else 1.0) * max(1, len(succ[v]) + len(pred[v]))
+              for l in layers for v in l}
+    x = {}
+    for l in layers:
+        x.update(_pack(l, {v: 0.0 for v in l}, size, weight))
+    for p in range(PLACEMENT_PASSES):
+        down = p % 2 == 0
+        rng = range(1, len(layers)) if down else range(len(layers) - 2, -1, -1)
+        for k in rng:
+            layer = layers[k]
+            nbrs = pred if down else succ
+            want = {}
+            for v in layer:
+                ns = nbrs[v]
+                want[v] = sum(x[w] for w in ns) / len(ns) if ns else x[v]
+            x.update(_pack(layer, want, size, weight))
+    left = min((x[v] - size[v][0] / 2 for l in layers for v in l), default=0)
+    return {v: c - left + MARGIN for v, c in x.items()}
+
+
+# ── 5. channels and routing ───────────────────────────────────────────────────
+
+def _tracks(spans):
+    """Track index per bar so bars sharing a track do not overlap."""
+    ends, out = [], {}
+    for key, (a, b) in sorted(spans.items(), key=lambda kv: kv[1]):
+        for t, end in enumerate(ends):
+            if end + TRACK <= a:
+                ends[t] = b
+                out[key] = t
+                break
+        else:
+            out[key] = len(ends)
+            ends.append(b)
+    return out
+
+def _route(layers, chains, succ, x, size, flipped=frozenset()):
+    def aligned(a, b):
+        return abs(x[a] - x[b]) < 0.5
+
+    # horizontal bars needed in the channel under each layer
+    spans_by_layer = []
+    for l in layers:
+        spans = {}
+        for v in l:
+            kids = succ[v]
+            if len(kids) > 1 or (kids and not aligned(v, kids[0])):
+                xs = [x[v]] + [x[k] for k in kids]
+                spans[v] = (min(xs), max(xs))
+        spans_by_layer.append(spans)
+    tracks = [_tracks(s) for s in spans_by_layer]
+
+    # y of each layer and of each bar
+    top, bar_y, y = [], {}, MARGIN
+    for k, l in enumerate(layers):
+        top.append(y)
+        height = max((size[v][1] for v in l), default=0)
+        y += height
+        n = max(tracks[k].values(), default=-1) + 1
+        for v, t in tracks[k].items():
+            bar_y[v] = y + TRACK * (t + 1)
+        y += max(CHANNEL_MIN, TRACK * (n + 1))
+    layer_of = {v: k for k, l in enumerate(layers) for v in l}
+
+    boxes = {}
+    for k, l in enumerate(layers):
+        for v in l:
+            if not isinstance(v, tuple):
+                w, h = size[v]
+                boxes[v] = (round(x[v] - w / 2, 1), top[k], w, h)
+
+    def cx(v):  return x[v]
+    def bot(v): return boxes[v][1] + boxes[v][3]
+    def ttop(v): return boxes[v][1]
+
+    def through(path):
+        """Points of a long edge from its first dummy to dst."""
+        pts = []
+        for a, b in zip(path[1:], path[2:]):
+            k = layer_of[a]
+            pts.append((x[a], top[k]))
+            if not aligned(a, b):
+                pts += [(x[a], bar_y[a]), (x[b], bar_y[a])]
+        pts.append((x[path[-1]], ttop(path[-1])))
+        return pts
+
+    def down(v, d, p):
+        """Points of the layered edge v -> d, as a single child would be routed."""
+        pts = [(cx(v), bot(v))]
+        nxt = p[1]
+        if not aligned(v, nxt):
+            pts += [(cx(v), bar_y[v]), (x[nxt], bar_y[v])]
+        return _simplify(pts + (through(p) if len(p) > 2 else [(cx(d), ttop(d))]))
+
+    outs_of, backs_of = collections.defaultdict(list), collections.defaultdict(list)
+    for (s, d), p in chains.items():
+        (backs_of if (s, d) in flipped else outs_of)[s].append((d, p))
+
+    routes = []
+    for l in layers:
+        for v in l:
+            # a reversed edge runs back up its layered route, styled as the original
+            for d, p in backs_of.get(v, ()):
+                routes.append(("path", (down(v, d, p)[::-1],), (d, v)))
+            outs = outs_of.get(v)
+            if not outs:
+                continue
+            if len(outs) == 1:
+                d, p = outs[0]
+                if len(p) > 2:
+                    pts = [(cx(v), bot(v))]
+                    if not aligned(v, p[1]):
+                        pts += [(cx(v), bar_y[v]), (x[p[1]], bar_y[v])]
+                    routes.append(("path", (_simplify(pts + through(p)),), (v, d)))
+                elif aligned(v, d):
+                    routes.append(("arrow", (cx(v), bot(v), cx(d), ttop(d)), (v, d)))
+                else:
+                    routes.append(("elbow", (cx(v), bot(v), cx(d), ttop(d), bar_y[v]), (v, d)))
+                continue
+            # bus: stem, bar, then a drop (or the rest of a long edge) per child
+            by = bar_y[v]
+            lo, hi = spans_by_layer[layer_of[v]][v]
+            routes.append(("seg", (cx(v), bot(v), cx(v), by), (v, v)))
+            routes.append(("seg", (lo, by, hi, by), None))
+            for d, p in outs:
+                if len(p) > 2:
+                    routes.append(("path", (_simplify([(x[p[1]], by)] + through(p)),), (d, d)))
+                else:
+                    routes.append(("arrow", (cx(d), by, cx(d), ttop(d)), (d, d)))
+
+    width = max((bx + w for bx, _, w, _ in boxes.values()), default=0) + MARGIN
+    height = max((by + h for _, by, _, h in boxes.values()), default=0) + MARGIN
+    return boxes, routes, (width, height)
+
+def _simplify(pts):
+    """Drop repeated and collinear points of an orthogonal polyline."""
+    out = []
+    for p in pts:
+        if out and abs(p[0] - out[-1][0]) < 0.05 and abs(p[1] - out[-1][1]) < 0.05:
+            continue
+        if len(out) >= 2:
+            (ax, ay), (bx, by) = out[-2], out[-1]
+            if (abs(ax - bx) < 0.05 and abs(bx - p[0]) < 0.05) or \
+               (abs(ay - by) < 0.05 and abs(by - p[1]) < 0.05):
+                out[-1] = p
+                continue
+        out.append(p)
+    return tuple(out)
@@ -0,0 +1,214 @@
+"""
+Per-rerun timing spans and counters.
+
+    with metrics.span("pathway"):
+        ...
+    metrics.inc("svg_bytes", len(svg))
+
+Stage latencies go into bounded reservoirs (overall and per session) and
+are reported as p50/p99 summaries.  Nothing is exported unless asked:
+
+    NS_METRICS_PORT  serve Prometheus text on http://127.0.0.1:<port>/metrics
+    NS_METRICS_LOG   append one JSON line per rerun to a rotating log file
+"""
+
+import collections
+import contextlib
+import json
+import os
+import random
+import threading
+import time
+
+PREFIX = "ns"
+RESERVOIR_SIZE = 1024
+MAX_SESSIONS = 32            # per-session summaries kept for the most recent sessions
+QUANTILES = (0.5, 0.99)
+
+_lock = threading.Lock()
+_counters = collections.Counter()       # (name, labels) -> value
+_gauges = {}                            # name -> fn returning {labels: value}
+_stages = {}                            # stage -> _Reservoir
+_sessions = collections.OrderedDict()   # session -> {stage: _Reservoir}
+_local = threading.local()              # spans of the rerun in progress
+_server = None
+_log = None
+
+
+class _Reservoir:
+    """Uniform sample of at most RESERVOIR_SIZE observations, plus exact sum/count."""
+
+    __slots__ = ("sample", "count", "total")
+
+    def __init__(self):
+        self.sample, self.count, self.total = [], 0, 0.0
+
+    def add(self, v):
+        self.count += 1
+        self.total += v
+        if len(self.sample) < RESERVOIR_SIZE:
+            self.sample.append(v)
+        else:
+            i = random.randrange(self.count)
+            if i < RESERVOIR_SIZE:
+                self.sample[i] = v
+
+    def quantile(self, q):
+        s = sorted(self.sample)
+        return s[min(len(s) - 1, int(q * len(s)))] if s else 0.0
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+def inc(name, value=1, **labels):
+    """Add value to counter name{labels}."""
+    with _lock:
+        _counters[name, _labels(labels)] += value
+
+def gauge(name, fn):
+    """Report gauge name at scrape time; fn() -> {((label, value), ...): number}."""
+    _gauges[name] = fn
+
+def observe(stage, seconds, session=None):
+    with _lock:
+        _stages.setdefault(stage, _Reservoir()).add(seconds)
+        if session is not None:
+            per = _sessions.pop(session, None) or {}
+            _sessions[session] = per
+            per.setdefault(stage, _Reservoir()).add(seconds)
+            while len(_sessions) > MAX_SESSIONS:
+                _sessions.popitem(last=False)
+
+@contextlib.contextmanager
+def span(stage):
+    """Time the block as stage of the current rerun."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        rerun = getattr(_local, "rerun", None)
+        if rerun is not None:
+            rerun["stages"][stage] = rerun["stages"].get(stage, 0.0) + dt
+        observe(stage, dt, rerun and rerun["session"])
+
+@contextlib.contextmanager
+def rerun(session=None, stage="rerun"):
+    """
+    Wrap one script run: times it as stage and logs its spans.  Inside a run
+    already being recorded (a fragment during a full rerun) it adds nothing.
+    """
+    if getattr(_local, "rerun", None) is not None:
+        yield
+        return
+    _local.rerun = {"session": session, "stages": {}}
+    try:
+        with span(stage):
+            yield
+    finally:
+        record, _local.rerun = _local.rerun, None
+        if _log is not None:
+            _log.info(json.dumps({"ts": round(time.time(), 3), "session": session, "run": stage,
+                                  "stages": {k: round(v * 1e3, 3)
+                                             for k, v in record["stages"].items()}}))
+
+
+# ── exposition ────────────────────────────────────────────────────────────────
+
+def _escape(v):
+    # exposition format: backslash, double quote and newline are escaped in values
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _summary(lines, name, labels, res):
+    for q in QUANTILES:
+        lines.append(f"{name}{_fmt_labels(labels + (('quantile', q),))} {res.quantile(q):.6g}")
+    lines.append(f"{name}_sum{_fmt_labels(labels)} {res.total:.6g}")
+    lines.append(f"{name}_count{_fmt_labels(labels)} {res.count}")
+
+def render():
+    """Prometheus text exposition of everything recorded so far."""
+    lines = []
+    with _lock:
+        names = sorted({name for name, _ in _counters})
+        for name in names:
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            for (n, labels), v in sorted(_counters.items()):
+                if n == name:
+                    lines.append(f"{PREFIX}_{name}_total{_fmt_labels(labels)} {v}")
+        name = f"{PREFIX}_stage_seconds"
+        lines.append(f"# TYPE {name} summary")
+        for stage, res in sorted(_stages.items()):
+            _summary(lines, name, (("stage", stage),), res)
+        name = f"{PREFIX}_session_stage_seconds"
+        lines.append(f"# TYPE {name} summary")
+        for session, per in _sessions.items():
+            for stage, res in sorted(per.items()):
+                _summary(lines, name, (("session", session), ("stage", stage)), res)
+    for name, fn in sorted(_gauges.items()):
+        lines.append(f"# TYPE {PREFIX}_{name} gauge")
+        for labels, v in sorted(fn().items()):
+            lines.append(f"{PREFIX}_{name}{_fmt_labels(labels)} {v}")
+    return "\n".join(lines) + "\n"
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _stages.clear()
+        _sessions.clear()
+
+
+def serve(port, host="127.0.0.1"):
+    """Start the /metrics endpoint on a daemon thread (once per process)."""
+    import http.server   # only paid for when the endpoint is enabled
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    global _server
+    with _lock:
+        if _server is None:
+            _server = http.server.ThreadingHTTPServer((host, port), Handler)
+            threading.Thread(target=_server.serve_forever, name="ns-metrics",
+                             daemon=True).start()
+    return _server
+
+def log_to(path, max_bytes=10 << 20, backups=5):
+    """Append per-rerun JSON lines to path, rotating at max_bytes."""
+    import logging.handlers
+
+    global _log
+    with _lock:
+        if _log is None:
+            _log = logging.getLogger("neutropenic_sepsis.metrics")
+            _log.propagate = False
+            _log.setLevel(logging.INFO)
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _log.addHandler(handler)
+    return _log
+
+def start_from_env():
+    """Enable the exporters requested through NS_METRICS_PORT / NS_METRICS_LOG."""
+    if os.environ.get("NS_METRICS_PORT"):
+        serve(int(os.environ["NS_METRICS_PORT"]))
+    if os.environ.get("NS_METRICS_LOG"):
+        log_to(os.environ["NS_METRICS_LOG"])
@@ -0,0 +1,98 @@
+"""
+Background rendering of the PNGs the page is likely to ask for next.
+"""
+
+import collections
+import concurrent.futures
+import functools
+import threading
+
+from . import core, metrics
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# PREFETCH
+#
+# The only per-state render the page asks the server for is the PNG behind
+# "Copy flowchart" (~0.25 s; the chart itself switches states in the
+# browser, and recommendations are a table lookup).  A clinician mostly
+# changes one answer at a time, so after each rerun the PNG of the current
+# state and of the states one input flip away (Hamming distance 1) are
+# rendered on a background thread into the PNG cache that cached_png reads.
+# Without a rasteriser there is nothing to prefetch.
+#
+# Each session's new prediction cancels its previous one's queued work, the
+# queue holds at most len(INPUTS) + 1 renders per session for the most recent
+# PREFETCH_SESSIONS sessions, and the cache stays bounded by its LRU size.
+# The next rerun scores the prediction: "hit" (the new state was prefetched
+# and ready), "late" (predicted, still rendering), "miss" (not predicted).
+# A prediction made under a spec that has since been reloaded is dropped
+# unscored, and its queued renders return without rendering (_warm).
+# ══════════════════════════════════════════════════════════════════════════════
+
+PREFETCH_WORKERS = 1
+PREFETCH_SESSIONS = 64
+
+_prefetch_lock = threading.Lock()
+_predicted = collections.OrderedDict()   # session -> (Pathway, key it was made at, {key: future})
+_prefetch_stats = collections.Counter()
+
+@functools.lru_cache(maxsize=1)
+def _prefetch_pool():
+    return concurrent.futures.ThreadPoolExecutor(PREFETCH_WORKERS,
+                                                 thread_name_prefix="ns-prefetch")
+
+def neighbour_keys(P=None, **inputs):
+    """pathway_keys one input flip away, other than the current one, in P.INPUTS order."""
+    P = P or core.PATHWAY
+    idx = core.input_index(P, **inputs)
+    keys = dict.fromkeys(P.PATHWAY_TABLE[idx ^ 1 << i] for i in range(len(P.INPUTS)))
+    keys.pop(P.PATHWAY_TABLE[idx], None)
+    return list(keys)
+
+def _warm(P, key):
+    if P is not core.PATHWAY:
+        return          # queued before a spec reload: its caches are gone
+    core._png_cache(P)(key)
+    with _prefetch_lock:
+        _prefetch_stats["done"] += 1
+
+def _cancel(futures):
+    n = sum(f.cancel() for f in futures)
+    _prefetch_stats["cancelled"] += n
+
+def prefetch(inputs, session=None):
+    """
+    Score the session's last prediction against inputs, then prefetch the
+    PNGs of inputs and their neighbours.
+    """
+    if not core.png_available():
+        return
+    P = core.PATHWAY
+    key = P.PATHWAY_TABLE[core.input_index(P, **inputs)]
+    with _prefetch_lock:
+        last = _predicted.pop(session, None)
+        if last is not None:
+            made, at, futures = last
+            if made is P and key != at:     # the pathway changed: was it foreseen?
+                f = futures.get(key)
+                result = "miss" if f is None else "hit" if f.done() else "late"
+                _prefetch_stats[result] += 1
+                metrics.inc("prefetch", result=result)
+            _cancel(futures.values())
+        pool = _prefetch_pool()
+        _predicted[session] = (P, key, {k: pool.submit(_warm, P, k)
+                                        for k in [key] + neighbour_keys(P, **inputs)})
+        while len(_predicted) > PREFETCH_SESSIONS:
+            _cancel(_predicted.popitem(last=False)[1][2].values())
+
+def cancel_prefetch():
+    """Drop every queued prefetch (renders already running finish)."""
+    with _prefetch_lock:
+        while _predicted:
+            _cancel(_predicted.popitem()[1][2].values())
+
+def prefetch_stats():
+    """Prediction hits / late / misses and prefetch jobs done / cancelled so far."""
+    with _prefetch_lock:
+        return {k: _prefetch_stats[k] for k in ("hit", "late", "miss", "done", "cancelled")}
@@ -0,0 +1,235 @@
+"""
+Opt-in profiling of live reruns, for "the app felt slow" reports.
+
+    with profiling.run(session):
+        main(session)
+
+A profiled run is timed by cProfile, its stack is sampled every
+SAMPLE_INTERVAL, and it may be traced by tracemalloc; each one writes these
+files to NS_PROFILE_DIR:
+
+    <time>-<session>-<stage>.pstats   pstats (snakeviz, gprof2dot, python -m pstats)
+    <time>-<session>-<stage>.folded   sampled stacks, one line per stack with its
+                                      sample count (flamegraph.pl, speedscope)
+    <time>-<session>-<stage>.alloc    top allocation sites and peak traced memory
+                                      (traced runs only)
+
+Which runs: a random NS_PROFILE_RATE fraction of all of them, plus every
+run of a session switched on with set_session (the app's admin toggle).
+Only one run is profiled at a time; cProfile and tracemalloc are
+process-wide, so a run that comes up while another is profiled is skipped
+(ns_profiles_total{result="busy"}).  Runs not picked cost one random().
+cProfile and the sampler slow a run down by a few per cent; tracemalloc
+makes it many times slower, so by default it only traces runs of switched-on
+sessions.  Only the newest KEEP profiles are kept.
+
+    NS_PROFILE_DIR    where profiles go; nothing is profiled unless set
+    NS_PROFILE_RATE   fraction of runs profiled (default 0: toggled sessions only)
+    NS_PROFILE_TOKEN  ?profile=<token> shows the admin toggle in that browser session
+    NS_PROFILE_ALLOC  1: trace allocations in every profiled run, 0: in none
+                      (default: switched-on sessions only)
+
+    python -m neutropenic_sepsis profiles DIR            # merged top functions
+    python -m neutropenic_sepsis profiles DIR --folded   # merged stacks
+"""
+
+import collections
+import contextlib
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+from . import metrics
+
+KEEP = 200                   # profiles (file triples) kept in the directory
+TOP_ALLOCATIONS = 25
+TRACE_FRAMES = 16            # tracemalloc frames per allocation
+SAMPLE_INTERVAL = 0.001      # s between stack samples for the .folded file
+MAX_DEPTH = 128              # frames kept per sampled stack
+MAX_SESSIONS = 64            # sessions that can be switched on at once
+
+_config = None               # {"dir", "rate", "token", "alloc"} once configured
+_sessions = collections.OrderedDict()    # session -> True, switched on
+_busy = threading.Lock()
+_local = threading.local()
+
+
+def configure(directory, rate=0.0, token=None, alloc=None):
+    """
+    Profile into directory: a rate fraction of runs, and switched-on
+    sessions.  alloc: trace allocations always (True), never (False) or in
+    switched-on sessions only (None).
+    """
+    global _config
+    os.makedirs(directory, exist_ok=True)
+    _config = {"dir": directory, "rate": float(rate), "token": token or None, "alloc": alloc}
+
+def start_from_env():
+    if os.environ.get("NS_PROFILE_DIR") and _config is None:
+        alloc = os.environ.get("NS_PROFILE_ALLOC")
+        configure(os.environ["NS_PROFILE_DIR"], float(os.environ.get("NS_PROFILE_RATE") or 0),
+                  os.environ.get("NS_PROFILE_TOKEN"),
+                  None if not alloc else alloc not in ("0", "false", "no"))
+
+def enabled():
+    return _config is not None
+
+def admin(token):
+    """True if token is the configured admin token."""
+    return (_config is not None and _config["token"] is not None and isinstance(token, str)
+            and hmac.compare_digest(token, _config["token"]))
+
+def set_session(session, on):
+    """Profile every run of session (or stop doing so)."""
+    if on:
+        _sessions[session] = True
+        _sessions.move_to_end(session)
+        while len(_sessions) > MAX_SESSIONS:
+            _sessions.popitem(last=False)
+    else:
+        _sessions.pop(session, None)
+
+def session_enabled(session):
+    return session in _sessions
+
+
+@contextlib.contextmanager
+def run(session=None, stage="rerun"):
+    """
+    Profile one script run if it is picked (sampled, or its session is
+    switched on).  Inside a run already being profiled it adds nothing.
+    """
+    cfg = _config
+    if cfg is None or getattr(_local, "active", False):
+        yield
+        return
+    switched_on = session in _sessions
+    if not (switched_on or random.random() < cfg["rate"]):
+        yield
+        return
+    if not _busy.acquire(blocking=False):
+        metrics.inc("profiles", result="busy")
+        yield
+        return
+
+    import cProfile
+    import tracemalloc
+    trace = (switched_on if cfg["alloc"] is None else cfg["alloc"]) and not tracemalloc.is_tracing()
+    _local.active = True
+    t0 = time.time()
+    prof, sampler = cProfile.Profile(), _Sampler(threading.get_ident())
+    snapshot = peak = None
+    try:
+        if trace:
+            tracemalloc.start(TRACE_FRAMES)
+        sampler.start()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            sampler.stop()
+            if trace:
+                snapshot, peak = tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1]
+        try:
+            _write(cfg["dir"], t0, session, stage, prof, sampler.stacks, snapshot, peak)
+            metrics.inc("profiles", result="written")
+        except OSError:
+            metrics.inc("profiles", result="failed")
+    finally:
+        if trace:
+            tracemalloc.stop()
+        _local.active = False
+        _busy.release()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# OUTPUT
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _write(directory, t0, session, stage, prof, stacks, snapshot, peak):
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(t0)) + f".{int(t0 * 1000) % 1000:03d}"
+    who = re.sub(r"[^\w.]", "_", str(session or "none"))
+    base = os.path.join(directory, f"{stamp}-{who}-{stage}")
+    prof.dump_stats(base + ".pstats")
+    with open(base + ".folded", "w", encoding="utf-8") as f:
+        f.writelines(f"{stack} {n}\n" for stack, n in stacks.items())
+    if snapshot is not None:
+        with open(base + ".alloc", "w", encoding="utf-8") as f:
+            f.write(allocation_report(snapshot, peak))
+    _prune(directory)
+
+class _Sampler(threading.Thread):
+    """Counts the profiled thread's stack every SAMPLE_INTERVAL, for the .folded file."""
+
+    def __init__(self, ident):
+        super().__init__(name="ns-profile-sampler", daemon=True)
+        self.target, self.stacks, self.done = ident, collections.Counter(), threading.Event()
+        self._labels = {}
+
+    def _label(self, code):
+        name = self._labels.get(code)
+        if name is None:
+            name = self._labels[code] = (f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                                        f"{code.co_firstlineno})").replace(";", ",")
+        return name
+
+    def run(self):
+        while not self.done.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        if self.is_alive():
+            self.done.set()
+            self.join()
+
+def allocation_report(snapshot, peak=None, top=TOP_ALLOCATIONS):
+    """Text: the top allocation sites still live at the end of the run."""
+    import tracemalloc
+
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),           # the stack sampler
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ))
+    stats = snapshot.statistics("traceback")
+    lines = [f"peak traced memory {peak / 1024:,.1f} KiB" if peak is not None else "",
+             f"live at end of run {sum(s.size for s in stats) / 1024:,.1f} KiB "
+             f"in {sum(s.count for s in stats):,} blocks", ""]
+    for s in stats[:top]:
+        lines.append(f"{s.size / 1024:,.1f} KiB in {s.count:,} blocks")
+        lines.extend(f"    {line}" for line in s.traceback.format(limit=4, most_recent_first=True))
+    return "\n".join(lines) + "\n"
+
+def _prune(directory):
+    runs = sorted({n.rsplit(".", 1)[0] for n in os.listdir(directory)
+                   if n.endswith((".pstats", ".folded", ".alloc"))})
+    for base in runs[:-KEEP]:
+        for ext in (".pstats", ".folded", ".alloc"):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(directory, base + ext))
+
+def merged(directory):
+    """(pstats.Stats over every .pstats in directory, or None; merged {stack: samples})."""
+    import pstats
+
+    names = sorted(os.listdir(directory))
+    files = [os.path.join(directory, n) for n in names if n.endswith(".pstats")]
+    stacks = collections.Counter()
+    for n in names:
+        if n.endswith(".folded"):
+            with open(os.path.join(directory, n), encoding="utf-8") as f:
+                for line in f:
+                    stack, _, n = line.rstrip("\n").rpartition(" ")
+                    stacks[stack] += int(n)
+    return (pstats.Stats(*files) if files else None), stacks
@@ -0,0 +1,176 @@
+"""
+HTTP side service: the highlighted flowchart as a plain image (or text, or
+JSON), for pages that embed it without a Streamlit session (eNotes
+templates, ward dashboards).
+
+    python -m neutropenic_sepsis serve --port 8502
+
+    GET /pathway/<code>.svg            the chart for one set of inputs
+    GET /pathway/<code>.png            (PNG needs CairoSVG or resvg)
+    GET /pathway/<code>.txt            as text, for clinical notes
+    GET /pathway/<code>.json           the scene with each element's state
+    GET /pathway/<spec>/<code>.svg     the same, pinned to one spec version
+
+<code> is the input index (bit i = INPUTS[i], see state_code) in hex: two
+digits for the six inputs of the bundled spec, e.g. 00 or 2b.  <spec> is the
+spec hash.  Pinned URLs never change content and are served as immutable;
+the unpinned ones follow spec edits, so they are cacheable for
+UNPINNED_MAX_AGE and then revalidated (a strong ETag, 304 when unchanged).
+Bodies are compressed once, when first asked for (gzip, and brotli if the
+brotli package is installed), and picked by Accept-Encoding.
+"""
+
+import gzip
+import hashlib
+import re
+import threading
+
+from . import core, metrics
+
+UNPINNED_MAX_AGE = 300
+IMMUTABLE = "public, max-age=31536000, immutable"
+ASSET_CACHE = 256            # rendered (spec, state, format) bodies kept
+
+_ROUTE = re.compile(r"^/pathway/(?:([0-9a-f]{16})/)?([0-9a-f]+)\.(svg|png|txt|json)$")
+_TYPES = {"svg": "image/svg+xml; charset=utf-8", "png": "image/png",
+          "txt": "text/plain; charset=utf-8", "json": "application/json"}
+
+_assets = {}                 # (spec hash, pathway_key, fmt) -> (etag, {encoding: body})
+_assets_lock = threading.Lock()
+
+
+def state_code(P=None, **inputs):
+    """Compact code of one set of determine_pathway inputs (hex input index)."""
+    P = P or core.PATHWAY
+    return f"{core.input_index(P, **inputs):0{(len(P.INPUTS) + 3) // 4}x}"
+
+def code_inputs(code, P=None):
+    """Inverse of state_code: {input name: bool}, or None if code is not valid."""
+    P = P or core.PATHWAY
+    idx = int(code, 16)
+    if len(code) != (len(P.INPUTS) + 3) // 4 or idx >> len(P.INPUTS):
+        return None
+    return {name: bool(idx >> i & 1) for i, name in enumerate(P.INPUTS)}
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+def _render(P, key, fmt):
+    AN = core.pathway_nodes(key, P)
+    if fmt == "png":
+        return core.render(AN, "png", P), {}
+    body = core.render(AN, fmt, P).encode("utf-8")
+    variants = {"gzip": gzip.compress(body, 9, mtime=0)}
+    br = _brotli()
+    if br is not None:
+        variants["br"] = br.compress(body, quality=11)
+    return body, variants
+
+def asset(P, key, fmt):
+    """(etag, {encoding: body}) of one pathway state, rendered and compressed once."""
+    k = (P.SPEC_HASH, key, fmt)
+    with _assets_lock:
+        hit = _assets.get(k)
+    metrics.inc("image_lookups", fmt=fmt, result="hit" if hit else "miss")
+    if hit:
+        return hit
+    body, variants = _render(P, key, fmt)
+    etag = hashlib.sha256(body).hexdigest()[:20]
+    out = (etag, {"identity": body, **variants})
+    with _assets_lock:
+        if len(_assets) >= ASSET_CACHE:
+            _assets.clear()
+        _assets[k] = out
+    return out
+
+def _encoding(accept, available):
+    """Best content coding in available for an Accept-Encoding header."""
+    offered = {}
+    for part in (accept or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        m = re.search(r"q=([0-9.]+)", params)
+        if m:
+            try:
+                q = float(m.group(1))
+            except ValueError:
+                q = 0.0               # a malformed q value: not acceptable
+        offered[name.strip().lower()] = q
+    for enc in ("br", "gzip"):
+        if enc in available and offered.get(enc, offered.get("*", 0)) > 0:
+            return enc
+    return "identity"
+
+def _etag_matches(header, etag):
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
+
+
+def respond(path, headers):
+    """(status, headers, body) for a GET of path; headers are the request's."""
+    m = _ROUTE.match(path.split("?")[0])
+    if not m:
+        return 404, {"Content-Type": "text/plain; charset=utf-8"}, b"not found\n"
+    pinned, code, fmt = m.groups()
+    P = core.PATHWAY                         # one spec for the whole request
+    if pinned and pinned != P.SPEC_HASH:
+        return 404, {"Content-Type": "text/plain; charset=utf-8"}, b"unknown spec version\n"
+    inputs = code_inputs(code, P)
+    if inputs is None:
+        return 404, {"Content-Type": "text/plain; charset=utf-8"}, b"not a state code\n"
+    if fmt == "png" and not core.png_available():
+        return 501, {"Content-Type": "text/plain; charset=utf-8"}, b"no PNG renderer installed\n"
+
+    key = P.PATHWAY_TABLE[core.input_index(P, **inputs)]
+    etag, bodies = asset(P, key, fmt)
+    enc = _encoding(headers.get("Accept-Encoding"), bodies)
+    tag = f'"{etag}"' if enc == "identity" else f'"{etag}-{enc}"'
+    out = {
+        "Content-Type": _TYPES[fmt],
+        "ETag": tag,
+        "Cache-Control": IMMUTABLE if pinned else f"public, max-age={UNPINNED_MAX_AGE}",
+    }
+    if len(bodies) > 1:
+        out["Vary"] = "Accept-Encoding"
+    if not pinned:
+        out["Link"] = f'</pathway/{P.SPEC_HASH}/{code}.{fmt}>; rel="canonical"'
+    if enc != "identity":
+        out["Content-Encoding"] = enc
+    if _etag_matches(headers.get("If-None-Match") or "", tag):
+        return 304, out, b""
+    return 200, out, bodies[enc]
+
+
+def make_server(port=8502, host="127.0.0.1"):
+    """A threading HTTP server for the image endpoints (call serve_forever())."""
+    import http.server
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self, head=False):
+            status, headers, body = respond(self.path, self.headers)
+            metrics.inc("image_requests", status=status)
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            if status != 304:
+                self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if not head:
+                self.wfile.write(body)
+
+        def do_HEAD(self):
+            self.do_GET(head=True)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,209 @@
+"""
+The pathway specification: one JSON document holding the guideline's
+inputs, decision tree, flowchart nodes and edges, legend and
+recommendations.  neutropenic_sepsis.core compiles it into the runtime
+tables and SVG templates.
+
+Decision tree: each step activates some nodes, then optionally branches on
+one input —
+
+    {"activate": [node ids], "if": input, "then": {step}, "else": {step}}
+
+Edges: {"kind": "arrow", "from", "to"}; {"kind": "bus", "from", "y", "to": [...]}
+(stem, horizontal bus at y, a drop to each target); {"kind": "elbow", "from",
+"to", "y"} (down, across at y, down) or {..., "exit": "right", "dx"} (out of
+the right side, down dx px to the right of it).
+
+Nodes without a "box" (and then no "size" either) are placed by the layered
+layout engine (layout.py); their edges only need "from" and "to", and any
+routing given is ignored.
+
+Page text: "title", optional "subtitle" and "footer"; the form is {"title",
+"fields", optional "note"}.
+
+Form fields: {"input", "widget": "radio" | "checkbox", "label", "options"
+(radio; the first one means true), "default" (true / false), "help",
+"disabled_if"}.  disabled_if is a list of {input: value} clauses; the field is disabled
+when every input of any one clause has its value.
+"""
+
+import hashlib
+import json
+import os
+
+SPEC_PATH = os.environ.get("NS_SPEC") or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                      "pathway.json")
+
+EDGE_KINDS = ("arrow", "bus", "elbow")
+FIELD_WIDGETS = ("radio", "checkbox")
+_JSON_TYPES = {str: "string", list: "array", dict: "object"}
+
+
+def read_spec(path=SPEC_PATH, fills=None):
+    """(spec dict, content hash) of a spec file; ValueError if it is invalid."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return parse_spec(data, fills), spec_hash(data)
+
+def spec_hash(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+def parse_spec(data, fills=None):
+    """Spec dict from JSON text; fills, if given, are the allowed fill names."""
+    try:
+        spec = json.loads(data)
+    except ValueError as e:
+        raise ValueError(f"pathway spec is not valid JSON: {e}") from None
+    problems = check_spec(spec, fills)
+    if problems:
+        raise ValueError("invalid pathway spec:\n  " + "\n  ".join(problems))
+    return spec
+
+def check_spec(spec, fills=None):
+    """Problems with a parsed spec, as messages (empty if it is usable)."""
+    bad = _check_shape(spec)
+    if bad:
+        return bad
+    inputs = set(spec["inputs"])
+    ids = [n["id"] for n in spec["nodes"]]
+    known = set(ids)
+    if len(known) != len(ids):
+        bad.append("duplicate node ids: " + ", ".join(sorted({i for i in ids if ids.count(i) > 1})))
+    for n in spec["nodes"]:
+        if fills is not None and n.get("fill") not in fills:
+            bad.append(f"node {n['id']}: unknown fill {n.get('fill')!r}")
+        box = n.get("box")
+        if box is not None and (not isinstance(box, list) or len(box) != 4
+                                or not all(isinstance(v, (int, float)) for v in box)):
+            bad.append(f"node {n['id']}: box must be [x, y, w, h]")
+
+    def walk(step, path):
+        for nid in step.get("activate", ()):
+            if nid not in known:
+                bad.append(f"decision {path or 'root'}: unknown node {nid!r}")
+        if "if" in step:
+            if step["if"] not in inputs:
+                bad.append(f"decision {path or 'root'}: unknown input {step['if']!r}")
+            for branch in ("then", "else"):
+                if branch not in step:
+                    bad.append(f"decision {path or 'root'}: {step['if']!r} has no {branch!r}")
+                else:
+                    walk(step[branch], f"{path}/{step['if']}={branch}")
+    walk(spec["decision"], "")
+
+    for i, e in enumerate(spec["edges"]):
+        if "kind" in e and e["kind"] not in EDGE_KINDS:
+            bad.append(f"edge {i}: unknown kind {e.get('kind')!r}")
+        for nid in [e.get("from")] + _targets(e):
+            if nid not in known:
+                bad.append(f"edge {i}: unknown node {nid!r}")
+    for f in spec["form"]["fields"]:
+        if f.get("input") not in inputs:
+            bad.append(f"form: unknown input {f.get('input')!r}")
+        for clause in f.get("disabled_if", ()):
+            for name in clause:
+                if name not in inputs:
+                    bad.append(f"form {f.get('input')}: disabled_if uses unknown input {name!r}")
+    for r in spec["recommendations"]:
+        for nid in r.get("when", ()):
+            if nid not in known:
+                bad.append(f"recommendation {r.get('title')!r}: unknown node {nid!r}")
+    return bad
+
+def _targets(edge):
+    to = edge.get("to")
+    return to if isinstance(to, list) else [to]
+
+def _check_shape(spec):
+    """
+    Structural problems: every part check_spec and the compiler index into
+    must have the right JSON type, so a malformed spec is reported, not met
+    as an AttributeError half way through compiling it.
+    """
+    if not isinstance(spec, dict):
+        return ["the spec must be a JSON object"]
+    bad = []
+    for key, kind in (("title", str), ("inputs", list), ("decision", dict), ("nodes", list),
+                      ("edges", list), ("recommendations", list), ("form", dict)):
+        if key not in spec:
+            bad.append(f"missing {key!r}")
+        elif not isinstance(spec[key], kind):
+            bad.append(f"{key!r} must be a JSON {_JSON_TYPES[kind]}")
+    for key in ("subtitle", "footer"):
+        if not isinstance(spec.get(key, ""), str):
+            bad.append(f"{key!r} must be a JSON string")
+    if bad:
+        return bad
+    if not all(isinstance(name, str) for name in spec["inputs"]):
+        bad.append("inputs must be names (strings)")
+    for what in ("nodes", "edges", "recommendations"):
+        for i, item in enumerate(spec[what]):
+            if not isinstance(item, dict):
+                bad.append(f"{what} {i}: must be an object, not {item!r}")
+    if bad:
+        return bad
+    for i, n in enumerate(spec["nodes"]):
+        if not isinstance(n.get("id"), str):
+            bad.append(f"node {i}: missing id")
+    for i, e in enumerate(spec["edges"]):
+        if not all(isinstance(nid, str) for nid in [e.get("from")] + _targets(e)):
+            bad.append(f"edge {i}: from / to must be node ids")
+    for r in spec["recommendations"]:
+        if not isinstance(r.get("when", []), list):
+            bad.append(f"recommendation {r.get('title')!r}: when must be a list of node ids")
+
+    def walk(step, path):
+        if not isinstance(step, dict):
+            bad.append(f"decision {path or 'root'}: a step must be an object, not {step!r}")
+            return
+        if not isinstance(step.get("activate", []), list):
+            bad.append(f"decision {path or 'root'}: activate must be a list of node ids")
+        if "if" in step:
+            if not isinstance(step["if"], str):
+                bad.append(f"decision {path or 'root'}: if must be an input name")
+                return
+            for branch in ("then", "else"):
+                if branch in step:
+                    walk(step[branch], f"{path}/{step['if']}={branch}")
+    walk(spec["decision"], "")
+
+    form = spec["form"]
+    if not isinstance(form.get("title"), str) or not isinstance(form.get("note", ""), str):
+        bad.append("form: title (and note) must be strings")
+    fields = form.get("fields")
+    if not isinstance(fields, list) or not all(isinstance(f, dict) for f in fields):
+        bad.append("form: fields must be a list of objects")
+        return bad
+    for i, f in enumerate(fields):
+        name = f.get("input", i)
+        if not isinstance(f.get("input"), str) or not isinstance(f.get("label"), str):
+            bad.append(f"form {name}: input and label must be strings")
+        if f.get("widget") not in FIELD_WIDGETS:
+            bad.append(f"form {name}: unknown widget {f.get('widget')!r}")
+        elif f["widget"] == "radio":
+            options = f.get("options")
+            if (not isinstance(options, list) or len(options) < 2
+                    or not all(isinstance(o, str) for o in options)):
+                bad.append(f"form {name}: a radio needs options, the first one meaning true")
+        if not isinstance(f.get("default"), bool):
+            bad.append(f"form {name}: default must be true or false")
+        if not isinstance(f.get("help", ""), str):
+            bad.append(f"form {name}: help must be a string")
+        clauses = f.get("disabled_if", [])
+        if not isinstance(clauses, list) or not all(isinstance(c, dict) for c in clauses):
+            bad.append(f"form {name}: disabled_if must be a list of objects")
+    return bad
+
+def walk_decision(step, inputs):
+    """Active node ids for one set of inputs (the reference evaluation)."""
+    AN = set()
+    while True:
+        AN.update(step.get("activate", ()))
+        if "if" not in step:
+            return AN
+        step = step["then"] if inputs[step["if"]] else step["else"]
+
+def field_disabled(field, values):
+    """Whether a form field is disabled, given the values of the fields above it."""
+    return any(all(values.get(k) == v for k, v in clause.items())
+               for clause in field.get("disabled_if", ()))
@@ -0,0 +1,229 @@
+"""
+Static build: the whole decision aid as files any web server can host.
+
+    python -m neutropenic_sepsis export-static site/
+
+index.html carries the compiled decision table, the flowchart shell (compact
+SVG + copy button), the recommendation texts and the form from the spec;
+clicks are evaluated and highlighted in the page with no server round trip.
+sw.js caches the page for offline use, versioned by the spec and build hash.
+"""
+
+import hashlib
+import json
+import os
+
+from . import core
+from .core import esc, flowchart_shell, reachable_pathways
+from .spec import field_disabled
+
+# ══════════════════════════════════════════════════════════════════════════════
+# STATIC BUILD
+#
+# The browser gets the same tables the server uses: the input index (bit i =
+# INPUTS[i]) selects a pathway state; each distinct state is its active node
+# ids and the indices of its recommendations.  determine_pathway stays the
+# reference — the table is PATHWAY_TABLE, already checked by `verify`.
+# ══════════════════════════════════════════════════════════════════════════════
+
+PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>
+body{{margin:0;padding:24px 32px;font-family:Arial,sans-serif;color:#31333f;background:#fff}}
+h1{{font-size:30px;margin:0 0 4px}} h2{{font-size:20px;margin:0 0 12px}}
+hr{{border:none;border-top:1px solid #e6e6ea;margin:18px 0}}
+.caption{{font-size:13px;color:#808495}}
+.cols{{display:grid;grid-template-columns:minmax(220px,1fr) 3.2fr;gap:32px}}
+@media (max-width:900px){{.cols{{grid-template-columns:1fr}}}}
+fieldset{{border:none;margin:0 0 14px;padding:0}}
+legend,.field>label{{font-weight:bold;font-size:14px;padding:0;margin-bottom:6px}}
+fieldset label{{display:block;font-size:14px;margin:4px 0;cursor:pointer}}
+.field{{margin:0 0 14px;font-size:14px}}
+[disabled],fieldset[disabled] label{{opacity:.5;cursor:not-allowed}}
+.rec{{margin:0 0 12px;font-size:15px}}
+.info{{background:#e8f2fc;color:#0054a3;border-radius:8px;padding:14px 16px;font-size:15px}}
+</style>
+</head>
+<body>
+<h1>🧬 {title}</h1>
+<div class="caption">{subtitle}</div>
+<hr>
+<div class="cols">
+<form id="form" onsubmit="return false">
+<h2>{form_title}</h2>
+{fields}
+<hr>
+<div class="caption">{note}</div>
+</form>
+<div id="chart">{shell}</div>
+</div>
+<hr>
+<h2>📋 Recommended Actions</h2>
+<div id="recs"></div>
+<hr>
+<div class="caption">{footer}</div>
+<script>
+const PATHWAY = {data};
+{script}
+</script>
+</body>
+</html>
+"""
+
+# Evaluate the form, look the state up and restyle the mounted chart.  The
+# highlight is the flowchart component's (flowchart_component/index.html).
+SCRIPT = r"""
+(function () {
+  const form = document.getElementById("form");
+
+  function highlight(active, dim) {
+    const on = new Set(active);
+    const dimmed = n => dim && !on.has(n);
+    document.querySelectorAll("[data-n]").forEach(el => {
+      const n = el.dataset.n;
+      el.classList.toggle("act", on.has(n));
+      el.classList.toggle("dim", dimmed(n));
+    });
+    document.querySelectorAll("[data-on]").forEach(el => {
+      const [src, dst] = el.dataset.on.split(" ");
+      const act = on.has(src);
+      el.classList.toggle("act", act);
+      el.classList.toggle("dim", !act && (dimmed(src) || dimmed(dst)));
+    });
+  }
+
+  function read(field) {
+    if (field.widget === "checkbox") return form.elements[field.input].checked;
+    return form.elements[field.input].value === "0";   // the first option means true
+  }
+
+  function disabled(field, values) {
+    return (field.disabled_if || []).some(clause =>
+      Object.keys(clause).every(k => values[k] === clause[k]));
+  }
+
+  function render() {
+    const values = {};
+    let idx = 0;
+    for (const field of PATHWAY.fields) {
+      // disabled fields keep their value, as in the Streamlit form
+      const off = disabled(field, values);
+      const el = document.getElementById("f-" + field.input);
+      el.disabled = off;
+      el.querySelectorAll("input").forEach(i => { i.disabled = off; });
+      values[field.input] = read(field);
+    }
+    PATHWAY.inputs.forEach((name, i) => { if (values[name]) idx |= 1 << i; });
+    const [active, recs] = PATHWAY.states[PATHWAY.table[idx]];
+    const ids = active.map(i => PATHWAY.nodes[i]);
+    highlight(ids, ids.length > 2);
+    document.getElementById("recs").innerHTML = recs.length
+      ? recs.map(i => PATHWAY.recommendations[i]).join("")
+      : '<div class="info">Select patient parameters to see recommendations.</div>';
+  }
+
+  form.addEventListener("change", render);
+  render();
+
+  if ("serviceWorker" in navigator && location.protocol.startsWith("http")) {
+    navigator.serviceWorker.register("sw.js").catch(() => {});
+  }
+})();
+"""
+
+# Cache-first: the page never changes under a given cache name, and a new
+# build (new name) drops the old caches when it activates.
+SERVICE_WORKER = """const CACHE = {cache};
+const FILES = ["./", "index.html"];
+
+self.addEventListener("install", ev => {{
+  ev.waitUntil(caches.open(CACHE).then(c => c.addAll(FILES)).then(() => self.skipWaiting()));
+}});
+
+self.addEventListener("activate", ev => {{
+  ev.waitUntil(caches.keys()
+    .then(keys => Promise.all(keys.filter(k => k !== CACHE).map(k => caches.delete(k))))
+    .then(() => self.clients.claim()));
+}});
+
+self.addEventListener("fetch", ev => {{
+  if (ev.request.method !== "GET") return;
+  ev.respondWith(caches.match(ev.request, {{ignoreSearch: true}})
+    .then(hit => hit || fetch(ev.request)));
+}});
+"""
+
+
+def _field_html(field, values):
+    """Form markup for one spec field, in its default state."""
+    name = field["input"]
+    off = " disabled" if field_disabled(field, values) else ""
+    title = f' title="{esc(field["help"]).replace(chr(34), "&quot;")}"' if field.get("help") else ""
+    if field["widget"] == "radio":
+        options = "".join(
+            f'<label><input type="radio" name="{name}" value="{i}"'
+            f'{" checked" if (i == 0) == field["default"] else ""}{off}> {esc(o)}</label>'
+            for i, o in enumerate(field["options"][:2]))
+        return (f'<fieldset id="f-{name}"{off}{title}><legend>{esc(field["label"])}</legend>'
+                f"{options}</fieldset>")
+    return (f'<div class="field" id="f-{name}"{title}><label><input type="checkbox" '
+            f'name="{name}"{" checked" if field["default"] else ""}{off}> '
+            f'{esc(field["label"])}</label></div>')
+
+def _script_json(obj):
+    """JSON safe to inline in a <script> element."""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/")
+
+def pathway_data(P):
+    """The tables the page evaluates: inputs, node ids, states and the table."""
+    states, state_of = [], {}
+    for key, AN in sorted(reachable_pathways(P).items()):
+        state_of[key] = len(states)
+        recs = [i for i, (nodes, *_) in enumerate(P.RECOMMENDATIONS)
+                if any(n in AN for n in nodes)]
+        states.append([sorted(P.NODE_IDS.index(n) for n in AN), recs])
+    return {
+        "inputs": list(P.INPUTS),
+        "nodes": list(P.NODE_IDS),
+        "states": states,
+        "table": [state_of[key] for key in P.PATHWAY_TABLE],
+        "recommendations": [f'<div class="rec"><b>{esc(icon)} {esc(title)}</b><br>{esc(detail)}</div>'
+                            for _, icon, title, detail in P.RECOMMENDATIONS],
+        "fields": [{k: f[k] for k in ("input", "widget", "disabled_if") if k in f}
+                   for f in P.SPEC["form"]["fields"]],
+    }
+
+def build_static():
+    """{file name: bytes} of the static site for the current spec."""
+    P = core.PATHWAY
+    spec = P.SPEC
+    form = spec["form"]
+    values, fields = {}, []
+    for f in form["fields"]:
+        fields.append(_field_html(f, values))
+        values[f["input"]] = f["default"]
+    page = PAGE.format(
+        title=esc(spec["title"]), subtitle=esc(spec.get("subtitle", "")),
+        form_title=esc(form["title"]), fields="\n".join(fields), note=esc(form.get("note", "")),
+        footer=esc(spec.get("footer", "")), shell=flowchart_shell(P)[0],
+        data=_script_json(pathway_data(P)), script=SCRIPT.strip(),
+    ).encode("utf-8")
+    version = f"ns-{P.SPEC_HASH}-{hashlib.sha1(page).hexdigest()[:12]}"
+    return {
+        "index.html": page,
+        "sw.js": SERVICE_WORKER.format(cache=json.dumps(version)).encode("utf-8"),
+    }
+
+def write_static(outdir):
+    """Write the static site to outdir; returns the number of bytes written."""
+    os.makedirs(outdir, exist_ok=True)
+    total = 0
+    for name, data in build_static().items():
+        with open(os.path.join(outdir, name), "wb") as f:
+            f.write(data)
+        total += len(data)
+    return total
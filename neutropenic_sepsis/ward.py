@@ -0,0 +1,71 @@
+"""
+The ward view: every patient under review on one page.
+"""
+
+import csv
+import functools
+import hashlib
+import json
+
+from . import core
+from .batch import parse_flag
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# WARD VIEW
+#
+# Every patient under review at once.  The chart and the handful of distinct
+# pathway states (active nodes, recommendations) form one shell, sent to the
+# browser once; per patient only an index into those states travels.  The
+# ward component draws one thumbnail per distinct state, shared by every
+# row in that state, and only builds the rows near the viewport.
+# ══════════════════════════════════════════════════════════════════════════════
+
+def read_assessments(src, kind, id_field="id", label_field="name"):
+    """
+    Patients from assessments in the batch formats (CSV with a header row or
+    JSON lines): ([(id, label, input index)], [(row, error)]).
+    """
+    if kind == "csv":
+        rows = csv.DictReader(src)
+    else:
+        rows = (line for line in src if line.strip())
+    P = core.PATHWAY
+    patients, errors = [], []
+    for n, rec in enumerate(rows, 1):
+        try:
+            if kind != "csv":
+                rec = json.loads(rec)
+                if not isinstance(rec, dict):
+                    raise ValueError("not a JSON object")
+            idx = core.input_index(P, **{k: parse_flag(rec[k]) for k in P.INPUTS})
+        except (KeyError, ValueError, TypeError) as e:
+            errors.append((n, f"missing field {e}" if isinstance(e, KeyError) else str(e)))
+            continue
+        pid = str(rec.get(id_field, n))
+        patients.append((pid, str(rec.get(label_field) or pid), idx))
+    return patients, errors
+
+def _ward_keys(P):
+    return sorted(set(P.PATHWAY_TABLE))
+
+def ward_shell(P=None):
+    """(shell, hash): the compact chart plus every reachable state, for the ward component."""
+    return _ward_shell(P or core.PATHWAY)
+
+@functools.lru_cache(maxsize=1)
+def _ward_shell(P):
+    shell = {
+        "svg": core.build_svg(frozenset(), compact=True, P=P),
+        "states": [{"active": sorted(AN), "dim": len(AN) > 2,
+                    "recs": [[icon, title] for icon, title, _ in core.get_recommendations(AN, P)]}
+                   for AN in (core.pathway_nodes(key, P) for key in _ward_keys(P))],
+    }
+    text = json.dumps(shell, sort_keys=True, ensure_ascii=False)
+    return shell, hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+def ward_rows(patients, P=None):
+    """[[id, label, state]] for (id, label, input index) patients; state indexes ward_shell()."""
+    P = P or core.PATHWAY
+    state = {k: i for i, k in enumerate(_ward_keys(P))}
+    return [[pid, label, state[P.PATHWAY_TABLE[idx]]] for pid, label, idx in patients]
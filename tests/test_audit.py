@@ -0,0 +1,94 @@
+"""
+The decision audit log: events recorded off the click path and read back.
+"""
+
+import threading
+import time
+
+import pytest
+
+from neutropenic_sepsis import audit, core, determine_pathway, get_recommendations, metrics
+
+
+@pytest.fixture
+def stopped():
+    audit.stop()
+    yield
+    audit.stop()
+
+
+def _record_all(session="s"):
+    shown = []
+    for i in range(1 << len(core.PATHWAY.INPUTS)):
+        inputs = core.index_inputs(i)
+        AN = determine_pathway(**inputs)
+        assert audit.record(AN, get_recommendations(AN), inputs=inputs, session=session)
+        shown.append((inputs, sorted(AN)))
+    return shown
+
+
+@pytest.mark.parametrize("name", ["audit.sqlite", "audit.jsonl"])
+def test_round_trip(tmp_path, stopped, name):
+    path = str(tmp_path / name)
+    audit.start(path)
+    shown = _record_all()
+    audit.record(frozenset(), [], session="other")
+    audit.stop()
+
+    events = list(audit.read(path, session="s"))
+    assert [(e["inputs"], e["nodes"]) for e in events] == shown
+    assert all(e["spec"] == core.PATHWAY.SPEC_HASH for e in events)
+    assert [e["ts"] for e in events] == sorted(e["ts"] for e in events)
+    assert len(list(audit.read(path))) == len(shown) + 1
+    assert list(audit.read(path, since=events[-1]["ts"] + 1)) == []
+
+
+def test_nothing_recorded_unless_started(stopped):
+    assert audit.record(frozenset(), []) is False
+
+
+def test_unknown_policy(tmp_path):
+    with pytest.raises(ValueError):
+        audit._Writer(str(tmp_path / "a.jsonl"), 10, "drop-everything", 0.05)
+
+
+class _Sink:
+    """A sink that fails, or hangs until released."""
+
+    def __init__(self, path, fail=False):
+        self.fail, self.release, self.written = fail, threading.Event(), []
+
+    def write(self, batch):
+        if self.fail:
+            raise RuntimeError("disk on fire")
+        self.release.wait()
+        self.written.extend(batch)
+
+    def close(self):
+        pass
+
+
+def test_a_failing_sink_does_not_stop_the_writer(tmp_path, monkeypatch):
+    metrics.reset()
+    monkeypatch.setattr(audit, "_JsonlSink", lambda path: _Sink(path, fail=True))
+    w = audit._Writer(str(tmp_path / "a.jsonl"), 10, "drop-new", 0.05)
+    for _ in range(3):
+        assert w.put({"n": 1})
+    w.stop()
+    assert not w.thread.is_alive()
+    assert 'ns_audit_events_total{result="failed"} 3\n' in metrics.render()
+
+
+def test_stop_does_not_wait_forever(tmp_path, monkeypatch):
+    monkeypatch.setattr(audit, "_JsonlSink", _Sink)
+    w = audit._Writer(str(tmp_path / "a.jsonl"), 1, "drop-new", 0.05)
+    w.put({"n": 1})
+    time.sleep(0.05)                                # taken by the writer, which hangs on it
+    w.put({"n": 2})                                 # the queue is full
+    t0 = time.monotonic()
+    w.stop(timeout=0.2)
+    assert time.monotonic() - t0 < 1.0 and w.thread.is_alive()
+    w.sink.release.set()
+    w.stop()                                        # now the marker gets in: flushed
+    assert not w.thread.is_alive()
+    assert w.sink.written == [{"n": 1}, {"n": 2}]
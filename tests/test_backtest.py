@@ -0,0 +1,87 @@
+"""
+The back-test against the feed: the same observations must give the same
+pathway at every observation point.
+"""
+
+import json
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from neutropenic_sepsis import backtest, core, feed  # noqa: E402
+
+H = 3600
+
+
+def observations(n_patients=80, seed=23):
+    """Random JSON-lines observations, in time order, with ties and every flag spelling."""
+    rng = random.Random(seed)
+    flags = [name for name in core.PATHWAY.INPUTS if name not in feed.DERIVED]
+    out = []
+    for i in range(n_patients):
+        pid = f"P{i:03d}"
+        t = rng.randrange(0, 48 * H)
+        for _ in range(rng.randrange(1, 40)):
+            t += rng.choice((0, 0, 60, H, 6 * H, 20 * H, 48 * H, 50 * H))
+            kind = rng.choice(("temp", "temp", "temp", "anc", "flag"))
+            obs = {"patient": pid, "ts": t}
+            if kind == "temp":
+                obs.update(kind="temp", value=rng.choice((36.8, 37.4, 37.9, 38.0, 38.6)))
+            elif kind == "anc":
+                obs.update(code=rng.choice(("751-8", "753-4")),
+                           value=rng.choice((0.1, 0.4, 0.5, 1.2)))
+            else:
+                obs.update(kind="flag", name=rng.choice(flags),
+                           value=rng.choice((True, False, 0, 1, "yes", "no", "Y", "false")))
+            out.append(obs)
+    out.sort(key=lambda obs: obs["ts"])
+    return [json.dumps(obs) for obs in out]
+
+
+def feed_states(lines):
+    """{(patient, ts): (pathway key, recommendation code)} after each observation time."""
+    pipeline = feed.Pipeline()
+    P = pipeline.P
+    states = {}
+    for line in lines:
+        obs = json.loads(line)
+        pipeline.observe(obs)
+        p = pipeline.patients[obs["patient"]]
+        states[obs["patient"], obs["ts"]] = P.PATHWAY_TABLE[p.index], P.REC_TABLE[p.index]
+    return states
+
+
+def test_backtest_agrees_with_feed(tmp_path):
+    lines = observations()
+    rows, errors = backtest.import_observations(lines, str(tmp_path / "store"))
+    assert (rows, errors) == (len(lines), 0)
+    summary = backtest.run(str(tmp_path / "store"), outdir=str(tmp_path / "out"),
+                           chunk_patients=7)
+    expected = feed_states(lines)
+    assert summary["points"] == len(expected)
+
+    with open(tmp_path / "store" / "meta.json", encoding="utf-8") as f:
+        ids = json.load(f)["patients"]
+    patient, ts, masks, codes = (np.load(tmp_path / "out" / f"{name}.npy")
+                                 for name in ("patient", "ts", "pathway", "recommendations"))
+    got = {(ids[p], t): (m, c)
+           for p, t, m, c in zip(patient.tolist(), ts.tolist(), masks.tolist(), codes.tolist())}
+    assert got == expected
+    # the data must reach both values of each derived input
+    reached = set().union(*(core.pathway_nodes(k) for k, _ in expected.values()))
+    assert {"resolved_fever", "persistent_fever"} <= reached
+    assert {"l_neutro_resolved", "l_neutro_ongoing"} <= reached
+
+
+def test_bad_observations_are_counted(tmp_path):
+    lines = [
+        '{"patient": "a", "ts": 0, "kind": "temp", "value": 38.2}',
+        '{"patient": "a", "ts": 1, "kind": "flag", "name": "allo_sct", "value": ""}',
+        '{"patient": "a", "ts": 2, "kind": "flag", "name": "neutro_resolved", "value": 1}',
+        '{"patient": "a", "ts": 3, "kind": "temp", "value": "hot"}',
+        'not json',
+        '{"patient": "a", "ts": 4, "code": "2160-0", "value": 80}',
+    ]
+    assert backtest.import_observations(lines, str(tmp_path)) == (1, 4)
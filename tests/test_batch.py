@@ -0,0 +1,69 @@
+"""
+run_batch and the flag values it accepts.
+"""
+
+import io
+import json
+
+import pytest
+
+from neutropenic_sepsis import determine_pathway, get_recommendations
+from neutropenic_sepsis.batch import parse_flag, run_batch
+
+HEADER = "id,fever_resolved,neutro_resolved,stable,enterocolitis,allo_sct,micro_defined\n"
+
+
+@pytest.mark.parametrize("value, expected", [
+    (True, True), (False, False), (1, True), (0, False), (1.0, True), (0.0, False),
+    ("1", True), ("0", False), ("yes", True), ("No", False), (" TRUE ", True), ("f", False),
+    ("Y", True), ("n", False),
+])
+def test_parse_flag(value, expected):
+    assert parse_flag(value) is expected
+
+
+@pytest.mark.parametrize("value", ["", "  ", None, "maybe", "2", 2, -1, 0.5, "nan", [], "none"])
+def test_parse_flag_rejects(value):
+    with pytest.raises(ValueError):
+        parse_flag(value)
+
+
+def _run(text, kind, workers=0, **kw):
+    dst = io.StringIO()
+    counts = run_batch(io.StringIO(text), dst, kind, workers=workers, **kw)
+    return counts, [json.loads(line) for line in dst.getvalue().splitlines()]
+
+
+def test_csv_rows():
+    (rows, errors), out = _run(HEADER + "a,1,0,1,0,0,0\nb,no,no,no,yes,no,yes\n", "csv")
+    assert (rows, errors) == (2, 0)
+    for rec, args in zip(out, [(1, 0, 1, 0, 0, 0), (0, 0, 0, 1, 0, 1)]):
+        AN = determine_pathway(*map(bool, args))
+        assert rec["pathway"] == sorted(AN)
+        assert rec["recommendations"] == [title for _, title, _ in get_recommendations(AN)]
+    assert [(r["row"], r["id"]) for r in out] == [(1, "a"), (2, "b")]
+
+
+def test_blank_and_unknown_values_are_row_errors():
+    text = HEADER + "a,1,0,1,0,0,0\nb,1,,1,0,0,0\nc,1,0,1,0,0,maybe\nd,1,0,1\n"
+    (rows, errors), out = _run(text, "csv")
+    assert (rows, errors) == (4, 3)
+    assert "error" not in out[0]
+    assert [r["row"] for r in out if "error" in r] == [2, 3, 4]
+
+
+def test_jsonl_missing_and_null_fields():
+    full = {"id": 1, "fever_resolved": True, "neutro_resolved": False, "stable": True,
+            "enterocolitis": False, "allo_sct": False, "micro_defined": False}
+    lines = [full, {**full, "stable": None}, {k: v for k, v in full.items() if k != "allo_sct"}]
+    (rows, errors), out = _run("".join(json.dumps(r) + "\n" for r in lines), "jsonl")
+    assert (rows, errors) == (3, 2)
+    assert out[2]["error"] == "missing field 'allo_sct'"
+
+
+def test_process_pool_matches_in_process():
+    rows = "".join(f"{i},{i & 1},{i >> 1 & 1},{i >> 2 & 1},{i >> 3 & 1},{i >> 4 & 1},"
+                   f"{i >> 5 & 1}\n" for i in range(64)) + "x,1,1,1,1,1,\n"
+    local = _run(HEADER + rows, "csv", chunk_size=7)
+    assert _run(HEADER + rows, "csv", workers=2, chunk_size=7) == local
+    assert local[0] == (65, 1)
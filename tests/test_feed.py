@@ -0,0 +1,96 @@
+"""
+The observation feed: derived inputs over time, and malformed input.
+"""
+
+import json
+
+import pytest
+
+from neutropenic_sepsis import core, feed
+
+H = 3600
+
+
+def _pipeline():
+    events = []
+    return feed.Pipeline(events.append), events
+
+
+def test_fever_resolves_after_48_afebrile_hours():
+    p, events = _pipeline()
+    p.observe({"patient": "a", "ts": 0, "kind": "temp", "value": 38.6})
+    p.observe({"patient": "a", "ts": 6 * H, "kind": "temp", "value": 37.1})
+    assert not events[-1]["inputs"]["fever_resolved"]
+    p.observe({"patient": "b", "ts": 47 * H, "kind": "temp", "value": 37.0})
+    assert [e["patient"] for e in events].count("a") == 1
+    # the clock passing 48 h after the last fever re-evaluates a, with no new data for it
+    p.observe({"patient": "b", "ts": 49 * H, "kind": "temp", "value": 37.0})
+    last = [e for e in events if e["patient"] == "a"][-1]
+    assert last["inputs"]["fever_resolved"] and last["ts"] == 48 * H
+    assert "resolved_fever" in last["pathway"]
+
+
+def test_unstable_patient_is_not_resolved():
+    p, events = _pipeline()
+    p.observe({"patient": "a", "ts": 0, "kind": "flag", "name": "stable", "value": "no"})
+    p.observe({"patient": "a", "ts": 0, "code": "8310-5", "value": 37.0})
+    p.tick(100 * H)
+    assert not events[-1]["inputs"]["fever_resolved"]
+
+
+def test_anc_and_discharge():
+    p, events = _pipeline()
+    p.observe({"patient": "a", "ts": "2024-05-01T08:00:00", "code": "751-8", "value": 0.2})
+    p.observe({"patient": "a", "ts": "2024-05-02T08:00:00Z", "code": "751-8", "value": 0.8})
+    # no event: with the fever unresolved the pathway does not depend on the ANC
+    assert len(events) == 1
+    assert core.index_inputs(p.patients["a"].index)["neutro_resolved"]
+    p.observe({"patient": "a", "ts": "2024-05-02T09:00:00Z", "kind": "discharge"})
+    assert p.patients == {}
+
+
+@pytest.mark.parametrize("obs", [
+    {"patient": "a", "ts": 0, "kind": "temp", "value": "hot"},
+    {"patient": "a", "ts": 0, "kind": "anc"},
+    {"patient": "a", "ts": 0, "kind": "flag", "name": "allo_sct", "value": ""},
+    {"patient": "a", "ts": 0, "kind": "flag", "name": "allo_sct", "value": "maybe"},
+    {"patient": "a", "ts": 0, "kind": "flag", "name": "fever_resolved", "value": True},
+    {"patient": "a", "ts": 0, "kind": "flag", "name": "sepsis", "value": True},
+    {"patient": "a", "ts": "yesterday", "kind": "temp", "value": 37.0},
+    {"ts": 0, "kind": "temp", "value": 37.0},
+])
+def test_malformed_observations(obs):
+    p, events = _pipeline()
+    with pytest.raises(ValueError):
+        p.observe(obs)
+    assert p.patients == {} and p.stats["observations"] == 0 and p.clock == float("-inf")
+
+
+def test_unknown_kind_is_ignored():
+    p, events = _pipeline()
+    p.observe({"patient": "a", "ts": 0, "code": "2160-0", "value": 80})
+    assert p.stats["ignored"] == 1 and p.patients == {} and events == []
+
+
+@pytest.mark.parametrize("read", [lambda path: feed.tail(str(path)),
+                                  lambda path: feed.lines(open(path, encoding="utf-8"))],
+                         ids=["tail", "stdin"])
+def test_bad_lines_do_not_end_the_feed(tmp_path, read):
+    path = tmp_path / "obs.jsonl"
+    lines = [
+        {"patient": "a", "ts": 0, "kind": "temp", "value": 38.5},
+        "{not json",
+        {"patient": "a", "ts": 1, "kind": "flag", "name": "allo_sct", "value": "perhaps"},
+        "",
+        {"patient": "a", "ts": 2, "kind": "flag", "name": "allo_sct", "value": "yes"},
+        {"patient": "a", "ts": 3, "kind": "flag", "name": "micro_defined", "value": "yes"},
+    ]
+    text = "\n".join(l if isinstance(l, str) else json.dumps(l) for l in lines)
+    path.write_text(text)                           # the last line has no newline
+    p, events = _pipeline()
+    errors = []
+    stats = feed.run(read(path), p, on_error=errors.append)
+    assert stats["errors"] == 2 and stats["observations"] == 3
+    assert "bad line" in str(errors[0])
+    assert p.patients["a"].flags["allo_sct"] is True
+    assert p.patients["a"].flags["micro_defined"] is True
@@ -0,0 +1,70 @@
+"""
+Chart geometry: the bundled hand-placed layout and the automatic one.
+"""
+
+import itertools
+import json
+
+from neutropenic_sepsis import core, layout
+
+
+def _overlaps(G):
+    return [(a, b) for (a, (ax, ay, aw, ah)), (b, (bx, by, bw, bh))
+            in itertools.combinations(G.items(), 2)
+            if ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah]
+
+
+def _inside(G, W, H):
+    return all(x >= 0 and y >= 0 and x + w <= W and y + h <= H for x, y, w, h in G.values())
+
+
+def _touches(pt, box):
+    (px, py), (x, y, w, h) = pt, box
+    return x - 0.5 <= px <= x + w + 0.5 and (abs(py - y) < 0.5 or abs(py - y - h) < 0.5)
+
+
+def test_bundled_layout():
+    P = core.PATHWAY
+    assert _overlaps(P.G) == []
+    assert _inside(P.G, P.W, P.H)
+    assert core.check_layout() == []
+    assert P.LEGEND_Y >= max(y + h for _, y, _, h in P.G.values())
+
+
+def test_auto_layout_of_the_bundled_spec():
+    with open(core.SPEC_PATH, encoding="utf-8") as f:
+        spec = json.load(f)
+    for node in spec["nodes"]:
+        node.pop("box")
+    spec.pop("size", None)
+    P = core.compile_spec(spec, "auto")
+    assert set(P.G) == set(P.NODE_IDS)
+    assert _overlaps(P.G) == []
+    assert _inside(P.G, P.W, P.H)
+    # every edge leaves its source downwards: the layering follows the decision tree
+    for e in spec["edges"]:
+        for dst in e["to"] if isinstance(e["to"], list) else [e["to"]]:
+            assert P.G[e["from"]][1] < P.G[dst][1], (e["from"], dst)
+    svg = core.build_svg(core.determine_pathway(**core.index_inputs(5, P)), P=P)
+    assert svg.startswith("<svg") and svg.count("data-n=") == len(P.NODE_IDS)
+
+
+def test_layout_of_a_cyclic_graph():
+    nodes = [(n, 60, 30) for n in "abcdef"]
+    edges = [("a", "b"), ("b", "c"), ("c", "a"), ("a", "d"), ("d", "f"), ("b", "e"),
+             ("a", "f"), ("e", "c")]
+    boxes, routes, (W, H) = layout.layout(nodes, edges)
+    assert set(boxes) == set("abcdef")
+    assert _overlaps(boxes) == []
+    assert _inside(boxes, W, H)
+    # bus stems and drops are styled by one node alone: (n, n)
+    styled = {on for _, _, on in routes if on}
+    assert styled <= set(edges) | {(n, n) for n in "abcdef"}
+    assert {d for _, d in edges} <= {d for _, d in styled}
+    # the edge reversed to break the cycle still runs from c up to a
+    assert ("c", "a") in styled
+    assert boxes["c"][1] > boxes["a"][1]
+    for kind, args, on in routes:
+        if on and on[0] != on[1]:
+            pts = core._edge_points(kind, args)
+            assert _touches(pts[0], boxes[on[0]]) and _touches(pts[-1], boxes[on[1]]), on
@@ -0,0 +1,38 @@
+"""
+Counters, stage summaries and the Prometheus text they are exposed as.
+"""
+
+import pytest
+
+from neutropenic_sepsis import metrics
+
+
+@pytest.fixture(autouse=True)
+def _reset():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_counters_and_stages():
+    metrics.inc("feed_events")
+    metrics.inc("feed_events", 2)
+    metrics.inc("prefetch", result="hit")
+    with metrics.rerun("s1"):
+        with metrics.span("pathway"):
+            pass
+    text = metrics.render()
+    assert "ns_feed_events_total 3\n" in text
+    assert 'ns_prefetch_total{result="hit"} 1\n' in text
+    assert 'ns_stage_seconds_count{stage="pathway"} 1\n' in text
+    assert 'ns_session_stage_seconds_count{session="s1",stage="rerun"} 1\n' in text
+
+
+@pytest.mark.parametrize("value, escaped", [
+    ('say "hi"', r'say \"hi\"'),
+    ("C:\\tmp", r"C:\\tmp"),
+    ("two\nlines", r"two\nlines"),
+])
+def test_label_values_are_escaped(value, escaped):
+    metrics.inc("image_requests", status=value)
+    assert f'ns_image_requests_total{{status="{escaped}"}} 1\n' in metrics.render()
@@ -0,0 +1,133 @@
+"""
+determine_pathway against the hand-written if-tree it replaced, and the
+decision table and batch path against determine_pathway.
+"""
+
+import itertools
+import random
+
+import pytest
+
+from neutropenic_sepsis import (batch, core, determine_pathway, evaluate_batch, lookup_pathway,
+                                pathway_key)
+
+INPUTS = ("fever_resolved", "neutro_resolved", "stable", "enterocolitis", "allo_sct",
+          "micro_defined")
+COMBINATIONS = list(itertools.product((False, True), repeat=len(INPUTS)))
+
+
+def baseline_pathway(fever_resolved, neutro_resolved, stable,
+                     enterocolitis, allo_sct, micro_defined):
+    """determine_pathway as it was before the spec: the reference."""
+    AN = {"header", "review72"}
+    if fever_resolved:
+        AN.add("resolved_fever")
+        if micro_defined:
+            AN.add("micro_defined")
+            AN.add("liaise_id")
+            if neutro_resolved:
+                AN.add("r_neutro_resolved")
+                AN.add("target_abx")
+            else:
+                AN.add("r_neutro_ongoing")
+                if enterocolitis:
+                    AN.add("r_entero_yes")
+                    AN.add("continue_r")
+                else:
+                    AN.add("r_entero_no")
+                    AN.add("target_abx")
+        else:
+            AN.add("fever_unknown")
+            if neutro_resolved:
+                AN.add("l_neutro_resolved")
+                AN.add("stop_abx")
+            else:
+                AN.add("l_neutro_ongoing")
+                if enterocolitis:
+                    AN.add("l_entero_yes")
+                    AN.add("continue_l")
+                else:
+                    AN.add("l_entero_no")
+                    if allo_sct:
+                        AN.add("allo_sct")
+                        AN.add("cease_allo")
+                    else:
+                        AN.add("non_allo")
+                        AN.add("cease_non_allo")
+    else:
+        AN.add("persistent_fever")
+        AN.add("recurrent_fever")
+        AN.add("recurrent_actions")
+        if stable:
+            AN.add("p_stable")
+            AN.add("continue_stable")
+        else:
+            AN.add("p_unstable")
+            AN.add("unstable_box")
+            AN.add("imaging_box")
+    return AN
+
+
+def test_bundled_spec_inputs():
+    assert core.PATHWAY.INPUTS == INPUTS
+
+
+@pytest.mark.parametrize("args", COMBINATIONS)
+def test_determine_pathway_matches_baseline(args):
+    expected = baseline_pathway(*args)
+    assert determine_pathway(*args) == expected
+    assert determine_pathway(**dict(zip(INPUTS, args))) == expected
+    assert determine_pathway(*args[:2], **dict(zip(INPUTS[2:], args[2:]))) == expected
+
+
+@pytest.mark.parametrize("args, kwargs", [
+    ((True,) * 7, {}),                                  # too many
+    ((True,) * 5, {}),                                  # one missing
+    ((True,) * 6, {"stable": True}),                    # given twice
+    ((), {name: True for name in INPUTS[1:]}),          # one missing, by name
+    ((), {**{name: True for name in INPUTS}, "sepsis": True}),
+])
+@pytest.mark.parametrize("fn", [determine_pathway, evaluate_batch], ids=lambda fn: fn.__name__)
+def test_rejects_bad_arguments(fn, args, kwargs):
+    if fn is evaluate_batch:
+        pytest.importorskip("numpy")
+    with pytest.raises(TypeError):
+        fn(*args, **kwargs)
+
+
+@pytest.mark.parametrize("args", COMBINATIONS)
+def test_table_matches_determine_pathway(args):
+    inputs = dict(zip(INPUTS, args))
+    AN = determine_pathway(**inputs)
+    key, code = lookup_pathway(**inputs)
+    assert key == pathway_key(AN)
+    assert core.pathway_nodes(key) == AN
+    assert core.recommendations_for(code) == core.get_recommendations(AN)
+
+
+def test_check_decision_table():
+    assert batch.check_decision_table() == []
+
+
+def test_evaluate_batch_matches_scalar():
+    np = pytest.importorskip("numpy")
+    rng = random.Random(6)
+    rows = [tuple(rng.random() < 0.5 for _ in INPUTS) for _ in range(5000)]
+    cols = [np.array(col) for col in zip(*rows)]
+    expected = [lookup_pathway(**dict(zip(INPUTS, row))) for row in rows]
+
+    for masks, codes in (evaluate_batch(*cols), evaluate_batch(**dict(zip(INPUTS, cols))),
+                         evaluate_batch(*cols[:2], **dict(zip(INPUTS[2:], cols[2:])))):
+        assert masks.dtype == np.uint64 and codes.dtype == np.uint16
+        assert list(zip(masks.tolist(), codes.tolist())) == expected
+
+
+def test_evaluate_batch_broadcasts():
+    np = pytest.importorskip("numpy")
+    stable = np.array([True, False, True])
+    masks, codes = evaluate_batch(fever_resolved=False, neutro_resolved=0, stable=stable,
+                                  enterocolitis=False, allo_sct=False, micro_defined=False)
+    for m, c, s in zip(masks.tolist(), codes.tolist(), stable.tolist()):
+        AN = baseline_pathway(False, False, s, False, False, False)
+        assert core.pathway_nodes(m) == AN
+        assert core.recommendations_for(c) == core.get_recommendations(AN)
@@ -0,0 +1,76 @@
+"""
+Prefetch of the "Copy flowchart" PNGs: which states are predicted, and how
+predictions are scored.
+"""
+
+import concurrent.futures
+
+import pytest
+
+from neutropenic_sepsis import core, prefetch
+
+
+def test_neighbour_keys():
+    P = core.PATHWAY
+    for idx in range(1 << len(P.INPUTS)):
+        keys = prefetch.neighbour_keys(**core.index_inputs(idx))
+        flips = {P.PATHWAY_TABLE[idx ^ 1 << b] for b in range(len(P.INPUTS))}
+        assert len(keys) == len(set(keys))
+        assert set(keys) == flips - {P.PATHWAY_TABLE[idx]}
+
+
+def _scores():
+    stats = prefetch.prefetch_stats()
+    return stats["hit"], stats["late"], stats["miss"]
+
+
+def _settle(session):
+    concurrent.futures.wait(prefetch._predicted[session][2].values())
+
+
+@pytest.fixture
+def session(request):
+    if not core.png_available():
+        pytest.skip("no PNG renderer installed")
+    yield request.node.name
+    prefetch.cancel_prefetch()
+
+
+def test_predictions_are_scored(session):
+    start = core.index_inputs(0b000101)         # fever resolved, stable: left branch
+    prefetch.prefetch(start, session)
+    _settle(session)
+    hit, late, miss = _scores()
+
+    flipped = dict(start, neutro_resolved=True)
+    prefetch.prefetch(flipped, session)
+    assert _scores() == (hit + 1, late, miss)
+    assert core.cached_png(core.determine_pathway(**flipped)).startswith(b"\x89PNG")
+
+    _settle(session)
+    prefetch.prefetch(start, session)           # one flip back: predicted again
+    assert _scores() == (hit + 2, late, miss)
+
+    far = dict(start, fever_resolved=False, stable=False)   # two flips away
+    prefetch.prefetch(far, session)
+    assert _scores() == (hit + 2, late, miss + 1)
+
+
+def test_unchanged_pathway_is_not_scored(session):
+    inputs = core.index_inputs(0)
+    prefetch.prefetch(inputs, session)
+    before = _scores()
+    prefetch.prefetch(dict(inputs, allo_sct=True), session)     # same pathway
+    assert _scores() == before
+
+
+def test_prediction_from_an_older_spec_is_dropped(session, monkeypatch):
+    start = core.index_inputs(0b000101)
+    prefetch.prefetch(start, session)
+    _settle(session)
+    before = _scores()
+    reloaded = core.compile_spec(core.PATHWAY.SPEC, core.PATHWAY.SPEC_HASH)
+    monkeypatch.setattr(core, "PATHWAY", reloaded)
+    prefetch.prefetch(dict(start, neutro_resolved=True), session)
+    assert _scores() == before
+    assert prefetch._predicted[session][0] is reloaded
@@ -0,0 +1,63 @@
+"""
+Opt-in profiling: which runs are profiled, and the files they leave.
+"""
+
+import collections
+import os
+import time
+
+import pytest
+
+from neutropenic_sepsis import build_svg, core, profiling
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "_config", None)
+    monkeypatch.setattr(profiling, "_sessions", collections.OrderedDict())
+    profiling.configure(str(tmp_path), rate=0.0, token="secret")
+    return tmp_path
+
+
+def _work():
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < 0.05:
+        build_svg(frozenset(core.PATHWAY.NODE_IDS[:8]))
+
+
+def test_only_switched_on_sessions_are_profiled(profile_dir):
+    with profiling.run("quiet"):
+        _work()
+    assert os.listdir(profile_dir) == []
+
+    profiling.set_session("s1", True)
+    with profiling.run("s1"):
+        with profiling.run("s1", stage="fragment"):     # nested: adds nothing
+            _work()
+    names = sorted(os.listdir(profile_dir))
+    assert [n.rsplit(".", 1)[1] for n in names] == ["alloc", "folded", "pstats"]
+    assert all("-s1-rerun." in n for n in names)
+
+    stats, stacks = profiling.merged(str(profile_dir))
+    assert any(fn[2] == "build_svg" for fn in stats.stats)
+    assert any("build_svg" in stack for stack in stacks)
+
+    profiling.set_session("s1", False)
+    with profiling.run("s1"):
+        _work()
+    assert len(os.listdir(profile_dir)) == 3
+
+
+def test_admin_token(profile_dir):
+    assert profiling.admin("secret")
+    assert not profiling.admin("guess") and not profiling.admin(None)
+
+
+def test_old_profiles_are_pruned(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, "KEEP", 2)
+    monkeypatch.setattr(profiling, "_config", dict(profiling._config, rate=1.0, alloc=False))
+    for _ in range(4):
+        with profiling.run("s"):
+            pass
+        time.sleep(0.002)                               # distinct millisecond stamps
+    assert len(os.listdir(profile_dir)) == 2 * 2        # .pstats + .folded each
@@ -0,0 +1,66 @@
+"""
+The scene graph's other renderings (JSON, text) against the SVG and the
+pathway they were made for.
+"""
+
+import json
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from neutropenic_sepsis import build_svg, core, get_recommendations
+
+STATES = [frozenset()] + sorted(core.reachable_pathways().values(), key=sorted)
+NAMES = ("normal", "active", "dimmed")
+
+
+@pytest.mark.parametrize("AN", STATES, ids=lambda AN: f"{core.pathway_key(AN):x}")
+def test_json_matches_svg(AN):
+    scene = json.loads(core.render_json(AN))
+    dim = len(AN) > 2
+    assert scene["spec"] == core.PATHWAY.SPEC_HASH
+    for node in scene["nodes"]:
+        assert node["state"] == NAMES[core.element_state(node["id"], AN, dim)]
+    for edge in scene["edges"]:
+        if edge["on"] is not None:
+            assert edge["state"] == NAMES[core.element_state(edge["on"][0], AN, dim)]
+    assert scene["recommendations"] == [{"icon": i, "title": t, "detail": d}
+                                        for i, t, d in get_recommendations(AN)]
+
+    svg = ET.fromstring(build_svg(AN))
+    boxes = {g.get("data-n"): g.find("{http://www.w3.org/2000/svg}rect")
+             for g in svg.iter() if g.get("data-n")}
+    assert [n["id"] for n in scene["nodes"]] == list(boxes)
+    for node in scene["nodes"]:
+        rect = boxes[node["id"]]
+        assert node["box"] == [float(rect.get(k)) for k in ("x", "y", "width", "height")]
+    assert ([e["on"] for e in scene["edges"] if e["on"] is not None]
+            == [el.get("data-on").split() for el in svg.iter() if el.get("data-on")])
+
+
+@pytest.mark.parametrize("AN", STATES[1:], ids=lambda AN: f"{core.pathway_key(AN):x}")
+def test_text_lists_active_boxes_then_recommendations(AN):
+    text = core.render_text(AN)
+    labels = [line[2:] for line in text.splitlines() if line.startswith("> ")]
+    by_id = {node["id"]: node for node in json.loads(core.render_json(AN))["nodes"]}
+    assert labels == [by_id[b.id]["label"] for b in core.PATHWAY.SCENE.reading_order
+                      if b.id in AN and b.label]
+    for _, title, detail in get_recommendations(AN):
+        assert f"- {title}: {detail}" in text
+    assert text.endswith(f"Pathway spec {core.PATHWAY.SPEC_HASH}\n")
+
+
+def test_ascii_text():
+    AN = STATES[1]
+    text = core.render_text(AN, ascii=True)
+    assert text.isascii()
+    assert len(text.splitlines()) == len(core.render_text(AN).splitlines())
+
+
+def test_render_formats():
+    AN = STATES[1]
+    assert core.render(AN) == build_svg(AN)
+    assert core.render(AN, "txt") == core.render_text(AN)
+    assert core.render(AN, "json") == core.render_json(AN)
+    if core.png_available():
+        assert core.render(AN, "png").startswith(b"\x89PNG\r\n\x1a\n")
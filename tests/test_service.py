@@ -0,0 +1,69 @@
+"""
+The image endpoints, called through respond() without a socket.
+"""
+
+import gzip
+
+import pytest
+
+from neutropenic_sepsis import build_svg, core, determine_pathway, service
+
+
+def test_state_codes_round_trip():
+    for i in range(1 << len(core.PATHWAY.INPUTS)):
+        inputs = core.index_inputs(i)
+        code = service.state_code(**inputs)
+        assert len(code) == 2
+        assert service.code_inputs(code) == inputs
+
+
+@pytest.mark.parametrize("code", ["0", "000", "40", "ff"])
+def test_invalid_state_codes(code):
+    assert service.code_inputs(code) is None
+    assert service.respond(f"/pathway/{code}.svg", {})[0] == 404
+
+
+@pytest.mark.parametrize("path", ["/", "/pathway/00.gif", "/pathway/0000000000000000/00.svg"])
+def test_not_found(path):
+    assert service.respond(path, {})[0] == 404
+
+
+def test_svg_by_code():
+    inputs = core.index_inputs(0x2b)
+    status, headers, body = service.respond("/pathway/2b.svg", {})
+    assert status == 200 and "Content-Encoding" not in headers
+    assert body.decode("utf-8") == build_svg(determine_pathway(**inputs))
+    assert headers["Cache-Control"] == f"public, max-age={service.UNPINNED_MAX_AGE}"
+    assert headers["Link"] == f'</pathway/{core.PATHWAY.SPEC_HASH}/2b.svg>; rel="canonical"'
+
+
+def test_gzip_and_conditional_requests():
+    status, headers, body = service.respond("/pathway/05.txt", {"Accept-Encoding": "gzip"})
+    assert status == 200 and headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(body).decode("utf-8") == core.render_text(
+        determine_pathway(**core.index_inputs(5)))
+    again = service.respond("/pathway/05.txt", {"Accept-Encoding": "gzip",
+                                                 "If-None-Match": headers["ETag"]})
+    assert again[0] == 304 and again[2] == b""
+    # the identity body has its own tag
+    assert service.respond("/pathway/05.txt", {"If-None-Match": headers["ETag"]})[0] == 200
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("gzip", "gzip"), ("gzip;q=0", "identity"), ("gzip;q=.", "identity"),
+    ("gzip;q=1..0, *;q=0.5", "identity"), ("*", "gzip"), ("", "identity"),
+])
+def test_accept_encoding(accept, expected):
+    assert service._encoding(accept, {"identity": b"", "gzip": b""}) == expected
+
+
+def test_pinned_urls_are_immutable():
+    status, headers, _ = service.respond(f"/pathway/{core.PATHWAY.SPEC_HASH}/05.json", {})
+    assert status == 200 and headers["Cache-Control"] == service.IMMUTABLE
+    assert "Link" not in headers
+
+
+def test_states_with_the_same_pathway_share_a_body():
+    a = service.respond("/pathway/00.svg", {})[1]["ETag"]
+    # fever unresolved and unstable in both: the other four inputs do not matter
+    assert service.respond("/pathway/3a.svg", {})[1]["ETag"] == a
@@ -0,0 +1,116 @@
+"""
+Spec hot reload: a changed spec is compiled and installed whole, an invalid
+one leaves the installed pathway alone.
+"""
+
+import json
+import os
+
+import pytest
+
+from neutropenic_sepsis import core, feed, get_recommendations, static
+
+
+@pytest.fixture
+def spec_file(tmp_path):
+    """A copy of the bundled spec; the bundled one is reinstalled afterwards."""
+    original = core.PATHWAY
+    with open(core.SPEC_PATH, encoding="utf-8") as f:
+        spec = json.load(f)
+    path = tmp_path / "pathway.json"
+
+    def write(spec_or_text):
+        text = spec_or_text if isinstance(spec_or_text, str) else json.dumps(spec_or_text)
+        path.write_text(text, encoding="utf-8")
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))   # a new mtime
+        return str(path)
+
+    yield spec, write
+    core.reload_spec()
+    assert core.PATHWAY is original
+
+
+def test_reload_installs_a_changed_spec(spec_file):
+    spec, write = spec_file
+    before = core.PATHWAY
+    pipeline = feed.Pipeline()
+    spec["recommendations"][0]["title"] = "Stop all antibiotics"
+    spec["nodes"][0]["label"] = "Neutropaenic Sepsis"
+    path = write(spec)
+
+    assert core.reload_spec(path) is True
+    P = core.PATHWAY
+    assert P is not before and P.SPEC_HASH != before.SPEC_HASH
+    assert core.reload_spec(path) is False          # unchanged file: nothing to do
+    AN = core.pathway_nodes(P.PATHWAY_TABLE[core.input_index(
+        fever_resolved=True, neutro_resolved=True, stable=True, enterocolitis=False,
+        allo_sct=False, micro_defined=False)])
+    assert get_recommendations(AN)[0][1] == "Stop all antibiotics"
+    assert core.flowchart_shell()[1] != core.flowchart_shell(before)[1]
+    assert "Neutropaenic Sepsis<" in core.build_svg(AN)
+    assert pipeline.P is before                     # a running pipeline keeps its spec
+
+
+def test_invalid_spec_keeps_the_installed_pathway(spec_file):
+    spec, write = spec_file
+    before = core.PATHWAY
+    path = write("{not json")
+    for _ in range(2):                              # raised until the file is fixed
+        with pytest.raises(ValueError, match="not valid JSON"):
+            core.reload_spec(path)
+        assert core.PATHWAY is before
+
+    del spec["decision"]
+    with pytest.raises(ValueError):
+        core.reload_spec(write(spec))
+    assert core.PATHWAY is before
+
+
+def test_compiled_specs_are_reused(spec_file):
+    spec, write = spec_file
+    before = core.PATHWAY
+    spec["footer"] = "edited"
+    path = write(spec)
+    assert core.reload_spec(path)
+    edited = core.PATHWAY
+    assert core.reload_spec() and core.PATHWAY is before
+    assert core.reload_spec(write(spec)) and core.PATHWAY is edited
+
+
+@pytest.mark.parametrize("break_it", [
+    lambda spec: spec["nodes"].append("header"),
+    lambda spec: spec["decision"].update({"then": [spec["decision"]["then"]]}),
+    lambda spec: spec.update(edges={"kind": "arrow"}),
+    lambda spec: spec["edges"].append({"from": "header", "to": 3}),
+    lambda spec: spec["recommendations"].append(["stop_abx"]),
+    lambda spec: spec["form"].update(fields={"input": "stable"}),
+    lambda spec: spec["nodes"][0].update(box="10,10,100,30"),
+    lambda spec: spec.pop("title"),
+    lambda spec: spec.pop("form"),
+    lambda spec: spec["form"].pop("title"),
+    lambda spec: spec["form"]["fields"][0].pop("widget"),
+    lambda spec: spec["form"]["fields"][0].update(options="Yes"),
+    lambda spec: spec["form"]["fields"][0].update(default="yes"),
+], ids=["node-string", "branch-list", "edges-object", "edge-target", "rec-list", "fields-object",
+        "box-string", "no-title", "no-form", "no-form-title", "field-widget", "radio-options",
+        "field-default"])
+def test_malformed_spec_is_reported(spec_file, break_it):
+    spec, write = spec_file
+    before = core.PATHWAY
+    break_it(spec)
+    path = write(spec)
+    for _ in range(2):
+        with pytest.raises(ValueError, match="invalid pathway spec"):
+            core.reload_spec(path)
+        assert core.PATHWAY is before
+
+
+def test_optional_page_text(spec_file):
+    spec, write = spec_file
+    for key in ("subtitle", "footer"):
+        del spec[key]
+    del spec["form"]["note"]
+    assert core.reload_spec(write(spec))
+    page = static.build_static()["index.html"].decode("utf-8")
+    assert core.esc(spec["title"]) in page
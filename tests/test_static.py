@@ -0,0 +1,34 @@
+"""
+The static build: the tables the page evaluates in the browser.
+"""
+
+import json
+import re
+
+from neutropenic_sepsis import core, determine_pathway, get_recommendations, static
+
+
+def test_page_tables_match_determine_pathway():
+    P = core.PATHWAY
+    data = static.pathway_data(P)
+    assert data["inputs"] == list(P.INPUTS)
+    for idx, state in enumerate(data["table"]):
+        AN = determine_pathway(**core.index_inputs(idx))
+        nodes, recs = data["states"][state]
+        assert {data["nodes"][n] for n in nodes} == AN
+        shown = [data["recommendations"][r] for r in recs]
+        assert len(shown) == len(get_recommendations(AN))
+        for html, (_, title, _) in zip(shown, get_recommendations(AN)):
+            assert core.esc(title) in html
+
+
+def test_build():
+    site = static.build_static()
+    assert set(site) == {"index.html", "sw.js"}
+    page = site["index.html"].decode("utf-8")
+    assert core.flowchart_shell()[0] in page
+    m = re.search(r"const PATHWAY = (.*);\n", page)
+    assert "</" not in m.group(1)
+    assert json.loads(m.group(1)) == json.loads(json.dumps(static.pathway_data(core.PATHWAY)))
+    assert f"ns-{core.PATHWAY.SPEC_HASH}-" in site["sw.js"].decode("utf-8")
+    assert static.build_static() == site            # reproducible: same spec, same files
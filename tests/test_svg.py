@@ -0,0 +1,73 @@
+"""
+The compact SVG (the on-page chart) against the inline SVG (standalone
+exports): the same elements, in the same states, for every pathway state.
+"""
+
+import gzip
+import io
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from neutropenic_sepsis import build_svg, core
+
+STATES = [frozenset()] + sorted(core.reachable_pathways().values(), key=sorted)
+NAMES = ("normal", "active", "dimmed")
+
+
+def _elements(svg):
+    """[(data-n or data-on, state name)] of the styled elements, in document order."""
+    out = []
+    for el in ET.fromstring(svg).iter():
+        ident = el.get("data-n") or el.get("data-on")
+        if ident is None:
+            continue
+        cls = el.get("class")
+        if cls is not None:
+            cls = cls.split()
+            state = "active" if "act" in cls else "dimmed" if "dim" in cls else "normal"
+        else:
+            shape = el if el.get("stroke") else next(c for c in el if c.get("stroke"))
+            stroke = shape.get("stroke")
+            state = ("active" if stroke == core.C["act"] else
+                     "dimmed" if stroke == core.C["ds"] else "normal")
+        out.append((ident, state))
+    return out
+
+
+@pytest.mark.parametrize("AN", STATES, ids=lambda AN: f"{core.pathway_key(AN):x}")
+def test_compact_matches_inline(AN):
+    inline = _elements(build_svg(AN))
+    assert inline == _elements(build_svg(AN, compact=True))
+    dim = len(AN) > 2
+    for ident, state in inline:
+        driver = ident.split()[0]
+        assert state == NAMES[core.element_state(driver, AN, dim)], ident
+
+
+def test_every_node_is_drawn():
+    ids = [i for i, _ in _elements(build_svg(frozenset(), compact=True)) if " " not in i]
+    assert sorted(ids) == sorted(core.PATHWAY.NODE_IDS)
+
+
+@pytest.mark.parametrize("AN", STATES, ids=lambda AN: f"{core.pathway_key(AN):x}")
+def test_compact_is_not_larger_gzipped(AN):
+    inline, compact = (build_svg(AN, compact=c).encode("utf-8") for c in (False, True))
+    assert len(compact) < len(inline)
+    assert len(gzip.compress(compact, 9)) <= len(gzip.compress(inline, 9))
+
+
+def test_compact_rasterises_like_inline():
+    if not core.png_available():
+        pytest.skip("no PNG renderer installed")
+    Image = pytest.importorskip("PIL.Image")
+    ImageChops = pytest.importorskip("PIL.ImageChops")
+
+    for AN in STATES:
+        inline, compact = (Image.open(io.BytesIO(core._rasterizer()(build_svg(AN, compact=c))))
+                           .convert("RGBA") for c in (False, True))
+        assert inline.size == compact.size
+        # compact coordinates are rounded to 0.1 px: allow anti-aliasing noise
+        diff = ImageChops.difference(inline, compact).convert("L")
+        assert diff.getextrema()[1] <= 16, sorted(AN)
+        assert sum(diff.histogram()[1:]) < inline.width * inline.height // 10000, sorted(AN)
@@ -0,0 +1,43 @@
+"""
+Label text metrics: the width table, word wrap and the overflow check.
+"""
+
+import pytest
+
+from neutropenic_sepsis import core
+
+
+@pytest.mark.parametrize("text, bold, width", [
+    ("i", False, 2.22), ("W", False, 9.44), ("b", False, 5.56), ("b", True, 6.11),
+    (" ", False, 2.78), ("≥", True, 5.49), ("é", False, 5.56),    # é: the default advance
+])
+def test_text_width(text, bold, width):
+    assert core.text_width(text, 10, bold) == pytest.approx(width)
+    assert core.text_width(text, 20, bold) == pytest.approx(2 * width)
+
+
+def test_text_width_adds_up():
+    assert core.text_width("Allo-SCT", 11) == pytest.approx(
+        sum(core.text_width(ch, 11) for ch in "Allo-SCT"))
+
+
+def test_wrap_at_the_box_edge():
+    # "iiii iiii" at 10px is 8.88 + 2.78 + 8.88 = 20.54px
+    pad = 2 * core.LABEL_PAD
+    assert core._wrap("iiii iiii", 21 + pad, 10) == ("iiii iiii",)
+    assert core._wrap("iiii iiii", 20 + pad, 10) == ("iiii", "iiii")
+
+
+def test_wrap_keeps_the_words():
+    text = "Consider stopping antibiotics if afebrile for 48 hours and neutrophils ≥ 0.5"
+    lines = core._wrap(text, 150, 10)
+    assert len(lines) > 1 and " ".join(lines) == text
+    assert all(core.text_width(ln, 10) <= 150 - 2 * core.LABEL_PAD for ln in lines)
+    assert core._wrap("", 150, 10) == ("",)
+
+
+def test_label_overflow():
+    assert core.label_overflow("Stop antibiotics", 150, 30, 10) is None
+    # one word wider than the box is not broken, and reported
+    assert "wide" in core.label_overflow("Immunocompromised", 60, 60, 10)
+    assert "lines do not fit" in core.label_overflow("a b c d e f", 30, 30, 10)
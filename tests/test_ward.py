@@ -0,0 +1,51 @@
+"""
+The ward view: assessments in, one shared shell and a state per patient out.
+"""
+
+import io
+import json
+
+from neutropenic_sepsis import core, determine_pathway, get_recommendations, ward
+
+HEADER = "id,name,fever_resolved,neutro_resolved,stable,enterocolitis,allo_sct,micro_defined\n"
+
+
+def test_read_assessments_csv():
+    text = HEADER + "p1,Bed 1,1,0,1,0,0,0\np2,,no,no,yes,no,no,no\np3,Bed 3,1,,1,0,0,0\n"
+    patients, errors = ward.read_assessments(io.StringIO(text), "csv")
+    assert [(pid, label) for pid, label, _ in patients] == [("p1", "Bed 1"), ("p2", "p2")]
+    assert core.index_inputs(patients[0][2]) == {
+        "fever_resolved": True, "neutro_resolved": False, "stable": True,
+        "enterocolitis": False, "allo_sct": False, "micro_defined": False}
+    assert [n for n, _ in errors] == [3]
+
+
+def test_read_assessments_jsonl():
+    rows = [{"id": 7, "fever_resolved": True, "neutro_resolved": True, "stable": True,
+             "enterocolitis": False, "allo_sct": False, "micro_defined": True},
+            {"id": 8, "fever_resolved": True}]
+    text = "".join(json.dumps(r) + "\n" for r in rows) + "{not json\n[1, 2]\n"
+    patients, errors = ward.read_assessments(io.StringIO(text), "jsonl")
+    assert [(pid, label) for pid, label, _ in patients] == [("7", "7")]
+    assert errors[0] == (2, "missing field 'neutro_resolved'")
+    assert [n for n, _ in errors] == [2, 3, 4]      # a bad line is skipped, not fatal
+
+
+def test_rows_index_the_shell_states():
+    shell, _ = ward.ward_shell()
+    patients = [(f"p{i}", f"Bed {i}", i) for i in range(1 << len(core.PATHWAY.INPUTS))]
+    rows = ward.ward_rows(patients)
+    assert len(shell["states"]) == len(set(core.PATHWAY.PATHWAY_TABLE))
+    for (pid, label, idx), row in zip(patients, rows):
+        AN = determine_pathway(**core.index_inputs(idx))
+        state = shell["states"][row[2]]
+        assert row[:2] == [pid, label]
+        assert state["active"] == sorted(AN)
+        assert state["recs"] == [[icon, title] for icon, title, _ in get_recommendations(AN)]
+
+
+def test_shell_is_stable_json():
+    shell, digest = ward.ward_shell()
+    assert ward.ward_shell() == (shell, digest)
+    assert json.loads(json.dumps(shell)) == shell
+    assert shell["svg"] == core.build_svg(frozenset(), compact=True)